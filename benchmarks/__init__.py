@@ -0,0 +1 @@
+"""串口助手的性能基准测试，在仓库根目录用 python -m benchmarks <名称> 运行"""
@@ -0,0 +1,48 @@
+"""命令行入口：python -m benchmarks <名称> [选项]"""
+import argparse
+import multiprocessing
+import sys
+
+from benchmarks.analyze import benchmark_analyze
+from benchmarks.buffers import benchmark_buffers
+from benchmarks.e2e import BASELINE, benchmark_e2e
+from benchmarks.export import benchmark_export
+from benchmarks.fanout import benchmark_fanout
+from benchmarks.pipeline import benchmark_pipeline
+from benchmarks.rules import benchmark_rules
+from benchmarks.transfer import benchmark_transfer
+
+# 基准测试名称 -> 函数
+BENCHMARKS = {
+    'rules': benchmark_rules,
+    'fanout': benchmark_fanout,
+    'pipeline': benchmark_pipeline,
+    'export': benchmark_export,
+    'buffers': benchmark_buffers,
+    'e2e': benchmark_e2e,
+    'analyze': benchmark_analyze,
+    'transfer': benchmark_transfer,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='串口助手性能基准测试')
+    parser.add_argument('name', choices=sorted(BENCHMARKS), help='要运行的基准测试')
+
+    e2e = parser.add_argument_group('端到端回归测试（e2e）')
+    e2e.add_argument('--baseline', default=BASELINE, help='JSON 基线文件，默认为 tests/e2e_baseline.json')
+    e2e.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    e2e.add_argument('--repeat', type=int, default=3, help='更新基线时的运行次数，各项指标取最差值')
+    e2e.add_argument('--tolerance', type=float, default=0.25, help='相对基线允许的退化比例')
+    e2e.add_argument('--soak', type=float, default=30.0, help='测量内存增长的运行时长（秒），0 表示跳过')
+    args = parser.parse_args(argv)
+
+    if args.name == 'e2e':
+        return benchmark_e2e(args.baseline, args.update_baseline, args.tolerance, args.soak,
+                             repeat=max(1, args.repeat))
+    return BENCHMARKS[args.name]()
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
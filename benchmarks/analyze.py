@@ -0,0 +1,45 @@
+"""离线日志分析基准测试"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from serial_assistant import DEFAULT_DATA_FORMAT, LogAnalyzer, make_telemetry_frame
+
+
+def benchmark_analyze(size_mb=200, directory=None):
+    """离线日志分析基准测试：生成指定大小的日志文件，分别用 1、2、4…个进程解析并比较加速比"""
+    temporary = directory is None
+    directory = directory or tempfile.mkdtemp(prefix='analyze_bench_')
+    path = os.path.join(directory, 'telemetry.log')
+    try:
+        rng = random.Random(13349)
+        state = {}
+        block = ''.join(make_telemetry_frame(DEFAULT_DATA_FORMAT, rng, state) + '\n'
+                        for _ in range(20000)).encode('utf-8')
+        with open(path, 'wb') as f:
+            for _ in range(max(1, size_mb * 1000000 // len(block))):
+                f.write(block)
+        size = os.path.getsize(path)
+        print(f"日志文件 {path}: {size / 1e6:.1f} MB, CPU 核数 {os.cpu_count()}")
+
+        workers = 1
+        baseline = None
+        while True:
+            analyzer = LogAnalyzer(path, DEFAULT_DATA_FORMAT, workers=workers)
+            begin = time.perf_counter()
+            analyzer.run()
+            elapsed = time.perf_counter() - begin
+            baseline = baseline or elapsed
+            print(f"{workers:>3} 个进程: {elapsed:6.2f} 秒, {size / 1e6 / elapsed:7.1f} MB/秒, "
+                  f"{analyzer.rows / elapsed:10.0f} 帧/秒, 加速比 {baseline / elapsed:4.2f}")
+            if workers >= (os.cpu_count() or 1):
+                break
+            workers = min(workers * 2, os.cpu_count() or 1)
+    finally:
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    return 0
@@ -0,0 +1,101 @@
+"""接收缓冲基准测试：每次读取新建 bytes 与读入复用的 slab 比较"""
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from serial_assistant import (DEFAULT_CMD_BUTTONS, DEFAULT_DATA_FORMAT, BufferPool, ReceiveBuffer, SensorParser,
+                              TelemetryPipeline, make_telemetry_frame)
+
+
+class _FileSerialPort:
+    """基准测试用：把普通文件当作已经收到数据的串口"""
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self, size):
+        return os.read(self.fd, size)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def benchmark_buffers(size_mb=50, read_size=1024):
+    """接收缓冲基准测试：比较每次读取新建 bytes 与读入复用的 slab 两种方式
+
+    默认每次读取 1KB，相当于 921600 波特率下每 10ms 读取一次。先只测接收阶段（读取、交给显示的引用、
+    分帧和解码），统计吞吐量、新分配的读缓冲数量、0 代垃圾回收次数和内存峰值；再测包含解析、
+    统计和历史记录的完整流程。
+    """
+    import tracemalloc
+
+    directory = tempfile.mkdtemp(prefix='buffer_bench_')
+    path = os.path.join(directory, 'telemetry.log')
+    rng = random.Random(13349)
+    state = {}
+    block = ''.join(make_telemetry_frame(DEFAULT_DATA_FORMAT, rng, state) + '\n' for _ in range(20000)).encode('utf-8')
+    with open(path, 'wb') as f:
+        for _ in range(max(1, size_mb * 1000000 // len(block))):
+            f.write(block)
+    size = os.path.getsize(path)
+    print(f"{size / 1e6:.1f} MB 遥测数据，每次读取 {read_size} 字节")
+
+    def receive_bytes(port, parser, pipeline, display):
+        reads = 0
+        while True:
+            data = port.read(read_size)
+            if not data:
+                return reads
+            reads += 1
+            display.append(data)
+            frames = parser.split_frames(data)
+            if pipeline is None:
+                for frame in frames:
+                    frame.decode('utf-8')
+            else:
+                pipeline.process_frames(parser, frames, data)
+            display.clear()
+
+    def receive_slabs(port, parser, pipeline, display):
+        buffer = ReceiveBuffer(BufferPool())
+        while True:
+            data = buffer.read_from(port, read_size)
+            if not data:
+                return buffer.pool.allocated
+            display.append(data)
+            frames = buffer.take_frames(parser)
+            if pipeline is not None:
+                pipeline.process_frames(parser, frames, data)
+            display.clear()
+
+    print(f"{'阶段':>6} {'方式':>6} {'MB/秒':>8} {'新分配读缓冲':>12} {'0代GC':>8} {'内存峰值KB':>10}")
+    for stage in ('接收', '完整'):
+        for name, receive in (('bytes', receive_bytes), ('slab', receive_slabs)):
+            pipeline = None
+            if stage == '完整':
+                pipeline = TelemetryPipeline()
+                pipeline.configure(DEFAULT_DATA_FORMAT, ",", ":", [], DEFAULT_CMD_BUTTONS, history_hours=1)
+            parser = SensorParser(DEFAULT_DATA_FORMAT)
+            port = _FileSerialPort(path)
+            gc.collect()
+            collections = gc.get_stats()[0]['collections']
+            begin = time.perf_counter()
+            allocated = receive(port, parser, pipeline, [])
+            elapsed = time.perf_counter() - begin
+            collections = gc.get_stats()[0]['collections'] - collections
+            port.close()
+
+            peak = ''
+            if pipeline is None:
+                # 单独再跑一遍测内存峰值，tracemalloc 会明显拖慢速度
+                port = _FileSerialPort(path)
+                tracemalloc.start()
+                receive(port, parser, None, [])
+                peak = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+                port.close()
+            print(f"{stage:>6} {name:>6} {size / 1e6 / elapsed:>8.1f} {allocated:>12} {collections:>8} {peak:>10}")
+    shutil.rmtree(directory, ignore_errors=True)
+    return 0
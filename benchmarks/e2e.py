@@ -0,0 +1,277 @@
+"""端到端延迟回归测试：驱动真实的主窗口，测量从串口写入到界面重绘的延迟
+
+create_window、EndToEndRun、measure_e2e 和 compare_e2e_baseline 也供 tests/test_e2e.py 使用。
+"""
+import gc
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from serial_assistant import DEFAULT_DATA_FORMAT, DeviceSimulator, SerialAssistant, SettingsStore
+
+# 仓库中的参考基线，在参考机器上用 python -m benchmarks e2e --update-baseline 更新
+BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'e2e_baseline.json')
+RATES = (50, 100, 200, 500, 1000, 2000)
+# 各指标允许的绝对波动，避免数值很小时的相对误差误报
+SLACK = {'gauge_p50_ms': 2.0, 'gauge_p99_ms': 5.0, 'console_p50_ms': 2.0, 'console_p99_ms': 5.0,
+         'cpu_us_per_frame': 20.0}
+
+
+def _e2e_simulator_process(rate, baudrate, ports, stop):
+    """端到端测试的模拟器子进程：发送带时间戳的遥测，结束时回报发送的帧数"""
+    simulator = DeviceSimulator(DEFAULT_DATA_FORMAT, rate=rate, baudrate=baudrate, timestamp_key='TS')
+    ports.put(simulator.start())
+    stop.wait()
+    simulator.is_running = False
+    time.sleep(0.2)
+    ports.put(simulator.frames_sent)
+    simulator.stop()
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PaintProbe(QObject):
+    """端到端测试用的事件过滤器：控件重绘时调用 callback"""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.callback()
+        return False
+
+
+class EndToEndRun:
+    """驱动真实的 SerialAssistant：模拟器子进程经伪终端发送遥测，测量从写入到仪表盘/接收区重绘的延迟"""
+    TIMESTAMP = re.compile(rb'TS:([0-9.]+)')
+
+    def __init__(self, app, window):
+        self.app = app
+        self.window = window
+        self.gauge_latencies = []
+        self.console_latencies = []
+        self.console_pending = []
+
+        self.gauge = window.sensor_fields['发送时间']
+        self.gauge_painted_value = None
+        self.gauge_probe = PaintProbe(self.gauge_painted)
+        self.gauge.installEventFilter(self.gauge_probe)
+        self.console_probe = PaintProbe(self.console_painted)
+        window.receive_text.viewport().installEventFilter(self.console_probe)
+
+    def gauge_painted(self):
+        # 只统计显示了新数值的重绘（滚动统计刷新等也会触发重绘）
+        value = self.gauge.current_value
+        if value != self.gauge_painted_value:
+            self.gauge_painted_value = value
+            self.gauge_latencies.append(time.time() - value)
+
+    def console_received(self, data):
+        self.console_pending += [float(value) for value in self.TIMESTAMP.findall(bytes(data))]
+
+    def console_painted(self):
+        now = time.time()
+        self.console_latencies += [now - sent for sent in self.console_pending]
+        self.console_pending = []
+
+    def run(self, rate, duration, warmup=1.0, baudrate=921600):
+        """以指定频率运行 duration 秒（另加预热），返回测量结果字典"""
+        context = multiprocessing.get_context('spawn')
+        ports = context.Queue()
+        stop = context.Event()
+        process = context.Process(target=_e2e_simulator_process, args=(rate, baudrate, ports, stop), daemon=True)
+        process.start()
+        port = ports.get(timeout=30)
+
+        window = self.window
+        window.port_combo.addItem(port)
+        window.port_combo.setCurrentText(port)
+        window.baud_combo.setCurrentText(str(baudrate))
+        window.connect_port()
+        thread = window.serial_thread
+        thread.received.connect(self.console_received)
+        self.run_loop(warmup)
+
+        self.gauge_latencies.clear()
+        self.console_latencies.clear()
+        metrics = window.pipeline.metrics
+        counters_before = metrics.snapshot()[0]
+        cpu_start = time.process_time()
+        self.run_loop(duration)
+        cpu = time.process_time() - cpu_start
+        counters = metrics.snapshot()[0]
+        backlog = thread.backlog
+
+        # 先关闭串口再停止模拟器，避免伪终端关闭时的读取错误
+        window.disconnect_port()
+        stop.set()
+        sent = ports.get(timeout=10)
+        process.join(5)
+        self.app.processEvents()
+
+        parsed = counters['samples'] - counters_before['samples']
+        dropped = counters['dropped_updates'] - counters_before['dropped_updates']
+        gauge = sorted(self.gauge_latencies)
+        console = sorted(self.console_latencies)
+
+        def percentile(values, fraction):
+            return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else float('nan')
+
+        result = {
+            'sent_fps': sent / (duration + warmup),
+            'parsed_fps': parsed / duration,
+            'gauge_p50_ms': percentile(gauge, 0.5),
+            'gauge_p99_ms': percentile(gauge, 0.99),
+            'console_p50_ms': percentile(console, 0.5),
+            'console_p99_ms': percentile(console, 0.99),
+            'cpu_us_per_frame': cpu / max(parsed, 1) * 1e6,
+            'dropped_updates': dropped,
+        }
+        # 解析跟不上实际发送、界面更新被丢弃、积压未处理或延迟明显增大都视为出现积压
+        result['backlog'] = bool(parsed < result['sent_fps'] * duration * 0.9 or dropped or backlog > 10
+                                 or result['gauge_p99_ms'] > 250 or result['console_p99_ms'] > 250)
+        return result
+
+    def run_loop(self, seconds):
+        QTimer.singleShot(int(seconds * 1000), self.app.quit)
+        self.app.exec_()
+
+
+def compare_e2e_baseline(results, baseline, tolerance):
+    """与基线比较，返回退化项的说明列表；延迟、CPU和内存增长变大或最大持续帧率变小视为退化"""
+    regressions = []
+    for rate, base in baseline.get('rates', {}).items():
+        current = results['rates'].get(rate)
+        if current is None or base.get('backlog'):
+            continue
+        if current['backlog']:
+            regressions.append(f"{rate} 帧/秒: 出现积压（基线中没有）")
+            continue
+        for key, allowed in SLACK.items():
+            if current[key] > base[key] * (1 + tolerance) + allowed:
+                regressions.append(f"{rate} 帧/秒 {key}: {current[key]:.2f} > 基线 {base[key]:.2f}")
+    if results['max_sustained_fps'] < baseline.get('max_sustained_fps', 0):
+        regressions.append(f"最大持续帧率: {results['max_sustained_fps']} < 基线 {baseline['max_sustained_fps']}")
+    growth, base_growth = results.get('rss_growth_kb_per_1000_frames'), baseline.get('rss_growth_kb_per_1000_frames')
+    # 常驻内存受分配器影响波动较大，放宽一倍
+    if growth is not None and base_growth is not None and growth > base_growth * (1 + 2 * tolerance) + 100:
+        regressions.append(f"内存增长: {growth:.1f} KB/千帧 > 基线 {base_growth:.1f}")
+    return regressions
+
+
+def worst_e2e_results(runs):
+    """合并多次运行的结果，每项指标取最差值，作为基线时可容纳机器上的正常波动"""
+    worst = dict(runs[0], rates={})
+    for rate in runs[0]['rates']:
+        entries = [run['rates'][rate] for run in runs if rate in run['rates']]
+        merged = dict(entries[0])
+        for key in SLACK:
+            merged[key] = max(entry[key] for entry in entries)
+        merged['backlog'] = any(entry['backlog'] for entry in entries)
+        worst['rates'][rate] = merged
+    worst['max_sustained_fps'] = min(run['max_sustained_fps'] for run in runs)
+    growth = [run['rss_growth_kb_per_1000_frames'] for run in runs if 'rss_growth_kb_per_1000_frames' in run]
+    if growth:
+        worst['rss_growth_kb_per_1000_frames'] = max(growth)
+    worst['runs'] = len(runs)
+    return worst
+
+
+def create_window(directory):
+    """创建端到端测试用的主窗口，设置保存在 directory 中"""
+    window = SerialAssistant(SettingsStore(directory=directory))
+    data_format = dict(DEFAULT_DATA_FORMAT)
+    # 发送时刻作为一个量程足够大的通道显示，仪表盘重绘时其数值就是这一帧的发送时间
+    data_format['发送时间'] = {'key': 'TS', 'unit': 's', 'min': 0, 'max': 1e12}
+    window.data_format = data_format
+    window.update_sensor_fields()
+    window.update_pipeline()
+    window.resize(1280, 900)
+    window.show()
+    return window
+
+
+def measure_e2e(app, window, rates=RATES, duration=5.0, soak=30.0):
+    """逐级提高发送频率直到出现积压，再以 100 帧/秒运行 soak 秒测量内存增长，返回可与基线比较的结果字典"""
+    probe = EndToEndRun(app, window)
+    results = {'rates': {}, 'max_sustained_fps': 0,
+               'environment': {'python': sys.version.split()[0], 'platform': sys.platform,
+                               'cpu_count': os.cpu_count()}}
+    print(f"{'目标帧/秒':>10} {'解析帧/秒':>10} {'仪表盘p50':>10} {'仪表盘p99':>10} {'接收区p50':>10} "
+          f"{'接收区p99':>10} {'CPU微秒/帧':>10} {'积压':>6}")
+    for rate in rates:
+        result = probe.run(rate, duration)
+        results['rates'][str(rate)] = result
+        print(f"{rate:>10} {result['parsed_fps']:>10.0f} {result['gauge_p50_ms']:>10.2f} "
+              f"{result['gauge_p99_ms']:>10.2f} {result['console_p50_ms']:>10.2f} {result['console_p99_ms']:>10.2f} "
+              f"{result['cpu_us_per_frame']:>10.1f} {'是' if result['backlog'] else '否':>6}")
+        if result['backlog']:
+            break
+        results['max_sustained_fps'] = rate
+    print(f"最大持续帧率: {results['max_sustained_fps']} 帧/秒")
+
+    if soak > 0 and current_rss() is not None:
+        gc.collect()
+        rss_before = current_rss()
+        frames_before = window.pipeline.metrics.snapshot()[0]['samples']
+        probe.run(100, soak)
+        gc.collect()
+        frames = window.pipeline.metrics.snapshot()[0]['samples'] - frames_before
+        growth = (current_rss() - rss_before) / 1024 / max(frames, 1) * 1000
+        results['rss_growth_kb_per_1000_frames'] = growth
+        print(f"内存增长: {growth:.1f} KB/千帧（{soak:g} 秒, {frames} 帧，含历史记录和接收区文本）")
+    return results
+
+
+def benchmark_e2e(baseline=BASELINE, update=False, tolerance=0.25, soak=30.0, rates=RATES, duration=5.0, repeat=1):
+    """端到端延迟回归测试：在 offscreen Qt 平台上运行真实的主窗口，经伪终端接收模拟器数据
+
+    逐级提高发送频率，测量写入到仪表盘重绘、写入到接收区重绘的延迟、每帧CPU时间和最大持续帧率，
+    再以 100 帧/秒运行 soak 秒测量内存增长。结果与 JSON 基线比较，有退化时返回 1；
+    指定 update 时运行 repeat 次，把各项指标的最差值写为新的基线。
+    """
+    if not hasattr(os, 'openpty'):
+        print("端到端测试需要伪终端，只能在 Linux/macOS 上运行")
+        return 1
+    if not update and not os.path.exists(baseline):
+        print(f"基线文件 {baseline} 不存在，使用 --update-baseline 生成")
+        return 1
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    directory = tempfile.mkdtemp(prefix='e2e_bench_')
+    window = create_window(directory)
+    runs = [measure_e2e(app, window, rates, duration, soak) for _ in range(repeat if update else 1)]
+    window.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    results = runs[0]
+    if update:
+        results = worst_e2e_results(runs)
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"已写入基线 {baseline}")
+        return 0
+    with open(baseline, 'r', encoding='utf-8') as f:
+        regressions = compare_e2e_baseline(results, json.load(f), tolerance)
+    for regression in regressions:
+        print(f"退化: {regression}")
+    print("与基线相比没有退化" if not regressions else f"共 {len(regressions)} 项退化")
+    return 1 if regressions else 0
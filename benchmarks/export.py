@@ -0,0 +1,57 @@
+"""历史导出基准测试"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from array import array
+
+from serial_assistant import (DEFAULT_DATA_FORMAT, HistoryChunk, HistoryExporter, SampleHistory, SensorParser,
+                              make_telemetry_frame)
+
+
+def benchmark_export(hours=24.0, rate=50.0, directory=None):
+    """历史导出基准测试：生成一天 50Hz 的全部字段数据，分别导出为各种格式并计时"""
+    history = SampleHistory(retention=hours * 3600 + 3600)
+    history.set_fields(DEFAULT_DATA_FORMAT)
+    rows = int(hours * 3600 * rate)
+
+    # 先生成一个数据块的随机游走数据，再平移时间复制出全部数据块
+    rng = random.Random(13349)
+    state = {}
+    parser = SensorParser(DEFAULT_DATA_FORMAT)
+    template = [parser.parse_frame(make_telemetry_frame(DEFAULT_DATA_FORMAT, rng, state).encode('utf-8'))
+                for _ in range(SampleHistory.CHUNK_ROWS)]
+    block = SampleHistory()
+    block.set_fields(DEFAULT_DATA_FORMAT)
+    block.append(template, 0.0)
+    template_chunk = block.chunks[0]
+
+    start_time = time.time() - hours * 3600
+    for first in range(0, rows, SampleHistory.CHUNK_ROWS):
+        count = min(SampleHistory.CHUNK_ROWS, rows - first)
+        chunk = HistoryChunk(history.fields)
+        chunk.times = array('d', (start_time + (first + i) / rate for i in range(count)))
+        for name in history.fields:
+            chunk.columns[name] = template_chunk.columns[name][:count]
+        history.chunks.append(chunk)
+    for i in range(int(hours * 3600 / 10)):
+        history.add_raw(b'T:25.00,H:50.00\n' * 10, start_time + i * 10)
+
+    # 未指定目录时写到临时目录，结束后删除；指定的目录中保留导出的文件
+    temporary = directory is None
+    directory = directory or tempfile.mkdtemp(prefix='export_bench_')
+    print(f"导出 {rows} 行 x {len(history.fields)} 个字段 ({hours:g} 小时 {rate:g}Hz) 到 {directory}")
+    try:
+        for fmt in HistoryExporter.available_formats():
+            path = os.path.join(directory, 'history' + HistoryExporter.FORMATS[fmt])
+            parts, raw_parts = history.select()
+            begin = time.perf_counter()
+            written = HistoryExporter(parts, raw_parts, path, fmt).run()
+            elapsed = time.perf_counter() - begin
+            size = sum(os.path.getsize(path) for path in written)
+            print(f"{fmt:>8}: {elapsed:6.2f} 秒, {size / 1e6:8.1f} MB, {rows / elapsed:12.0f} 行/秒")
+    finally:
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
@@ -0,0 +1,166 @@
+"""遥测转发服务负载测试"""
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import random
+import socket
+import time
+
+from serial_assistant import DEFAULT_DATA_FORMAT, SensorParser, TelemetryServer, make_telemetry_frame
+
+
+def _fanout_client_process(ws_port, tcp_port, tcp_count, ws_count, slow_count, total_bytes, message_count, results):
+    """负载测试的客户端进程：在独立进程中运行一组客户端，避免与服务端争用 GIL"""
+    async def open_websocket(slow):
+        sock = None
+        if slow:
+            # 慢速客户端使用很小的接收缓冲区且从不读取，使服务端的发送缓冲区很快积压
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.connect(('127.0.0.1', ws_port))
+            sock.setblocking(False)
+            reader, writer = await asyncio.open_connection(sock=sock)
+        else:
+            reader, writer = await asyncio.open_connection('127.0.0.1', ws_port)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        writer.write(('GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n').encode('ascii'))
+        await reader.readuntil(b'\r\n\r\n')
+        return reader, writer
+
+    async def tcp_client(connection):
+        reader, writer = connection
+        count = 0
+        while count < total_bytes:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            count += len(chunk)
+        writer.close()
+        return 'tcp', count, []
+
+    async def ws_client(connection):
+        reader, writer = connection
+        count = 0
+        sample_messages = 0
+        latencies = []
+        buffer = bytearray()
+        while sample_messages < message_count:
+            chunk = await reader.read(262144)
+            if not chunk:
+                break
+            buffer += chunk
+            # 整块解析缓冲区中的完整帧，每10条采样消息记录一次延迟
+            offset = 0
+            while len(buffer) - offset >= 2:
+                opcode = buffer[offset] & 0x0F
+                length = buffer[offset + 1] & 0x7F
+                header = 2
+                if length == 126:
+                    header = 4
+                    length = int.from_bytes(buffer[offset + 2:offset + 4], 'big')
+                elif length == 127:
+                    header = 10
+                    length = int.from_bytes(buffer[offset + 2:offset + 10], 'big')
+                if len(buffer) - offset < header + length:
+                    break
+                if opcode == 0x1:
+                    if sample_messages % 10 == 0:
+                        payload = bytes(buffer[offset + header:offset + header + length])
+                        latencies.append(time.time() - json.loads(payload)['t'])
+                    sample_messages += 1
+                else:
+                    count += length
+                offset += header + length
+            del buffer[:offset]
+        writer.close()
+        return 'ws', count, latencies
+
+    async def main():
+        tcp = [await asyncio.open_connection('127.0.0.1', tcp_port) for _ in range(tcp_count)]
+        ws = [await open_websocket(False) for _ in range(ws_count)]
+        slow = [await open_websocket(True) for _ in range(slow_count)]
+        results.put(('ready', len(tcp) + len(ws) + len(slow)))
+        outcome = await asyncio.wait_for(asyncio.gather(*[tcp_client(c) for c in tcp], *[ws_client(c) for c in ws]), 120)
+        for _, writer in slow:
+            writer.close()
+        results.put(('done', outcome))
+
+    asyncio.run(main())
+
+
+def benchmark_fanout(client_count=300, message_count=1000, rate=100, slow_clients=10, chunk_size=1024, processes=4):
+    """遥测转发服务负载测试：数百个本地 TCP/WebSocket 客户端同时接收，另有若干不读数据的慢速客户端
+
+    默认每秒发布 100 次约 1KB 的原始数据，相当于 921600 波特率下接收线程每 10ms 读取一次的数据量。
+    """
+    rng = random.Random(13349)
+    parser = SensorParser(DEFAULT_DATA_FORMAT)
+    state = {}
+    messages = []
+    for _ in range(message_count):
+        frames = []
+        while sum(len(frame) for frame in frames) < chunk_size:
+            frames.append(make_telemetry_frame(DEFAULT_DATA_FORMAT, rng, state).encode('utf-8') + b'\n')
+        messages.append((b''.join(frames), [parser.parse_frame(frame) for frame in frames]))
+    total_bytes = sum(len(data) for data, _ in messages)
+
+    server = TelemetryServer('127.0.0.1', 0, 0)
+    server.start()
+
+    normal = client_count - slow_clients
+    results = multiprocessing.Queue()
+    workers = []
+    for i in range(processes):
+        share = normal // processes + (1 if i < normal % processes else 0)
+        slow_share = slow_clients // processes + (1 if i < slow_clients % processes else 0)
+        worker = multiprocessing.Process(target=_fanout_client_process, daemon=True, args=(
+            server.ws_port, server.tcp_port, share // 2, share - share // 2, slow_share,
+            total_bytes, message_count, results))
+        worker.start()
+        workers.append(worker)
+    connected = sum(results.get(timeout=60)[1] for _ in workers)
+
+    publish_time = 0.0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i, (data, samples) in enumerate(messages):
+        begin = time.perf_counter()
+        server.publish_raw(data)
+        server.publish_samples(samples)
+        publish_time += time.perf_counter() - begin
+        delay = start + (i + 1) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    outcomes = []
+    for _ in workers:
+        outcomes.extend(results.get(timeout=150)[1])
+    elapsed = time.perf_counter() - start
+    server_cpu = time.process_time() - cpu_start
+    for worker in workers:
+        worker.join(5)
+    server.stop()
+
+    complete = {'tcp': 0, 'ws': 0}
+    counts = {'tcp': 0, 'ws': 0}
+    latencies = []
+    for kind, count, client_latencies in outcomes:
+        counts[kind] += 1
+        complete[kind] += count == total_bytes
+        latencies.extend(client_latencies)
+    latencies.sort()
+
+    print(f"客户端: 已连接 {connected}, TCP {counts['tcp']}, WebSocket {counts['ws']}, 慢速 {slow_clients}")
+    print(f"消息: {message_count} 条, 每条原始数据 {total_bytes // message_count} 字节, 目标速率 {rate} 条/秒")
+    print(f"完整接收: TCP {complete['tcp']}/{counts['tcp']}, WebSocket {complete['ws']}/{counts['ws']}")
+    print(f"总转发量: {total_bytes * (complete['tcp'] + complete['ws']) / elapsed / 1e6:.1f} MB/s, 用时 {elapsed:.2f} 秒")
+    print(f"发布耗时: {publish_time / message_count * 1e6:.1f} 微秒/条 (与客户端数量无关)")
+    print(f"服务端进程CPU: {server_cpu:.2f} 秒 ({server_cpu / elapsed * 100:.0f}%)")
+    if latencies:
+        print(f"采样延迟: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"因积压过多断开的慢速客户端: {server.slow_disconnects}")
+    return 0 if complete['tcp'] == counts['tcp'] and complete['ws'] == counts['ws'] else 1
@@ -0,0 +1,57 @@
+"""接收流程基准测试：设备模拟器经伪终端发送，由真实的 SerialThread 接收和解析"""
+import threading
+import time
+
+import serial
+from PyQt5.QtCore import Qt
+
+from serial_assistant import DEFAULT_CMD_BUTTONS, DEFAULT_DATA_FORMAT, DeviceSimulator, SerialThread, TelemetryPipeline
+
+
+def benchmark_pipeline(rates=(50, 200, 500, 1000), duration=5.0, baudrate=921600):
+    """接收流程基准测试：设备模拟器经伪终端发送带时间戳的遥测，由真实的 SerialThread 接收和解析
+
+    对每个发送频率统计实际解析帧率、从写入到解析完成的延迟以及每帧CPU时间。
+    """
+    data_format = dict(DEFAULT_DATA_FORMAT)
+    data_format['发送时间'] = {'key': 'TS', 'unit': 's'}
+
+    print(f"{'目标帧/秒':>10} {'发送帧/秒':>10} {'解析帧/秒':>10} {'丢失':>6} "
+          f"{'p50延迟ms':>10} {'p99延迟ms':>10} {'CPU微秒/帧(含模拟器)':>11}")
+    for rate in rates:
+        simulator = DeviceSimulator(DEFAULT_DATA_FORMAT, rate=rate, baudrate=baudrate, timestamp_key='TS')
+        port = simulator.start()
+        serial_port = serial.Serial(port, baudrate, timeout=0.1)
+        pipeline = TelemetryPipeline()
+        pipeline.configure(data_format, ",", ":", [], DEFAULT_CMD_BUTTONS)
+
+        latencies = []
+        def on_samples(samples):
+            now = time.time()
+            reader.samples_delivered()
+            for values in samples:
+                if '发送时间' in values:
+                    latencies.append(now - values['发送时间'])
+
+        reader = SerialThread(serial_port, pipeline)
+        reader.samples_ready.connect(on_samples, Qt.DirectConnection)
+        worker = threading.Thread(target=reader.run, daemon=True)
+        cpu_start = time.process_time()
+        worker.start()
+        time.sleep(duration)
+        simulator.is_running = False
+        time.sleep(0.2)
+        reader.is_running = False
+        worker.join(2)
+        cpu = time.process_time() - cpu_start
+        sent = simulator.frames_sent
+        simulator.stop()
+        serial_port.close()
+
+        latencies.sort()
+        received = len(latencies)
+        p50 = latencies[received // 2] * 1000 if latencies else float('nan')
+        p99 = latencies[int(received * 0.99)] * 1000 if latencies else float('nan')
+        print(f"{rate:>10} {sent / duration:>10.0f} {received / duration:>10.0f} {sent - received:>6} "
+              f"{p50:>10.2f} {p99:>10.2f} {cpu / max(received, 1) * 1e6:>11.1f}")
+    return 0
@@ -0,0 +1,42 @@
+"""自动规则基准测试"""
+import random
+import time
+
+from serial_assistant import DEFAULT_CMD_BUTTONS, DEFAULT_DATA_FORMAT, TelemetryPipeline, make_telemetry_frame
+
+
+def benchmark_rules(rule_counts=(0, 100, 500, 1000), frame_count=50000, frames_per_read=8):
+    """自动规则基准测试：测量不同规则数量下每帧 解析+规则求值 的耗时"""
+    rng = random.Random(13349)
+    data_format = DEFAULT_DATA_FORMAT
+    numeric = [name for name in data_format if name != '当前状态']
+    state = {}
+    frames = [make_telemetry_frame(data_format, rng, state).encode('utf-8') + b'\n' for _ in range(1000)]
+    reads = [b''.join(frames[i:i + frames_per_read]) for i in range(0, len(frames), frames_per_read)]
+
+    print(f"{'规则数':>8} {'帧/秒':>12} {'微秒/帧':>10} {'触发次数':>10}")
+    for count in rule_counts:
+        rules = []
+        for _ in range(count):
+            name = rng.choice(numeric)
+            info = data_format[name]
+            threshold = rng.uniform(info.get('min', 0), info.get('max', 100))
+            op = rng.choice(['<', '>', '<=', '>='])
+            rules.append(f"{name} {op} {threshold:.2f} hyst 0.5 for {rng.randint(0, 5)}s -> alarm")
+
+        pipeline = TelemetryPipeline()
+        pipeline.configure(data_format, ",", ":", rules, DEFAULT_CMD_BUTTONS)
+
+        processed = 0
+        fired = 0
+        now = 0.0
+        start = time.perf_counter()
+        while processed < frame_count:
+            for data in reads:
+                now += 0.02 * frames_per_read  # 模拟 50Hz 遥测的时间推进
+                samples, actions = pipeline.process(data, now=now)
+                processed += len(samples)
+                fired += len(actions)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>8} {processed / elapsed:>12.0f} {elapsed / processed * 1e6:>10.2f} {fired:>10}")
+    return 0
@@ -0,0 +1,54 @@
+"""文件发送基准测试"""
+import os
+import random
+import tempfile
+
+import serial
+
+from serial_assistant import DeviceSimulator, FileTransfer, SerialThread, TransferError
+
+
+def benchmark_transfer(size_kb=128, baudrates=(115200, 921600), directory=None):
+    """经伪终端向设备模拟器发送文件，测量各发送方式相对线路速率的吞吐量并校验收到的内容"""
+    if not hasattr(os, 'openpty'):
+        print("当前系统不支持伪终端，无法运行文件发送基准测试")
+        return 1
+    path = os.path.join(directory or tempfile.gettempdir(), 'transfer_bench.bin')
+    with open(path, 'wb') as f:
+        f.write(random.Random(1).randbytes(size_kb * 1024))
+    with open(path, 'rb') as f:
+        content = f.read()
+    cases = (('raw', 1), ('xmodem', 1), ('xmodem', 8), ('ymodem', 1), ('ymodem', 8))
+    print(f"发送 {size_kb} KB 文件到设备模拟器")
+    failures = 0
+    for baudrate in baudrates:
+        for mode, window in cases:
+            simulator = DeviceSimulator(rate=1.0, baudrate=baudrate)
+            port = simulator.start()
+            serial_port = serial.Serial(port, baudrate, timeout=0)
+            reader = SerialThread(serial_port)
+            command = None if mode == 'raw' else DeviceSimulator.UPDATE_COMMAND
+            transfer = FileTransfer(serial_port.write, path, mode, baudrate=baudrate, window=window, command=command)
+            reader.rx_tap = transfer.feed
+            reader.start()
+            error = None
+            try:
+                transfer.run()
+            except TransferError as e:
+                error = str(e)
+            finally:
+                reader.stop()
+                serial_port.close()
+                simulator.stop()
+            if mode == 'raw':
+                check = '-'
+            else:
+                name = os.path.basename(path) if mode == 'ymodem' else 'xmodem'
+                check = '一致' if simulator.received_files.get(name) == content else '不一致'
+            if error or check == '不一致':
+                failures += 1
+            print(f"{baudrate:>7} 波特 {mode:<6} 窗口 {window:>2}: {transfer.throughput / 1024:7.1f} KB/秒 "
+                  f"(线路速率的 {transfer.throughput * 10 / baudrate:6.1%}), 重发 {transfer.retransmits} 块, "
+                  f"内容 {check}" + (f", 失败: {error}" if error else ''))
+    os.remove(path)
+    return 1 if failures else 0
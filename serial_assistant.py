@@ -5,6 +5,35 @@ import sys
 import time
 import json
 import os
+import re
+import random
+import operator
+import functools
+import argparse
+import ast
+import heapq
+import bisect
+import threading
+import weakref
+import asyncio
+import base64
+import binascii
+import codecs
+import hashlib
+import math
+import struct
+import socket
+import multiprocessing
+import select
+import copy
+import tempfile
+import zipfile
+import importlib.util
+import urllib.parse
+import http.server
+import concurrent.futures
+from array import array
+from collections import deque, namedtuple
 import serial
 import serial.tools.list_ports
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
@@ -12,9 +41,58 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                             QGroupBox, QGridLayout, QCheckBox, QSpinBox, QSplitter, 
                             QMenuBar, QMenu, QAction, QDialog, QTabWidget, QFormLayout,
                             QDialogButtonBox, QTableWidget, QTableWidgetItem, QHeaderView,
-                            QMessageBox, QFileDialog, QScrollArea)
-from PyQt5.QtCore import QTimer, pyqtSignal, QThread, Qt, QSettings, QRectF
-from PyQt5.QtGui import QFont, QColor, QPalette, QPainter, QPen
+                            QMessageBox, QFileDialog, QScrollArea, QInputDialog,
+                            QDateTimeEdit, QProgressDialog, QDoubleSpinBox)
+from PyQt5.QtCore import QTimer, pyqtSignal, QThread, Qt, QSettings, QRectF, QRect, QObject, QDateTime
+from PyQt5.QtGui import QFont, QColor, QPalette, QPainter, QPen, QPixmap, QTextCursor
+
+
+def paint_gauge_static(painter, title, unit):
+    """绘制仪表盘中不随数值变化的部分（标题、表盘背景、单位），坐标系为以中心为原点的 200x200"""
+    # 绘制标题
+    painter.setPen(QColor(0, 0, 0))
+    font = QFont("Microsoft YaHei", 12, QFont.Bold)
+    painter.setFont(font)
+    painter.drawText(QRectF(-100, -95, 200, 30), Qt.AlignCenter, title)
+
+    # 绘制仪表盘背景
+    painter.setPen(QPen(QColor(220, 220, 220), 15))
+    painter.drawArc(QRectF(-70, -60, 140, 140), -45 * 16, 270 * 16)
+
+    # 绘制单位
+    painter.setPen(QColor(0, 0, 0))
+    font.setPointSize(10)
+    font.setBold(False)
+    painter.setFont(font)
+    painter.drawText(QRectF(-100, 20, 200, 30), Qt.AlignCenter, unit)
+
+
+def paint_gauge_value(painter, value, min_val, max_val, stats_text):
+    """绘制仪表盘的当前值弧线、数值文本和滚动统计，坐标系同 paint_gauge_static"""
+    # 绘制当前值
+    pen = QPen(QColor(90, 155, 213), 15)
+    pen.setCapStyle(Qt.RoundCap)
+    painter.setPen(pen)
+    
+    angle_range = 270.0
+    value_range = max_val - min_val if max_val - min_val != 0 else 1
+    
+    span_angle = (value - min_val) / value_range * angle_range
+    painter.drawArc(QRectF(-70, -60, 140, 140), -45 * 16, int(span_angle) * 16)
+    
+    # 绘制中心文本
+    painter.setPen(QColor(0, 0, 0))
+    font = QFont("Microsoft YaHei", 18, QFont.Bold)
+    painter.setFont(font)
+    painter.drawText(QRectF(-100, -20, 200, 40), Qt.AlignCenter, f"{value:.1f}")
+
+    # 绘制滚动统计（位于仪表盘底部缺口处）
+    if stats_text:
+        font.setPointSize(7)
+        font.setBold(False)
+        painter.setFont(font)
+        painter.setPen(QColor(110, 110, 110))
+        painter.drawText(QRectF(-100, 50, 200, 45), Qt.AlignCenter, stats_text)
 
 
 class GaugeWidget(QWidget):
@@ -26,6 +104,7 @@ class GaugeWidget(QWidget):
         self.min_val = min_val
         self.max_val = max_val
         self.current_value = min_val
+        self.stats_text = ''  # 仪表盘下方显示的滚动统计
 
         self.setMinimumSize(160, 160)
 
@@ -38,6 +117,20 @@ class GaugeWidget(QWidget):
             self.current_value = self.max_val
         self.update()  # 触发重绘
 
+    def setStats(self, text):
+        if text != self.stats_text:
+            self.stats_text = text
+            self.update()
+
+    def configure(self, unit, min_val, max_val):
+        """就地修改单位和量程，保留当前值"""
+        if (unit, min_val, max_val) == (self.unit, self.min_val, self.max_val):
+            return
+        self.unit = unit
+        self.min_val = min_val
+        self.max_val = max_val
+        self.setValue(self.current_value)
+
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -46,73 +139,3283 @@ class GaugeWidget(QWidget):
         painter.translate(self.width() / 2, self.height() / 2)
         painter.scale(side / 200.0, side / 200.0)
 
-        # 绘制标题
-        painter.setPen(QColor(0, 0, 0))
-        font = QFont("Microsoft YaHei", 12, QFont.Bold)
-        painter.setFont(font)
-        painter.drawText(QRectF(-100, -95, 200, 30), Qt.AlignCenter, self.title)
+        paint_gauge_static(painter, self.title, self.unit)
+        paint_gauge_value(painter, self.current_value, self.min_val, self.max_val, self.stats_text)
 
-        # 绘制仪表盘背景
-        painter.setPen(QPen(QColor(220, 220, 220), 15))
-        painter.drawArc(QRectF(-70, -60, 140, 140), -45 * 16, 270 * 16)
 
-        # 绘制当前值
-        pen = QPen(QColor(90, 155, 213), 15)
-        pen.setCapStyle(Qt.RoundCap)
-        painter.setPen(pen)
-        
-        angle_range = 270.0
-        value_range = self.max_val - self.min_val if self.max_val - self.min_val != 0 else 1
-        
-        span_angle = (self.current_value - self.min_val) / value_range * angle_range
-        painter.drawArc(QRectF(-70, -60, 140, 140), -45 * 16, int(span_angle) * 16)
-        
-        # 绘制中心文本
-        painter.setPen(QColor(0, 0, 0))
-        font.setPointSize(18)
-        font.setBold(True)
-        painter.setFont(font)
-        painter.drawText(QRectF(-100, -20, 200, 40), Qt.AlignCenter, f"{self.current_value:.1f}")
+class GaugeChannel:
+    """GaugeGridWidget 中的一个格子，接口与 GaugeWidget（文本格与 QLineEdit）相同，便于统一更新"""
+    __slots__ = ('grid', 'index', 'title', 'unit', 'min_val', 'max_val', 'current_value',
+                 'text', 'stats_text', 'is_text')
 
-        font.setPointSize(10)
-        font.setBold(False)
-        painter.setFont(font)
-        painter.drawText(QRectF(-100, 20, 200, 30), Qt.AlignCenter, self.unit)
+    def __init__(self, grid, index, title, unit, min_val=0, max_val=100, is_text=False):
+        self.grid = grid
+        self.index = index
+        self.title = title
+        self.unit = unit
+        self.min_val = min_val
+        self.max_val = max_val
+        self.current_value = min_val
+        self.text = "待机"
+        self.stats_text = ''
+        self.is_text = is_text
+
+    def setValue(self, value):
+        value = min(max(value, self.min_val), self.max_val)
+        if value != self.current_value:
+            self.current_value = value
+            self.grid.mark_dirty(self.index)
 
+    def setText(self, text):
+        if text != self.text:
+            self.text = text
+            self.grid.mark_dirty(self.index)
 
-class SerialThread(QThread):
-    """串口数据接收线程"""
-    received = pyqtSignal(bytes)
+    def setStats(self, text):
+        if text != self.stats_text:
+            self.stats_text = text
+            self.grid.mark_dirty(self.index)
 
-    def __init__(self, serial_port):
-        super().__init__()
-        self.serial_port = serial_port
-        self.is_running = True
+    def configure(self, unit, min_val, max_val):
+        """就地修改单位和量程，返回静态部分是否需要重新绘制"""
+        if (unit, min_val, max_val) == (self.unit, self.min_val, self.max_val):
+            return False
+        static_changed = unit != self.unit
+        self.unit = unit
+        self.min_val = min_val
+        self.max_val = max_val
+        self.current_value = min(max(self.current_value, min_val), max_val)
+        self.grid.mark_dirty(self.index)
+        return static_changed
 
-    def run(self):
-        while self.is_running and self.serial_port and self.serial_port.is_open:
+
+class GaugeGridWidget(QWidget):
+    """在一个控件中绘制全部仪表盘，适合通道很多的情况
+
+    数值变化时只把对应格子标记为需要重绘，Qt 会把同一轮的脏区域合并，paintEvent 一次画完；
+    标题、表盘背景和单位预先绘制到按格子大小缓存的 QPixmap 中，重绘时只画数值部分。
+    """
+    COLUMNS = 4       # 每行格子数，与原来的网格布局一致
+    CELL_MIN = 160    # 格子的最小边长
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.channels = {}   # 传感器名称 -> GaugeChannel
+        self.order = []      # 按显示顺序排列的 GaugeChannel
+        self._static_cache = {}  # 格子序号 -> 静态部分的 QPixmap
+
+    def set_channels(self, data_format):
+        """按 data_format 更新格子：保留未变化通道的当前值和静态缓存，只处理增删改的通道"""
+        channels = {}
+        order = []
+        static_cache = {}
+        dirty = []
+        for name, info in data_format.items():
+            unit, min_val, max_val = info.get('unit', ''), info.get('min', 0), info.get('max', 100)
+            index = len(order)
+            channel = self.channels.get(name)
+            if channel is None:
+                channel = GaugeChannel(self, index, name, unit, min_val, max_val, name == '当前状态')
+                dirty.append(index)
+            else:
+                old_index = channel.index
+                channel.index = index
+                static_changed = channel.configure(unit, min_val, max_val)
+                if old_index != index or static_changed:
+                    dirty.append(index)
+                # 所有格子大小相同，静态图像与位置无关，移动后仍可复用
+                if not static_changed and old_index in self._static_cache:
+                    static_cache[index] = self._static_cache[old_index]
+            channels[name] = channel
+            order.append(channel)
+
+        layout_changed = len(order) != len(self.order)
+        self.channels = channels
+        self.order = order
+        self._static_cache = static_cache
+        if layout_changed:
+            # 格子数量变化后格子尺寸随之改变，缓存全部失效
+            static_cache.clear()
+            rows = max(1, (len(order) + self.COLUMNS - 1) // self.COLUMNS)
+            self.setMinimumSize(self.COLUMNS * self.CELL_MIN, rows * self.CELL_MIN)
+            self.updateGeometry()
+            self.update()
+        else:
+            for index in dirty:
+                self.mark_dirty(index)
+
+    def cell_rect(self, index):
+        rows = max(1, (len(self.order) + self.COLUMNS - 1) // self.COLUMNS)
+        width = self.width() // self.COLUMNS
+        height = self.height() // rows
+        row, col = divmod(index, self.COLUMNS)
+        return QRect(col * width, row * height, width, height)
+
+    def mark_dirty(self, index):
+        self.update(self.cell_rect(index))
+
+    def resizeEvent(self, event):
+        self._static_cache.clear()
+        super().resizeEvent(event)
+
+    def static_pixmap(self, channel, rect):
+        """返回格子静态部分的缓存图像，格子大小变化后重新生成"""
+        pixmap = self._static_cache.get(channel.index)
+        if pixmap is not None:
+            return pixmap
+
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(rect.width() * ratio), int(rect.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        self.transform_to_cell(painter, QRect(0, 0, rect.width(), rect.height()))
+        if channel.is_text:
+            painter.setPen(QColor(0, 0, 0))
+            painter.setFont(QFont("Microsoft YaHei", 12, QFont.Bold))
+            painter.drawText(QRectF(-100, -50, 200, 30), Qt.AlignCenter, channel.title)
+        else:
+            paint_gauge_static(painter, channel.title, channel.unit)
+        painter.end()
+
+        self._static_cache[channel.index] = pixmap
+        return pixmap
+
+    @staticmethod
+    def transform_to_cell(painter, rect):
+        """把坐标系变换为格子中心为原点的 200x200（与 GaugeWidget 相同）"""
+        side = min(rect.width(), rect.height())
+        painter.translate(rect.x() + rect.width() / 2, rect.y() + rect.height() / 2)
+        painter.scale(side / 200.0, side / 200.0)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        region = event.region()
+
+        for channel in self.order:
+            rect = self.cell_rect(channel.index)
+            if not region.intersects(rect):
+                continue
+            painter.drawPixmap(rect.topLeft(), self.static_pixmap(channel, rect))
+
+            painter.save()
+            self.transform_to_cell(painter, rect)
+            if channel.is_text:
+                painter.setPen(QColor(0, 0, 0))
+                painter.setFont(QFont("Microsoft YaHei", 16, QFont.Bold))
+                painter.drawText(QRectF(-100, -15, 200, 40), Qt.AlignCenter, channel.text)
+            else:
+                paint_gauge_value(painter, channel.current_value, channel.min_val, channel.max_val,
+                                  channel.stats_text)
+            painter.restore()
+
+
+def place_grid_widget(layout, widget, row, col):
+    """把控件放到网格布局的指定位置，已经在该位置时不做任何操作"""
+    index = layout.indexOf(widget)
+    if index >= 0:
+        if layout.getItemPosition(index)[:2] == (row, col):
+            return
+        layout.removeWidget(widget)
+    layout.addWidget(widget, row, col)
+
+
+# 默认快捷指令
+DEFAULT_CMD_BUTTONS = {
+    '前进': 'CMD:FWD',
+    '后退': 'CMD:BWD',
+    '左转': 'CMD:LEFT',
+    '右转': 'CMD:RIGHT',
+    '停止': 'CMD:STOP',
+    '自动模式': 'CMD:AUTO',
+    '手动模式': 'CMD:MANUAL',
+}
+
+# 默认数据解析格式
+DEFAULT_DATA_FORMAT = {
+    '温度': {'key': 'T', 'unit': '℃', 'min': 0, 'max': 50},
+    '湿度': {'key': 'H', 'unit': '%', 'min': 0, 'max': 100},
+    '光照': {'key': 'L', 'unit': 'lux', 'min': 0, 'max': 2000},
+    '土壤湿度': {'key': 'SM', 'unit': '%', 'min': 0, 'max': 100},
+    '电池电量': {'key': 'BAT', 'unit': 'V', 'min': 3.0, 'max': 4.2},
+    '太阳能电压': {'key': 'SOL', 'unit': 'V', 'min': 0, 'max': 6},
+    '行进速度': {'key': 'SPD', 'unit': 'cm/s', 'min': 0, 'max': 50},
+    '当前状态': {'key': 'ST', 'unit': ''}, # '当前状态' 作为特殊文本处理
+}
+
+# 状态码 -> 显示文本（用于 '当前状态' 字段）
+STATUS_MAP = {
+    '0': '待机',
+    '1': '自动监控',
+    '2': '手动控制',
+    '3': '充电中',
+    '4': '报警'
+}
+
+
+def make_crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = make_crc8_table()
+
+
+def checksum_xor(data):
+    """逐字节异或"""
+    return functools.reduce(operator.xor, data, 0)
+
+
+def checksum_crc8(data):
+    """CRC-8（多项式 0x07，初值 0），查表计算"""
+    table = CRC8_TABLE
+    crc = 0
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+def checksum_crc16(data):
+    """CRC-16/XMODEM（多项式 0x1021，初值 0），binascii 内部查表计算"""
+    return binascii.crc_hqx(data, 0)
+
+
+class FrameCheck:
+    """帧校验和链路质量统计：可选的校验和字段与序号字段
+
+    校验和字段放在帧末尾（例如 T:25.1,SEQ:17,CK:5A），以十六进制书写，覆盖该字段前的分隔符之前的
+    全部字节；校验失败或缺少校验和的帧整帧丢弃。序号按 sequence_modulus 回绕，跳号计为丢帧，
+    REORDER_WINDOW 以内迟到的缺失帧计为乱序并从丢帧中扣回，窗口内已收到过的序号计为重复，
+    更大的回退视为设备重启后重新同步。计数器由接收线程累加，每次读取后由 take_counts 取走。
+    """
+    ALGORITHMS = {'XOR': checksum_xor, 'CRC8': checksum_crc8, 'CRC16': checksum_crc16}
+    REORDER_WINDOW = 32
+    COUNTERS = ('checked_frames', 'checksum_errors', 'sequenced_frames', 'lost_frames', 'out_of_order',
+                'duplicate_frames', 'sequence_resets')
+
+    def __init__(self, checksum=None, checksum_key='CK', sequence_key='', sequence_modulus=256,
+                 data_separator=",", kv_separator=":"):
+        if checksum and checksum not in self.ALGORITHMS:
+            raise ValueError(f"未知的校验方式: {checksum}")
+        self.function = self.ALGORITHMS[checksum] if checksum else None
+        self.marker = f"{data_separator}{checksum_key}{kv_separator}"
+        self.sequence_key = sequence_key
+        self.modulus = max(2, int(sequence_modulus))
+        self.last_sequence = None
+        self.missing = set()  # 最近 REORDER_WINDOW 个序号中跳过的序号，迟到时从丢帧中扣回
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+
+    @classmethod
+    def from_settings(cls, settings, data_separator=",", kv_separator=":"):
+        """按设置字典创建，没有启用任何校验时返回 None"""
+        if not settings or not (settings.get('checksum') or settings.get('sequence_key')):
+            return None
+        return cls(settings.get('checksum'), settings.get('checksum_key') or 'CK', settings.get('sequence_key', ''),
+                   settings.get('sequence_modulus', 256), data_separator, kv_separator)
+
+    def verify(self, text):
+        """校验并去掉校验和字段，失败时返回 None"""
+        if self.function is None:
+            return text
+        counts = self.counts
+        counts['checked_frames'] += 1
+        body, marker, value = text.rpartition(self.marker)
+        try:
+            if marker and self.function(body.encode('utf-8')) == int(value.strip(), 16):
+                return body
+        except ValueError:
+            pass
+        counts['checksum_errors'] += 1
+        return None
+
+    def sequence(self, value):
+        """处理一帧的序号字段"""
+        try:
+            number = int(value) % self.modulus
+        except ValueError:
+            return
+        counts = self.counts
+        counts['sequenced_frames'] += 1
+        last = self.last_sequence
+        if last is None:
+            self.last_sequence = number
+            return
+        modulus = self.modulus
+        step = (number - last) % modulus
+        missing = self.missing
+        if step == 0:
+            counts['duplicate_frames'] += 1
+        elif step <= modulus // 2:
+            counts['lost_frames'] += step - 1
+            self.last_sequence = number
+            if step > 1:
+                for skipped in range(max(1, step - self.REORDER_WINDOW), step):
+                    missing.add((last + skipped) % modulus)
+            if len(missing) > self.REORDER_WINDOW:
+                self.missing = {n for n in missing if (number - n) % modulus <= self.REORDER_WINDOW}
+        elif modulus - step <= self.REORDER_WINDOW:
+            if number in missing:
+                # 迟到的帧在跳号时已计为丢帧；若已被 take_counts 取走，本次计数为负，累加后抵消
+                missing.discard(number)
+                counts['out_of_order'] += 1
+                counts['lost_frames'] -= 1
+            else:
+                counts['duplicate_frames'] += 1
+        else:
+            counts['sequence_resets'] += 1
+            self.last_sequence = number
+            missing.clear()
+
+    def take_counts(self):
+        counts = self.counts
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        return counts
+
+
+class SensorParser:
+    """传感器数据解析器：按 data_format 与分隔符将接收数据分帧并解析为 {传感器名称: 值}"""
+    MAX_PENDING = 64 * 1024  # 未遇到换行符时最多缓存的字节数
+
+    def __init__(self, data_format, data_separator=",", kv_separator=":", frame_check=None):
+        self.data_separator = data_separator or ","
+        self.kv_separator = kv_separator or ":"
+        self.frame_check = FrameCheck.from_settings(frame_check, self.data_separator, self.kv_separator)
+        self.sequence_key = self.frame_check.sequence_key or None if self.frame_check is not None else None
+        self.value_errors = 0  # 无法转换为数值的字段数，由流水线计入 parse_errors 后清零
+
+        # 键名 -> 传感器名称列表，解析时每个数据项只需一次字典查找
+        self.key_to_names = {}
+        for name, info in data_format.items():
+            key = info.get('key', '')
+            if key:
+                self.key_to_names.setdefault(key, []).append(name)
+
+        self._pending = b''
+
+    def split_frames(self, data, flush=False):
+        """按换行符分帧，未结束的部分留到下次；flush 为 True 时把残留数据也作为一帧"""
+        buffer = self._pending + data if self._pending else data
+        frames = buffer.split(b'\n')
+        self._pending = frames.pop()
+        if self._pending and (flush or len(self._pending) > self.MAX_PENDING):
+            frames.append(self._pending)
+            self._pending = b''
+        return [frame for frame in frames if frame.strip()]
+
+    def split_buffer(self, buffer, view, start, end, flush=False):
+        """在 buffer[start:end] 中分帧，所有完整的帧直接从 view 一次解码后按换行拆分（不复制原始数据）
+
+        返回 (帧文本列表, 未成帧数据的起点)；flush 为 True 或残留数据过长时残留数据也作为一帧。
+        """
+        stop = buffer.rfind(b'\n', start, end) + 1
+        if stop <= 0:
+            stop = start
+        if end - stop and (flush or end - stop > self.MAX_PENDING):
+            stop = end
+        if stop == start:
+            return [], start
+        try:
+            frames = str(view[start:stop], 'utf-8').split('\n')
+        except UnicodeDecodeError:
+            # 含有损坏的数据时逐帧解码，只丢弃无法解码的帧
+            frames = []
+            for frame in bytes(view[start:stop]).split(b'\n'):
+                try:
+                    frames.append(frame.decode('utf-8'))
+                except UnicodeDecodeError:
+                    pass
+        return [frame for frame in frames if frame.strip()], stop
+
+    def parse_frame(self, frame):
+        """解析一帧数据（bytes 或已解码的文本），数值字段返回 float，'当前状态' 返回原始文本"""
+        if isinstance(frame, str):
+            text = frame.strip()
+        else:
             try:
-                if self.serial_port.in_waiting:
-                    data = self.serial_port.read(self.serial_port.in_waiting)
-                    if data:
-                        self.received.emit(data)
-            except Exception as e:
-                print(f"串口读取错误: {e}")
+                text = frame.decode('utf-8').strip()
+            except UnicodeDecodeError:
+                return {}
+        frame_check = self.frame_check
+        if frame_check is not None:
+            text = frame_check.verify(text)
+            if text is None:
+                return {}
+
+        values = {}
+        for item in text.split(self.data_separator):
+            if self.kv_separator not in item:
+                continue
+            key, value_str = item.split(self.kv_separator, 1)
+            key = key.strip()
+            if key == self.sequence_key:
+                frame_check.sequence(value_str)
+                continue
+            names = self.key_to_names.get(key)
+            if not names:
+                continue
+            value_str = value_str.strip()
+            for name in names:
+                if name == '当前状态':
+                    values[name] = value_str
+                    continue
+                try:
+                    values[name] = float(value_str)
+                except ValueError:
+                    self.value_errors += 1
+        return values
+
+
+class CompiledRule:
+    """编译后的阈值规则，每条规则只保存 O(1) 的迟滞/持续时间状态"""
+    __slots__ = ('text', 'field', 'compare', 'threshold', 'release', 'duration',
+                 'action', 'argument', 'since', 'fired')
+
+    def __init__(self, text, field, compare, threshold, release, duration, action, argument):
+        self.text = text
+        self.field = field
+        self.compare = compare
+        self.threshold = threshold
+        self.release = release      # 解除阈值（阈值 ± 迟滞量）
+        self.duration = duration    # 条件需持续的秒数
+        self.action = action        # 'send' 或 'alarm'
+        self.argument = argument
+        self.since = None           # 条件开始成立的时间
+        self.fired = False          # 本次条件成立期间是否已触发过
+
+    def update(self, value, now):
+        """用一个新采样更新规则状态，返回 True 表示需要执行动作"""
+        if self.since is None:
+            if not self.compare(value, self.threshold):
+                return False
+            self.since = now
+        elif not self.compare(value, self.release):
+            # 越过迟滞区后才解除，避免在阈值附近反复触发
+            self.since = None
+            self.fired = False
+            return False
+
+        if not self.fired and now >= self.since + self.duration:
+            self.fired = True
+            return True
+        return False
+
+
+class FieldRuleIndex:
+    """单个传感器字段的规则索引
+
+    所有规则的阈值和解除阈值排序保存。状态只可能在数值跨越这些点时改变，
+    因此每个采样只需检查落在 [上一值, 当前值] 区间内的规则，外加到期的持续时间计时器。
+    """
+    __slots__ = ('rules', 'points', 'point_rules', 'timers', 'last_value', '_sequence')
+
+    def __init__(self, rules):
+        self.rules = rules
+        points = sorted([(rule.threshold, i) for i, rule in enumerate(rules)] +
+                        [(rule.release, i) for i, rule in enumerate(rules)])
+        self.points = [point for point, _ in points]
+        self.point_rules = [rules[i] for _, i in points]
+        self.timers = []         # 小顶堆: (到期时间, 序号, 规则, 开始时间)
+        self.last_value = None
+        self._sequence = 0
+
+        # 沿用的旧状态中仍在计时的规则需要重新登记计时器
+        for rule in rules:
+            if rule.since is not None and not rule.fired:
+                self.add_timer(rule)
+
+    def add_timer(self, rule):
+        self._sequence += 1
+        heapq.heappush(self.timers, (rule.since + rule.duration, self._sequence, rule, rule.since))
+
+    def evaluate(self, value, now, fired):
+        """用一个采样更新本字段的规则，触发的规则追加到 fired"""
+        last = self.last_value
+        self.last_value = value
+        if last is None:
+            candidates = self.rules
+        else:
+            low, high = (last, value) if last <= value else (value, last)
+            start = bisect.bisect_left(self.points, low)
+            end = bisect.bisect_right(self.points, high)
+            # 数值大幅跳变时直接逐条检查，最坏情况不比线性扫描差
+            candidates = self.point_rules[start:end] if end - start < len(self.rules) else self.rules
+
+        # 同一规则可能因阈值和解除阈值都在区间内出现两次，update 对相同输入是幂等的
+        for rule in candidates:
+            started = rule.since is None
+            if rule.update(value, now):
+                fired.append(rule)
+            elif started and rule.since is not None:
+                self.add_timer(rule)
+
+        timers = self.timers
+        while timers and timers[0][0] <= now:
+            _, _, rule, since = heapq.heappop(timers)
+            if rule.since == since and not rule.fired:
+                rule.fired = True
+                fired.append(rule)
+
+
+class RuleEngine:
+    """自动规则表：规则文本只编译一次，按传感器名称建立索引后逐采样求值
+
+    规则语法: <传感器名称或键名> <比较符> <阈值> [hyst <迟滞量>] [for <时长>[ms|s|min]] -> <动作>
+    动作: send <指令或快捷按钮名称> / alarm [提示信息]
+    示例: 土壤湿度 < 20 for 10s -> send CMD:AUTO
+          电池电量 < 3.3 hyst 0.1 -> alarm 电量不足
+    """
+    RULE_PATTERN = re.compile(
+        r'^\s*(?P<field>.+?)\s*(?P<op><=|>=|==|!=|<|>)\s*(?P<value>[-+]?(?:\d+\.?\d*|\.\d+))'
+        r'(?:\s+hyst\s+(?P<hyst>\d+\.?\d*|\.\d+))?'
+        r'(?:\s+for\s+(?P<duration>\d+\.?\d*|\.\d+)\s*(?P<unit>ms|s|min)?)?'
+        r'\s*(?:->|→)\s*(?P<action>send|alarm)\b\s*(?P<argument>.*?)\s*$')
+
+    OPERATORS = {
+        '<': operator.lt, '<=': operator.le,
+        '>': operator.gt, '>=': operator.ge,
+        '==': operator.eq, '!=': operator.ne,
+    }
+    DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'min': 60.0}
+
+    def __init__(self, rules, data_format, cmd_buttons=None, previous=None):
+        self.cmd_buttons = cmd_buttons or {}
+        self.key_to_name = {info.get('key', ''): name for name, info in data_format.items()}
+        self.data_format = data_format
+        self.by_field = {}  # 传感器名称 -> FieldRuleIndex
+        self.errors = []
+
+        # 规则文本未变化时沿用旧状态，修改设置不会打断正在计时的规则
+        old_rules = {}
+        if previous is not None:
+            for index in previous.by_field.values():
+                for rule in index.rules:
+                    old_rules[rule.text] = rule
+
+        field_rules = {}
+        for text in rules:
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                rule = self.compile_rule(text)
+            except ValueError as e:
+                self.errors.append(f"{text}: {e}")
+                continue
+            old = old_rules.get(text)
+            if old is not None:
+                rule.since, rule.fired = old.since, old.fired
+            field_rules.setdefault(rule.field, []).append(rule)
+
+        for field, compiled in field_rules.items():
+            self.by_field[field] = FieldRuleIndex(compiled)
+
+    def compile_rule(self, text):
+        """将一条规则文本编译为 CompiledRule，语法错误时抛出 ValueError"""
+        match = self.RULE_PATTERN.match(text)
+        if not match:
+            raise ValueError("无法识别的规则格式")
+
+        field = match.group('field')
+        if field not in self.data_format:
+            if field not in self.key_to_name:
+                raise ValueError(f"未知的传感器 '{field}'")
+            field = self.key_to_name[field]
+        if field == '当前状态':
+            raise ValueError("'当前状态' 不是数值字段")
+
+        op = match.group('op')
+        threshold = float(match.group('value'))
+        hyst = float(match.group('hyst') or 0)
+        if op in ('<', '<='):
+            release = threshold + hyst
+        elif op in ('>', '>='):
+            release = threshold - hyst
+        else:
+            release = threshold
+
+        duration = float(match.group('duration') or 0) * self.DURATION_UNITS[match.group('unit') or 's']
+
+        action = match.group('action')
+        argument = match.group('argument')
+        if action == 'send':
+            if not argument:
+                raise ValueError("send 动作缺少要发送的指令")
+            # 允许直接引用快捷指令按钮名称
+            argument = self.cmd_buttons.get(argument, argument)
+
+        return CompiledRule(text, field, self.OPERATORS[op], threshold, release,
+                            duration, action, argument)
+
+    def evaluate(self, values, now):
+        """对一个采样求值，只检查采样中出现的字段对应的规则，返回需执行的规则列表"""
+        fired = []
+        by_field = self.by_field
+        for name, value in values.items():
+            index = by_field.get(name)
+            if index is None or isinstance(value, str) or value != value:  # 跳过文本和 NaN
+                continue
+            index.evaluate(value, now, fired)
+        return fired
+
+
+def interpolate(x, *points):
+    """分段线性插值：interp(x, x0, y0, x1, y1, ...)，超出范围时取端点值"""
+    xs, ys = points[0::2], points[1::2]
+    if x <= xs[0]:
+        return ys[0]
+    if x >= xs[-1]:
+        return ys[-1]
+    i = bisect.bisect_right(xs, x)
+    x0, x1, y0, y1 = xs[i - 1], xs[i], ys[i - 1], ys[i]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+class MovingAverage:
+    """表达式中 avg(x, N) 的状态：最近 N 个值的滑动平均"""
+    __slots__ = ('size', 'values', 'total')
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+        return self.total / len(self.values)
+
+    def preview(self, value):
+        """加入 value 之后的平均值，不改变状态"""
+        total = self.total + value
+        count = len(self.values) + 1
+        if count > self.size:
+            total -= self.values[0]
+            count -= 1
+        return total / count
+
+    def mean(self):
+        if not self.values:
+            raise ValueError("avg 尚无数据")
+        return self.total / len(self.values)
+
+
+class DerivedChannel:
+    """一个编译好的派生通道"""
+    __slots__ = ('name', 'expression', 'inputs', 'evaluate')
+
+    def __init__(self, name, expression, inputs, evaluate):
+        self.name = name
+        self.expression = expression
+        self.inputs = inputs      # 依赖的通道名称集合
+        self.evaluate = evaluate  # values -> float 的闭包
+
+
+class DerivedChannels:
+    """派生通道：data_format 中带 'expr' 的项由其他通道计算得到
+
+    表达式只在设置变化时解析一次，经过语法树白名单检查后编译为嵌套闭包，求值时不使用 eval。
+    表达式中可以用传感器名称或键名引用其他通道（包括其他派生通道），按依赖顺序求值，
+    且只在某个输入通道收到新值时才重新计算。支持 + - * / // % **、比较、and/or/not、
+    x if c else y，以及 FUNCTIONS 中的函数和 avg(x, N)（最近 N 个值的滑动平均）。
+    avg 只在 x 引用的通道本次收到新值、且整个表达式求值成功后才记入新值。
+    """
+    BINARY_OPS = {
+        ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+    }
+    UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_}
+    COMPARE_OPS = {
+        ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+        ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    }
+    FUNCTIONS = {
+        'abs': abs, 'min': min, 'max': max, 'round': round,
+        'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10,
+        'sin': math.sin, 'cos': math.cos, 'atan2': math.atan2,
+        'clamp': lambda x, low, high: min(max(x, low), high),
+        'interp': interpolate,
+    }
+    RUNTIME_ERRORS = (KeyError, ArithmeticError, ValueError, TypeError)
+
+    def __init__(self, data_format):
+        self.errors = []
+        self.channels = []   # 按依赖顺序排列的 DerivedChannel
+        self.inputs = set()  # 所有派生通道用到的输入
+        self.latest = {}     # 输入通道的最新值
+        self.updated = set()  # 本次 apply 中收到新值的通道
+        self.pending = []     # 本次求值中待记入的 (MovingAverage, 值)
+
+        self.key_to_name = {}
+        for name, info in data_format.items():
+            if info.get('key'):
+                self.key_to_name.setdefault(info['key'], name)
+        self.names = set(data_format)
+
+        compiled = {}
+        for name, info in data_format.items():
+            expression = info.get('expr', '').strip()
+            if not expression:
+                continue
+            try:
+                compiled[name] = self.compile_expression(name, expression)
+            except (SyntaxError, ValueError) as e:
+                self.errors.append(f"派生通道 '{name}' ({expression}): {e}")
+
+        self.channels = self.sort_channels(compiled)
+        for channel in self.channels:
+            self.inputs |= channel.inputs
+
+    def compile_expression(self, name, expression):
+        """解析并检查表达式，返回 DerivedChannel；不支持的语法或未知名称抛出 ValueError"""
+        tree = ast.parse(expression, mode='eval')
+        inputs = set()
+        evaluate = self.compile_node(tree.body, inputs)
+        if name in inputs:
+            raise ValueError("表达式不能引用自身")
+        if not inputs:
+            raise ValueError("表达式没有引用任何通道")
+        return DerivedChannel(name, expression, inputs, evaluate)
+
+    def compile_node(self, node, inputs):
+        """把语法树节点编译为 values -> 值 的闭包"""
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError(f"不支持的常量 {node.value!r}")
+            value = float(node.value)
+            return lambda values: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name not in self.names:
+                if name not in self.key_to_name:
+                    raise ValueError(f"未知的名称 '{name}'")
+                name = self.key_to_name[name]
+            inputs.add(name)
+            return lambda values: values[name]
+
+        if isinstance(node, ast.BinOp) and type(node.op) in self.BINARY_OPS:
+            op = self.BINARY_OPS[type(node.op)]
+            left, right = self.compile_node(node.left, inputs), self.compile_node(node.right, inputs)
+            return lambda values: op(left(values), right(values))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.UNARY_OPS:
+            op = self.UNARY_OPS[type(node.op)]
+            operand = self.compile_node(node.operand, inputs)
+            return lambda values: op(operand(values))
+
+        if isinstance(node, ast.Compare) and all(type(op) in self.COMPARE_OPS for op in node.ops):
+            ops = [self.COMPARE_OPS[type(op)] for op in node.ops]
+            operands = [self.compile_node(operand, inputs) for operand in [node.left] + node.comparators]
+
+            def compare(values):
+                left = operands[0](values)
+                for op, operand in zip(ops, operands[1:]):
+                    right = operand(values)
+                    if not op(left, right):
+                        return 0.0
+                    left = right
+                return 1.0
+            return compare
+
+        if isinstance(node, ast.BoolOp):
+            operands = [self.compile_node(operand, inputs) for operand in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda values: float(all(operand(values) for operand in operands))
+            return lambda values: float(any(operand(values) for operand in operands))
+
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = (self.compile_node(part, inputs) for part in (node.test, node.body, node.orelse))
+            return lambda values: body(values) if test(values) else orelse(values)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self.compile_call(node.func.id, node.args, inputs)
+
+        raise ValueError(f"不支持的语法 '{ast.unparse(node)}'")
+
+    def compile_call(self, function, args, inputs):
+        if function == 'avg':
+            if len(args) != 2 or not isinstance(args[1], ast.Constant) or not isinstance(args[1].value, int) \
+                    or args[1].value < 1:
+                raise ValueError("avg 的用法为 avg(表达式, 个数)，个数为正整数")
+            # 每处 avg 调用各自保存状态；输入没有新值时返回当前平均值，有新值时先预览，求值成功后再记入
+            state = MovingAverage(args[1].value)
+            sources = set()
+            argument = self.compile_node(args[0], sources)
+            inputs |= sources
+
+            def average(values):
+                value = argument(values)
+                if sources.isdisjoint(self.updated):
+                    return state.mean()
+                self.pending.append((state, value))
+                return state.preview(value)
+            return average
+
+        if function not in self.FUNCTIONS:
+            raise ValueError(f"未知的函数 '{function}'")
+        if function == 'interp':
+            points = args[1:]
+            if len(points) < 4 or len(points) % 2:
+                raise ValueError("interp 的用法为 interp(x, x0, y0, x1, y1, ...)")
+            constants = [point.value for point in points if isinstance(point, ast.Constant)]
+            if any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in constants):
+                raise ValueError("interp 的坐标必须是数字")
+            if all(isinstance(point, ast.Constant) for point in points):
+                xs = [point.value for point in points[0::2]]
+                if any(b <= a for a, b in zip(xs, xs[1:])):
+                    raise ValueError("interp 的 x 坐标必须递增")
+        func = self.FUNCTIONS[function]
+        arguments = [self.compile_node(arg, inputs) for arg in args]
+        return lambda values: func(*[argument(values) for argument in arguments])
+
+    def sort_channels(self, compiled):
+        """按依赖关系排序，存在循环依赖的通道记入 errors"""
+        ordered = []
+        done = set()
+        pending = dict(compiled)
+        while pending:
+            ready = [name for name, channel in pending.items()
+                     if all(source in done or source not in compiled for source in channel.inputs)]
+            if not ready:
+                for name, channel in pending.items():
+                    self.errors.append(f"派生通道 '{name}' ({channel.expression}): 存在循环依赖")
                 break
-            time.sleep(0.01)  # 小延迟避免CPU占用过高
+            for name in ready:
+                ordered.append(pending.pop(name))
+                done.add(name)
+        return ordered
 
-    def stop(self):
-        self.is_running = False
-        self.wait()
+    def apply(self, values):
+        """用一个采样中新收到的值计算受影响的派生通道，结果直接写入 values"""
+        if not self.channels:
+            return
+        latest = self.latest
+        updated = set()
+        for name, value in values.items():
+            if name in self.inputs:
+                if isinstance(value, str):
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        continue
+                latest[name] = value
+                updated.add(name)
+        if not updated:
+            return
+        self.updated = updated
+        pending = self.pending
+        for channel in self.channels:
+            if updated.isdisjoint(channel.inputs):
+                continue
+            pending.clear()
+            try:
+                result = float(channel.evaluate(latest))
+            except self.RUNTIME_ERRORS:
+                continue  # 输入尚未全部收到或数值无效（如除以零）时本次不输出
+            for state, value in pending:
+                state.add(value)
+            values[channel.name] = latest[channel.name] = result
+            updated.add(channel.name)
+
+
+# 单个通道的滚动统计快照
+StatsSnapshot = namedtuple('StatsSnapshot', 'count min max mean stddev rate')
+
+
+class RollingStats:
+    """单个通道的时间窗口滚动统计，每个采样的代价为均摊 O(1)，与窗口长度无关
+
+    方差用 Welford 算法增量维护（样本移出窗口时做逆运算），
+    最小/最大值用单调队列维护，不需要重新扫描历史数据。
+    """
+    __slots__ = ('window', 'samples', 'min_queue', 'max_queue', 'mean', 'm2', 'first_time')
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.samples = deque()     # (时间, 值)
+        self.min_queue = deque()   # 值单调递增的 (时间, 值)
+        self.max_queue = deque()   # 值单调递减的 (时间, 值)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.first_time = None
+
+    def add(self, value, now):
+        """加入一个采样并移出窗口外的旧采样"""
+        if self.first_time is None:
+            self.first_time = now
+        self.samples.append((now, value))
+        count = len(self.samples)
+        delta = value - self.mean
+        self.mean += delta / count
+        self.m2 += delta * (value - self.mean)
+
+        min_queue = self.min_queue
+        while min_queue and min_queue[-1][1] >= value:
+            min_queue.pop()
+        min_queue.append((now, value))
+
+        max_queue = self.max_queue
+        while max_queue and max_queue[-1][1] <= value:
+            max_queue.pop()
+        max_queue.append((now, value))
+
+        self.expire(now)
+
+    def expire(self, now):
+        """移出时间早于 now - window 的采样"""
+        cutoff = now - self.window
+        samples = self.samples
+        while samples and samples[0][0] < cutoff:
+            _, value = samples.popleft()
+            count = len(samples)
+            if count == 0:
+                self.mean = 0.0
+                self.m2 = 0.0
+                break
+            old_mean = self.mean
+            self.mean = old_mean - (value - old_mean) / count
+            self.m2 = max(self.m2 - (value - old_mean) * (value - self.mean), 0.0)
+        while self.min_queue and self.min_queue[0][0] < cutoff:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < cutoff:
+            self.max_queue.popleft()
+
+    def snapshot(self, now):
+        """返回当前窗口内的统计结果，窗口内没有采样时返回 None"""
+        self.expire(now)
+        count = len(self.samples)
+        if count == 0:
+            return None
+        stddev = (self.m2 / (count - 1)) ** 0.5 if count > 1 else 0.0
+        # 通道刚出现时观测时间太短，采样率暂记为 0
+        span = min(self.window, now - self.first_time)
+        rate = count / span if span >= min(self.window, 1.0) else 0.0
+        return StatsSnapshot(count, self.min_queue[0][1], self.max_queue[0][1], self.mean, stddev, rate)
+
+
+class ChannelStatsBank:
+    """所有数值通道的滚动统计，由接收线程更新，GUI 等其他使用者通过 snapshot 读取"""
+    def __init__(self, window=10.0):
+        self.window = window
+        self.channels = {}  # 传感器名称 -> RollingStats
+        self.lock = threading.Lock()
+
+    def set_window(self, window):
+        with self.lock:
+            self.window = window
+            for stats in self.channels.values():
+                stats.window = window
+
+    def retain(self, names):
+        """只保留仍在 data_format 中的通道，其余通道的统计保持不变"""
+        with self.lock:
+            for name in list(self.channels):
+                if name not in names:
+                    del self.channels[name]
+
+    def update(self, samples, now):
+        """用一批采样更新统计"""
+        with self.lock:
+            channels = self.channels
+            for values in samples:
+                for name, value in values.items():
+                    if isinstance(value, str):
+                        continue
+                    stats = channels.get(name)
+                    if stats is None:
+                        stats = channels[name] = RollingStats(self.window)
+                    stats.add(value, now)
+
+    def snapshot(self, now=None):
+        """返回 {传感器名称: StatsSnapshot}"""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            result = {}
+            for name, stats in self.channels.items():
+                snapshot = stats.snapshot(now)
+                if snapshot is not None:
+                    result[name] = snapshot
+            return result
+
+
+class HistoryChunk:
+    """采样历史中的一个列式数据块，字段集合在创建时固定，缺失的值记为 NaN"""
+    __slots__ = ('fields', 'times', 'columns')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.times = array('d')
+        self.columns = {name: array('d') for name in fields}
+
+
+class RawChunk:
+    """原始串口数据的一个数据块：每次读取的时间、在 data 中的起始偏移和长度"""
+    __slots__ = ('times', 'offsets', 'lengths', 'data')
+
+    def __init__(self):
+        self.times = array('d')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.data = bytearray()
+
+
+class SampleHistory:
+    """按列存储的采样历史和原始数据记录，供导出等使用
+
+    数据按固定行数分块追加，超过保留时长的整块直接丢弃，追加和清理都是 O(1)。
+    默认只保留 1 小时采样和 32MB 原始数据，需要更长的历史时在设置中调大保留时长。
+    """
+    CHUNK_ROWS = 4096
+    RAW_CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, retention=3600, max_raw_bytes=32 * 1024 * 1024):
+        self.retention = retention          # 采样保留时长（秒）
+        self.max_raw_bytes = max_raw_bytes  # 原始数据最多保留的字节数
+        self.fields = ()
+        self.chunks = deque()
+        self.raw_chunks = deque()
+        self.raw_bytes = 0
+        self.lock = threading.Lock()
+        self._current = None
+        self._current_raw = None
+
+    def set_fields(self, fields):
+        """设置要记录的字段，字段变化后从新的数据块开始记录"""
+        fields = tuple(fields)
+        with self.lock:
+            if fields != self.fields:
+                self.fields = fields
+                self._current = None
+
+    def append(self, samples, timestamp):
+        """追加一批采样（每个采样一行），'当前状态' 等文本值能转换为数字时按数字记录"""
+        nan = float('nan')
+        with self.lock:
+            for values in samples:
+                chunk = self._current
+                if chunk is None or len(chunk.times) >= self.CHUNK_ROWS:
+                    chunk = self._current = HistoryChunk(self.fields)
+                    self.chunks.append(chunk)
+                    self._trim(timestamp)
+                chunk.times.append(timestamp)
+                for name, column in chunk.columns.items():
+                    value = values.get(name, nan)
+                    if isinstance(value, str):
+                        try:
+                            value = float(value)
+                        except ValueError:
+                            value = nan
+                    column.append(value)
+
+    def add_raw(self, data, timestamp):
+        """记录一次读取到的原始数据"""
+        with self.lock:
+            chunk = self._current_raw
+            if chunk is None or len(chunk.data) >= self.RAW_CHUNK_BYTES:
+                chunk = self._current_raw = RawChunk()
+                self.raw_chunks.append(chunk)
+            chunk.times.append(timestamp)
+            chunk.offsets.append(len(chunk.data))
+            chunk.lengths.append(len(data))
+            chunk.data += data
+            self.raw_bytes += len(data)
+            while self.raw_bytes > self.max_raw_bytes and len(self.raw_chunks) > 1:
+                self.raw_bytes -= len(self.raw_chunks.popleft().data)
+
+    def _trim(self, now):
+        cutoff = now - self.retention
+        while len(self.chunks) > 1 and self.chunks[0].times[-1] < cutoff:
+            self.chunks.popleft()
+
+    def time_range(self):
+        """返回已记录采样的 (最早时间, 最晚时间)，没有数据时返回 None"""
+        with self.lock:
+            times = [chunk.times for chunk in self.chunks if chunk.times]
+            if not times:
+                return None
+            return times[0][0], times[-1][-1]
+
+    def select(self, start=None, end=None):
+        """选取时间范围内的数据，返回 (采样片段列表, 原始数据片段列表)
+
+        每个片段为 (数据块, 起始行, 结束行)。数据块只会被追加，因此导出线程可以在锁外读取这些片段。
+        """
+        def clip(chunks):
+            parts = []
+            for chunk in chunks:
+                times = chunk.times
+                count = len(times)
+                if not count or (start is not None and times[count - 1] < start) or \
+                        (end is not None and times[0] > end):
+                    continue
+                first = bisect.bisect_left(times, start, 0, count) if start is not None else 0
+                last = bisect.bisect_right(times, end, 0, count) if end is not None else count
+                if last > first:
+                    parts.append((chunk, first, last))
+            return parts
+
+        with self.lock:
+            return clip(list(self.chunks)), clip(list(self.raw_chunks))
+
+    def clear(self):
+        with self.lock:
+            self.chunks.clear()
+            self.raw_chunks.clear()
+            self.raw_bytes = 0
+            self._current = None
+            self._current_raw = None
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图（秒），按 Prometheus 的累计分桶输出"""
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self):
+        histogram = LatencyHistogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+
+class PipelineMetrics:
+    """接收流程的计数器、最新数值和延迟直方图
+
+    接收线程每次读取后更新一次（不是每帧一次），读取方通过 snapshot 取得副本，
+    不会阻塞接收线程，也不涉及GUI。
+    """
+    COUNTERS = ('bytes', 'frames', 'samples', 'parse_errors', 'dropped_updates', 'rule_actions') + FrameCheck.COUNTERS
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.latest = {}  # 传感器名称 -> 最近一次的值
+        self.process_latency = LatencyHistogram()   # 每次读取的处理耗时
+        self.delivery_latency = LatencyHistogram()  # 采样从接收线程发出到GUI处理的延迟
+
+    def record(self, size, frames, samples, errors, actions, elapsed, link_counts=None):
+        with self.lock:
+            counters = self.counters
+            counters['bytes'] += size
+            counters['frames'] += frames
+            counters['samples'] += len(samples)
+            counters['parse_errors'] += errors
+            counters['rule_actions'] += actions
+            if link_counts:
+                for name, count in link_counts.items():
+                    counters[name] += count
+            latest = self.latest
+            for values in samples:
+                latest.update(values)
+            self.process_latency.observe(elapsed)
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe_delivery(self, latency):
+        with self.lock:
+            self.delivery_latency.observe(latency)
+
+    def snapshot(self):
+        """返回 (计数器, 最新数值, {直方图名称: LatencyHistogram}) 的副本"""
+        with self.lock:
+            return (dict(self.counters), dict(self.latest),
+                    {'process': self.process_latency.copy(), 'gui_delivery': self.delivery_latency.copy()})
+
+
+class TelemetryPipeline:
+    """接收线程中的数据处理流水线：分帧 → 解析 → 规则求值 → 滚动统计 → 历史记录"""
+    def __init__(self):
+        self.parser = SensorParser({})
+        self.rule_engine = RuleEngine([], {})
+        self.stats = ChannelStatsBank()
+        self.history = SampleHistory()
+        self.derived = DerivedChannels({})
+        self.metrics = PipelineMetrics()
+        self.data_format = {}
+
+    def configure(self, data_format, data_separator, kv_separator, rules, cmd_buttons, stats_window=10.0,
+                  history_hours=1, frame_check=None):
+        """根据当前设置重新编译解析器和规则表（在GUI线程调用，整体替换引用）"""
+        parser = SensorParser(data_format, data_separator, kv_separator, frame_check)
+        parser._pending = self.parser._pending
+        previous = self.parser.frame_check
+        if parser.frame_check is not None and previous is not None and previous.modulus == parser.frame_check.modulus:
+            parser.frame_check.last_sequence = previous.last_sequence
+            parser.frame_check.missing = previous.missing
+        self.data_format = copy.deepcopy(data_format)
+        self.derived = DerivedChannels(data_format)
+        self.rule_engine = RuleEngine(rules, data_format, cmd_buttons, previous=self.rule_engine)
+        self.parser = parser
+        self.stats.set_window(stats_window)
+        self.stats.retain(data_format)
+        self.history.retention = history_hours * 3600
+        self.history.set_fields(data_format)
+        return self.rule_engine.errors + self.derived.errors
+
+    def process(self, data, now=None, flush=False):
+        """处理一段接收数据，返回 (采样列表, 触发的规则列表)"""
+        parser = self.parser
+        return self.process_frames(parser, parser.split_frames(data, flush), data, now)
+
+    def process_frames(self, parser, frames, data, now=None, rules=True):
+        """处理已分好的帧，data 为本次新收到的原始数据（用于记录），返回值同 process
+
+        rules 为 False 时不求值自动规则（用于超时后强制成帧、可能被截断的残留数据）。
+        """
+        begin = time.perf_counter()
+        if now is None:
+            now = time.monotonic()
+        rule_engine = self.rule_engine
+        derived = self.derived
+        timestamp = time.time()
+        if data:
+            self.history.add_raw(data, timestamp)
+
+        samples = []
+        actions = []
+        for frame in frames:
+            values = parser.parse_frame(frame)
+            if not values:
+                continue
+            derived.apply(values)
+            samples.append(values)
+            if rules:
+                actions.extend(rule_engine.evaluate(values, now))
+        if samples:
+            self.stats.update(samples, now)
+            self.history.append(samples, timestamp)
+        # 空帧、校验失败的帧和无法转换的数值都计入 parse_errors
+        errors = len(frames) - len(samples) + parser.value_errors
+        parser.value_errors = 0
+        frame_check = parser.frame_check
+        self.metrics.record(len(data) if data else 0, len(frames), samples, errors, len(actions),
+                            time.perf_counter() - begin, frame_check.take_counts() if frame_check is not None else None)
+        return samples, actions
+
+
+class BufferPool:
+    """预先分配的接收缓冲块（slab）及空闲列表
+
+    交给下游的 memoryview 通过 lease() 登记（只保存弱引用），被回收时自动注销；
+    归还的 slab 只有在没有未注销的 memoryview 时才会被再次分配。
+    """
+    def __init__(self, slab_size=64 * 1024, max_free=16):
+        self.slab_size = slab_size
+        self.max_free = max_free
+        self.free = deque()
+        self.leases = {}    # id(slab) -> {id(弱引用): 下游仍持有的 memoryview 的弱引用}
+        self.allocated = 0  # 累计新分配的 slab 数量，稳定运行时应保持不变
+
+    def lease(self, slab, view):
+        """登记一个交给下游的 slab 切片，返回 view 本身"""
+        refs = self.leases.get(id(slab))
+        if refs is None:
+            refs = self.leases[id(slab)] = {}
+        # 可写的 memoryview 不能做哈希，按弱引用对象的 id 登记；回调可能在 GUI 线程触发，
+        # dict 的单次赋值/pop 在 GIL 下是原子的
+        ref = weakref.ref(view, lambda ref: refs.pop(id(ref), None))
+        refs[id(ref)] = ref
+        return view
+
+    def in_use(self, slab):
+        return bool(self.leases.get(id(slab)))
+
+    def acquire(self, size=0):
+        """取出一个至少 size 字节、没有被引用的 slab"""
+        for _ in range(len(self.free)):
+            slab = self.free.popleft()
+            if len(slab) >= size and not self.in_use(slab):
+                return slab
+            self.free.append(slab)
+        self.allocated += 1
+        return bytearray(max(size, self.slab_size))
+
+    def release(self, slab):
+        """归还 slab，空闲列表已满时交给垃圾回收"""
+        if len(self.free) < self.max_free:
+            self.free.append(slab)
+        else:
+            # 下游的 memoryview 仍引用着 slab，id 在它们被回收前不会被新的 slab 复用
+            self.leases.pop(id(slab), None)
+
+
+class ReceiveBuffer:
+    """接收缓冲区：串口数据直接读入 slab，本次读到的数据和分好的帧都以 memoryview 切片交给下游
+
+    未成帧的残留数据留在 slab 中与后续数据连续存放；slab 写满后只把残留数据搬到新的 slab。
+    """
+    def __init__(self, pool=None):
+        self.pool = pool or BufferPool()
+        self.slab = self.pool.acquire()
+        self.view = memoryview(self.slab)
+        self.start = 0  # 未成帧数据的起点
+        self.end = 0    # 已写入数据的终点
+
+    @property
+    def pending(self):
+        return self.end - self.start
+
+    def _rotate(self, size):
+        """换用新的 slab，并把残留数据搬到开头"""
+        pending = self.end - self.start
+        slab = self.pool.acquire(pending + size)
+        slab[:pending] = self.view[self.start:self.end]
+        self.view.release()
+        self.pool.release(self.slab)
+        self.slab = slab
+        self.view = memoryview(slab)
+        self.start = 0
+        self.end = pending
+
+    @staticmethod
+    def read_into(serial_port, target):
+        """把数据直接读入 target，POSIX 串口用 readv 避免中间的 bytes 对象"""
+        fd = getattr(serial_port, 'fd', None)
+        if fd is not None and hasattr(os, 'readv'):
+            return os.readv(fd, [target])
+        return serial_port.readinto(target)
+
+    def read_from(self, serial_port, size):
+        """从串口读取最多 size 字节，返回本次数据的 memoryview（可能比 size 少）"""
+        if len(self.slab) - self.end < size:
+            self._rotate(size)
+        end = self.end
+        count = min(size, len(self.slab) - end)
+        count = self.read_into(serial_port, self.view[end:end + count]) or 0
+        self.end = end + count
+        return self.pool.lease(self.slab, self.view[end:end + count])
+
+    def write(self, data):
+        """追加一段已有的数据（用于基准测试等没有串口的场合）"""
+        size = len(data)
+        if len(self.slab) - self.end < size:
+            self._rotate(size)
+        end = self.end
+        self.slab[end:end + size] = data
+        self.end = end + size
+        return self.pool.lease(self.slab, self.view[end:end + size])
+
+    def take_frames(self, parser, flush=False):
+        """取出已完整接收的帧（已解码的文本）"""
+        # 已交给下游的区域可能仍被引用，即使全部成帧也不回到 slab 开头覆盖
+        frames, self.start = parser.split_buffer(self.slab, self.view, self.start, self.end, flush)
+        return frames
+
+    def discard(self):
+        """丢弃未成帧的数据"""
+        self.start = self.end
+
+
+class SerialThread(QThread):
+    """串口数据接收线程，同时在本线程内完成数据解析和自动规则求值
+
+    数据读入 ReceiveBuffer 的 slab 中，显示、转发、记录和解析都使用 memoryview 切片，
+    接收过程中不为每次读取分配新的 bytes 对象。
+    """
+    received = pyqtSignal(object)  # 本次读到的数据（memoryview；只显示最新值时为合并后的 bytes）
+    samples_ready = pyqtSignal(list)
+    rule_fired = pyqtSignal(str, str, str)  # 动作, 参数, 规则文本
+    MAX_BACKLOG = 100  # GUI 尚未处理的采样批次超过此数时丢弃新的界面更新（统计、历史和转发不受影响）
+    MAX_CONSOLE_PENDING = 64 * 1024  # 只显示最新值时合并的接收显示数据上限，超出时丢弃较早的行
+
+    def __init__(self, serial_port, pipeline=None, server=None, pool=None, idle_flush=0.5):
+        super().__init__()
+        self.serial_port = serial_port
+        self.pipeline = pipeline
+        self.server = server  # 可选的 TelemetryServer，由主窗口启停时更新
+        # 超过此时间（秒）没有新数据时，把不以换行结尾的残留数据作为一帧处理（不求值自动规则）；
+        # 应为帧间隔的数倍，0 表示只按换行分帧
+        self.idle_flush = idle_flush
+        self.buffer = ReceiveBuffer(pool)
+        self.is_running = True
+        self.in_flight = deque()  # 已发出、GUI 尚未处理的采样批次的发出时间
+        self.rx_tap = None  # 设置后收到的数据只交给它（分块发送文件时接收应答），不显示也不解析
+        self.latest_only = False  # 界面处理不过来时由主窗口设置：合并采样和接收显示，只在界面空闲时发出
+        self.coalesced = None
+        self.coalesced_count = 0
+        # received 的发出/显示次数，分别只由接收线程和 GUI 线程递增，差值即尚未显示的次数
+        self.console_sent = 0
+        self.console_shown = 0
+        self.console_pending = bytearray()
+
+    def run(self):
+        buffer = self.buffer
+        last_data = time.monotonic()
+        while self.is_running and self.serial_port and self.serial_port.is_open:
+            try:
+                waiting = self.serial_port.in_waiting
+                if waiting:
+                    data = buffer.read_from(self.serial_port, waiting)
+                    count = len(data)
+                    last_data = time.monotonic()
+                    tap = self.rx_tap
+                    if count and tap is not None:
+                        tap(bytes(data))
+                        buffer.discard()
+                    elif count:
+                        self.emit_console(data)
+                        server = self.server
+                        if server is not None:
+                            server.publish_raw(data)
+                        self.process_data(data)
+                    del data  # 不在本线程保留对 slab 的引用
+                    if count < waiting:
+                        continue  # 受 slab 剩余空间限制没有读完，立即继续读取
+                elif (self.pipeline is not None and buffer.pending and self.idle_flush
+                      and time.monotonic() - last_data >= self.idle_flush):
+                    # 长时间没有新数据时，把不以换行结尾的残留数据作为一帧处理
+                    self.process_data(None, flush=True)
+                if self.coalesced is not None:
+                    self.emit_latest()
+                if self.console_pending:
+                    self.emit_console_pending()
+            except Exception as e:
+                print(f"串口读取错误: {e}")
+                break
+            time.sleep(0.01)  # 小延迟避免CPU占用过高
+
+    def process_data(self, data, flush=False):
+        """解析数据并求值自动规则，结果通过信号交给GUI线程"""
+        if self.pipeline is None:
+            self.buffer.discard()
+            return
+        parser = self.pipeline.parser
+        frames = self.buffer.take_frames(parser, flush)
+        samples, actions = self.pipeline.process_frames(parser, frames, data, rules=not flush)
+        if samples:
+            if self.latest_only or self.coalesced is not None:
+                self.coalesce(samples)
+            elif len(self.in_flight) < self.MAX_BACKLOG:
+                self.in_flight.append(time.perf_counter())
+                self.samples_ready.emit(samples)
+            else:
+                self.pipeline.metrics.add('dropped_updates', len(samples))
+            server = self.server
+            if server is not None:
+                server.publish_samples(samples)
+        for rule in actions:
+            self.rule_fired.emit(rule.action, rule.argument, rule.text)
+
+    def coalesce(self, samples):
+        """把采样合并为各字段的最新值，界面处理完之前发出的批次后再发出"""
+        if self.coalesced is None:
+            self.coalesced = {}
+        for values in samples:
+            self.coalesced.update(values)
+        self.coalesced_count += len(samples)
+        self.emit_latest()
+
+    def emit_latest(self):
+        if self.in_flight:
+            return
+        self.in_flight.append(time.perf_counter())
+        self.samples_ready.emit([self.coalesced])
+        if self.pipeline is not None:
+            self.pipeline.metrics.add('dropped_updates', self.coalesced_count - 1)
+        self.coalesced = None
+        self.coalesced_count = 0
+
+    @property
+    def backlog(self):
+        """已发出、GUI 尚未处理的采样批次和接收显示的数量"""
+        return len(self.in_flight) + self.console_sent - self.console_shown
+
+    def emit_console(self, data):
+        """把读到的数据交给接收区显示；只显示最新值时先合并，上一次显示完成后再发出"""
+        if not self.latest_only and not self.console_pending:
+            self.console_sent += 1
+            self.received.emit(data)
+            return
+        pending = self.console_pending
+        pending += data
+        excess = len(pending) - self.MAX_CONSOLE_PENDING
+        if excess > 0:
+            newline = pending.find(b'\n', excess)
+            del pending[:newline + 1 if newline >= 0 else excess]
+        self.emit_console_pending()
+
+    def emit_console_pending(self):
+        if self.console_sent == self.console_shown:
+            self.console_sent += 1
+            self.received.emit(bytes(self.console_pending))
+            self.console_pending.clear()
+
+    def console_delivered(self):
+        """由处理 received 的一方调用，记录一次接收显示已完成"""
+        self.console_shown += 1
+
+    def samples_delivered(self):
+        """由处理 samples_ready 的一方调用，记录一批采样已送达"""
+        try:
+            sent = self.in_flight.popleft()
+        except IndexError:
+            return
+        if self.pipeline is not None:
+            self.pipeline.metrics.observe_delivery(time.perf_counter() - sent)
+
+    def stop(self):
+        self.is_running = False
+        self.wait()
+
+
+class TransferError(Exception):
+    """文件发送失败或被取消"""
+
+
+class FileTransfer:
+    """通过串口发送文件：按速率限速的原始数据流，或 XMODEM-1K / YMODEM 分块传输（CRC16 校验）
+
+    分块传输支持滑动窗口：最多连续发出 window 个块再等待应答。接收方按顺序对每个块回复
+    ACK/NAK，并忽略出错块之后、重发之前收到的块；收到 NAK 或超时时从最早未确认的块开始重发。
+    XMODEM/YMODEM 的应答不带块号，重发前先丢弃在途块的全部应答（drain_responses），
+    否则迟到的 ACK 会被当作重发块的确认。window=1 即标准的停等协议。
+    接收方的应答由接收线程通过 feed() 送入。
+
+    断点续传：原始数据流从 offset 处继续写出；YMODEM 在文件头第 5 个字段中带上 offset，
+    数据块从 offset 处重新编号。XMODEM 无法告知接收方起点，总是从头发送。
+    """
+    SOH, STX, EOT, ACK, NAK, CAN, CRC = 0x01, 0x02, 0x04, 0x06, 0x15, 0x18, 0x43
+    MODES = ('raw', 'xmodem', 'ymodem')
+    PAD = 0x1A  # CPMEOF，填充最后一个数据块
+    MAX_RETRIES = 10
+    REPORT_INTERVAL = 0.1
+    QUIET = 0.1  # 重发前接收方至少安静这么久（秒），才认为在途块的应答已经收完
+
+    def __init__(self, write, path, mode='raw', baudrate=115200, rate=None, block_size=1024, window=4,
+                 offset=0, command=None, timeout=3.0, start_timeout=30.0, progress=None, is_cancelled=None):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的发送方式: {mode}")
+        self.write = write
+        self.path = path
+        self.mode = mode
+        self.rate = rate or baudrate / 10  # 字节/秒，默认为线路速率（8N1 每字节 10 个比特）
+        self.block_size = block_size
+        self.window = max(1, window)
+        self.command = command  # 开始前发送的指令（例如让设备进入升级模式），分块模式下随后等待接收方就绪
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.progress = progress
+        self.is_cancelled = is_cancelled
+        self.size = os.path.getsize(path)
+        if mode == 'xmodem':
+            offset = 0
+        elif mode == 'ymodem':
+            offset -= offset % block_size
+        self.offset = min(max(offset, 0), self.size)
+        self.confirmed = self.offset  # 已被接收方确认（原始模式为已写出）的字节数
+        self.retransmits = 0
+        self.elapsed = 0.0
+        self.responses = deque()
+        self.condition = threading.Condition()
+        self.next_time = 0.0
+        self.begin = 0.0
+        self.last_report = 0.0
+
+    @property
+    def throughput(self):
+        """本次已确认数据的平均速率（字节/秒）"""
+        return (self.confirmed - self.offset) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def feed(self, data):
+        """接收线程调用：保存接收方发来的应答"""
+        with self.condition:
+            self.responses.extend(data)
+            self.condition.notify()
+
+    def run(self):
+        with open(self.path, 'rb') as f:
+            data = memoryview(f.read())
+        with self.condition:
+            self.responses.clear()
+        self.begin = self.next_time = time.perf_counter()
+        try:
+            if self.command:
+                self.send(self.command.encode('utf-8'))
+            if self.mode == 'raw':
+                self.send_raw(data)
+            else:
+                self.send_file(data)
+        except TransferError:
+            if self.mode != 'raw' and self.cancelled():
+                self.write(bytes((self.CAN, self.CAN)))  # 通知接收方放弃
+            raise
+        finally:
+            self.report(force=True)
+
+    def cancelled(self):
+        return self.is_cancelled is not None and self.is_cancelled()
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise TransferError('发送已取消')
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        self.elapsed = now - self.begin
+        if self.progress is not None and (force or now - self.last_report >= self.REPORT_INTERVAL):
+            self.last_report = now
+            self.progress(self.confirmed, self.size, self.throughput)
+
+    def send(self, data):
+        """写出数据，按 rate 限速（令牌桶，写入阻塞的时间也计入）"""
+        now = time.perf_counter()
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+            now = self.next_time
+        self.write(data)
+        self.next_time = now + len(data) / self.rate
+
+    def send_raw(self, data):
+        chunk = max(64, int(self.rate / 100))  # 每次写入约 10 毫秒的数据
+        position = self.offset
+        while position < self.size:
+            self.check_cancelled()
+            end = min(position + chunk, self.size)
+            self.send(data[position:end])
+            position = self.confirmed = end
+            self.report()
+
+    def make_block(self, number, payload, pad):
+        size = 128 if len(payload) <= 128 and number == 0 else self.block_size
+        payload = bytes(payload).ljust(size, bytes((pad,)))
+        number &= 0xFF
+        header = bytes((self.STX if size == 1024 else self.SOH, number, 0xFF - number))
+        return header + payload + binascii.crc_hqx(payload, 0).to_bytes(2, 'big')
+
+    def make_header(self, offset):
+        """YMODEM 文件头：文件名\\0长度 修改时间(八进制) 权限 序号 [续传起点]"""
+        fields = f"{self.size} {int(os.path.getmtime(self.path)):o} 0 0"
+        if offset:
+            fields += f" {offset}"
+        info = os.path.basename(self.path).encode('utf-8') + b'\0' + fields.encode('ascii')
+        return self.make_block(0, info, 0)
+
+    def next_response(self, timeout, accept):
+        """等待 accept 中的应答字节，其余字节忽略，超时返回 None"""
+        deadline = time.perf_counter() + timeout
+        with self.condition:
+            while True:
+                while self.responses:
+                    byte = self.responses.popleft()
+                    if byte in accept:
+                        return byte
+                self.check_cancelled()
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(min(remaining, 0.1))
+
+    def drain_responses(self):
+        """丢弃重发前收到的应答：等已写出的块在线路上传完，再等到接收方 QUIET 秒没有应答（最多 timeout 秒）"""
+        deadline = max(time.perf_counter(), self.next_time) + self.QUIET
+        limit = deadline + self.timeout
+        with self.condition:
+            while True:
+                if self.responses:
+                    if self.CAN in self.responses:
+                        raise TransferError('接收方取消了传输')
+                    self.responses.clear()
+                    deadline = time.perf_counter() + self.QUIET
+                self.check_cancelled()
+                remaining = min(deadline, limit) - time.perf_counter()
+                if remaining <= 0:
+                    return
+                self.condition.wait(min(remaining, 0.1))
+
+    def wait_ready(self):
+        """等待接收方发出 'C'（CRC 模式）"""
+        response = self.next_response(self.start_timeout, (self.CRC, self.NAK, self.CAN))
+        if response is None:
+            raise TransferError('等待接收方就绪超时')
+        if response == self.NAK:
+            raise TransferError('接收方只支持累加和校验，请改用 CRC 模式')
+        if response == self.CAN:
+            raise TransferError('接收方取消了传输')
+
+    def send_confirmed(self, packet, what):
+        """发送单个包并等待 ACK，NAK 或超时时重发"""
+        for _ in range(self.MAX_RETRIES):
+            self.send(packet)
+            response = self.next_response(self.timeout, (self.ACK, self.NAK, self.CAN))
+            if response == self.ACK:
+                return
+            if response == self.CAN:
+                raise TransferError('接收方取消了传输')
+            self.retransmits += 1
+        raise TransferError(f'{what}没有得到接收方确认')
+
+    def send_file(self, data):
+        self.wait_ready()
+        if self.mode == 'ymodem':
+            self.send_confirmed(self.make_header(self.offset), '文件头')
+            self.wait_ready()
+        self.send_blocks(data)
+        self.send_confirmed(bytes((self.EOT,)), '结束标志')
+        if self.mode == 'ymodem':
+            self.wait_ready()
+            self.send_confirmed(self.make_block(0, b'', 0), '批量传输结束块')  # 空文件名表示没有更多文件
+
+    def send_blocks(self, data):
+        """滑动窗口发送数据块（回退 N 帧重传）"""
+        block_size = self.block_size
+        start = self.offset
+        count = -(-(self.size - start) // block_size)
+        timeout = self.timeout + self.window * (block_size + 5) / self.rate
+        base = sent = 0  # 最早未确认的块、下一个要发送的块
+        retries = 0
+        while base < count:
+            while sent < count and sent - base < self.window:
+                position = start + sent * block_size
+                self.send(self.make_block(sent + 1, data[position:position + block_size], self.PAD))
+                sent += 1
+            response = self.next_response(timeout, (self.ACK, self.NAK, self.CAN))
+            if response == self.ACK:
+                base += 1
+                retries = 0
+                self.confirmed = min(start + base * block_size, self.size)
+                self.report()
+            elif response == self.CAN:
+                raise TransferError('接收方取消了传输')
+            else:
+                retries += 1
+                if retries > self.MAX_RETRIES:
+                    raise TransferError(f'第 {base + 1} 块重试 {self.MAX_RETRIES} 次仍失败')
+                self.retransmits += sent - base
+                self.drain_responses()
+                sent = base
+
+
+class FileTransferThread(QThread):
+    """后台发送文件线程，发送过程中不阻塞界面"""
+    progress = pyqtSignal(int, int, float)  # 已确认字节数, 总字节数, 吞吐量(字节/秒)
+    completed = pyqtSignal(int, float)  # 本次发送的字节数, 用时(秒)
+    failed = pyqtSignal(str, int)  # 错误信息, 已确认字节数（可从此处续传）
+
+    def __init__(self, serial_port, path, mode, **options):
+        super().__init__()
+        self.transfer = FileTransfer(serial_port.write, path, mode, progress=self.progress.emit,
+                                     is_cancelled=self.isInterruptionRequested, **options)
+
+    def run(self):
+        transfer = self.transfer
+        try:
+            transfer.run()
+        except Exception as e:
+            self.failed.emit(str(e), transfer.confirmed)
+            return
+        self.completed.emit(transfer.confirmed - transfer.offset, transfer.elapsed)
+
+
+class TelemetryClient:
+    """遥测转发服务的一个客户端连接"""
+    __slots__ = ('writer', 'websocket')
+
+    def __init__(self, writer, websocket):
+        self.writer = writer
+        self.websocket = websocket
+
+
+class TelemetryServer(QObject):
+    """本地遥测转发服务，让多个客户端同时查看同一个串口的数据
+
+    TCP 端口转发原始串口字节流；WebSocket 端口以二进制帧转发原始字节、以文本帧转发解析后的采样(JSON)。
+    每条消息只编码一次；同一轮事件循环内发布的消息拼接成一块，所有客户端共享同一个 bytes 对象。
+    每个客户端的发送缓冲区有上限，超过上限的慢速客户端会被断开，不会拖慢其他客户端。
+    只有打开 accept_commands 时，客户端发来的文本行/文本帧才作为指令通过 command_received 交给主窗口的发送路径。
+    WebSocket 握手带有非本机 Origin（即来自其他网站的页面）时直接拒绝。
+    """
+    command_received = pyqtSignal(str)
+    WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+    MAX_COMMAND_SIZE = 64 * 1024
+    LOCAL_ORIGINS = ('localhost', '127.0.0.1', '::1')
+
+    def __init__(self, host='127.0.0.1', tcp_port=9750, ws_port=9751, max_buffer=256 * 1024, accept_commands=False):
+        super().__init__()
+        self.host = host
+        self.tcp_port = tcp_port
+        self.ws_port = ws_port
+        self.max_buffer = max_buffer  # 每个客户端最多积压的字节数
+        self.accept_commands = accept_commands  # 是否把客户端发来的文本当作指令发往串口
+        self.clients = set()
+        self.websocket_count = 0
+        self.slow_disconnects = 0
+        self.loop = None
+        self.thread = None
+
+        # 其他线程发布、等待事件循环线程统一发送的消息
+        self._pending_lock = threading.Lock()
+        self._pending_tcp = []
+        self._pending_ws = []
+        self._flush_scheduled = False
+
+    def start(self):
+        """在后台线程中启动事件循环并监听端口，端口被占用时抛出 OSError"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                servers = loop.run_until_complete(self._start_servers())
+            except OSError as e:
+                errors.append(e)
+                loop.close()
+                ready.set()
+                return
+            self.loop = loop
+            ready.set()
+            loop.run_forever()
+
+            for server in servers:
+                server.close()
+            # 断开所有连接后等待各连接的处理协程自然结束
+            for client in list(self.clients):
+                self._drop(client)
+            tasks = asyncio.all_tasks(loop)
+            if tasks:
+                _, pending = loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+                for task in pending:
+                    task.cancel()
+            loop.close()
+
+        self.thread = threading.Thread(target=run, name='TelemetryServer', daemon=True)
+        self.thread.start()
+        ready.wait()
+        if errors:
+            self.thread = None
+            raise errors[0]
+
+    def stop(self):
+        """停止服务并断开所有客户端"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(2)
+            self.loop = None
+            self.thread = None
+
+    async def _start_servers(self):
+        tcp_server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port)
+        ws_server = await asyncio.start_server(self._handle_websocket, self.host, self.ws_port)
+        # 端口为 0 时记录系统实际分配的端口
+        self.tcp_port = tcp_server.sockets[0].getsockname()[1]
+        self.ws_port = ws_server.sockets[0].getsockname()[1]
+        return [tcp_server, ws_server]
+
+    def publish_raw(self, data):
+        """转发一段原始串口数据（可在任意线程调用）"""
+        if self.loop is None or not self.clients:
+            return
+        # data 可以是接收线程的 memoryview，拼接发送内容时才复制
+        ws_frame = self.encode_ws_frame(0x2, data) if self.websocket_count else None
+        self._enqueue(data, ws_frame)
+
+    def publish_samples(self, samples):
+        """以 JSON 文本帧转发一批解析后的采样（可在任意线程调用）"""
+        if self.loop is None or not self.websocket_count:
+            return
+        # NaN/inf 不是合法的 JSON，按 null 发出
+        samples = [{name: value if not isinstance(value, float) or math.isfinite(value) else None
+                    for name, value in values.items()} for values in samples]
+        message = json.dumps({'t': time.time(), 'samples': samples}, ensure_ascii=False, allow_nan=False)
+        self._enqueue(None, self.encode_ws_frame(0x1, message.encode('utf-8')))
+
+    @staticmethod
+    def encode_ws_frame(opcode, payload):
+        """编码一个服务端发出的（不加掩码的）WebSocket 帧"""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        return header + payload
+
+    def _enqueue(self, tcp_payload, ws_payload):
+        """登记待发送的消息，每轮事件循环只调度一次发送"""
+        with self._pending_lock:
+            if tcp_payload is not None:
+                self._pending_tcp.append(tcp_payload)
+            if ws_payload is not None:
+                self._pending_ws.append(ws_payload)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        """在事件循环线程中把积压的消息拼接一次，写给所有客户端"""
+        with self._pending_lock:
+            pending_tcp, self._pending_tcp = self._pending_tcp, []
+            pending_ws, self._pending_ws = self._pending_ws, []
+            self._flush_scheduled = False
+        tcp_payload = b''.join(pending_tcp)
+        ws_payload = b''.join(pending_ws)
+
+        for client in list(self.clients):
+            payload = ws_payload if client.websocket else tcp_payload
+            if not payload:
+                continue
+            transport = client.writer.transport
+            if transport.get_write_buffer_size() + len(payload) > self.max_buffer:
+                self.slow_disconnects += 1
+                self._drop(client)
+            else:
+                transport.write(payload)
+
+    def _register(self, writer, websocket):
+        # 限制内核发送缓冲区，使积压主要体现在可控的 max_buffer 上
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+        client = TelemetryClient(writer, websocket)
+        self.clients.add(client)
+        if websocket:
+            self.websocket_count += 1
+        return client
+
+    def _drop(self, client):
+        if client not in self.clients:
+            return
+        self.clients.discard(client)
+        if client.websocket:
+            self.websocket_count -= 1
+        client.writer.transport.abort()
+
+    async def _handle_tcp(self, reader, writer):
+        client = self._register(writer, websocket=False)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                if command and self.accept_commands:
+                    self.command_received.emit(command)
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self._drop(client)
+
+    async def _handle_websocket(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.transport.abort()
+            return
+
+        key = origin = None
+        for line in request.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'sec-websocket-key':
+                key = value.strip()
+            elif name == 'origin':
+                origin = value.strip()
+        if origin is not None and not self.is_local_origin(origin):
+            writer.write(b'HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n')
+            writer.close()
+            return
+        if not key:
+            writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            writer.close()
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + self.WS_GUID).encode('ascii')).digest()).decode('ascii')
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode('ascii'))
+
+        client = self._register(writer, websocket=True)
+        try:
+            while True:
+                opcode, payload = await self._read_ws_frame(reader)
+                if opcode == 0x8:  # 关闭
+                    break
+                elif opcode == 0x9:  # ping
+                    writer.write(self.encode_ws_frame(0xA, payload))
+                elif opcode == 0x1:
+                    command = payload.decode('utf-8', 'replace').strip()
+                    if command and self.accept_commands:
+                        self.command_received.emit(command)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self._drop(client)
+
+    @classmethod
+    def is_local_origin(cls, origin):
+        """Origin 是否指向本机地址"""
+        try:
+            host = urllib.parse.urlsplit(origin).hostname
+        except ValueError:
+            return False
+        return host in cls.LOCAL_ORIGINS
+
+    async def _read_ws_frame(self, reader):
+        """读取一个客户端发来的 WebSocket 帧，返回 (opcode, 去掉掩码后的负载)"""
+        first, second = await reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        if length > self.MAX_COMMAND_SIZE:
+            raise ValueError("WebSocket 帧过大")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(byte ^ mask[i & 3] for i, byte in enumerate(payload))
+        return opcode, payload
+
+
+class MetricsServer:
+    """本机 HTTP 指标接口，以 Prometheus 文本格式输出 /metrics
+
+    在独立线程中运行，每次抓取只读取 PipelineMetrics 和 ChannelStatsBank 的快照。
+    """
+    PREFIX = 'serial_assistant'
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, pipeline, host='127.0.0.1', port=9752, telemetry_server=None):
+        self.pipeline = pipeline
+        self.host = host
+        self.port = port
+        self.telemetry_server = telemetry_server  # 可选，输出转发服务的客户端数量
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """绑定端口并在后台线程中处理请求，端口被占用时抛出 OSError"""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', metrics.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.HTTPServer((self.host, self.port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join()
+            self.httpd = None
+
+    @staticmethod
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self):
+        """生成 Prometheus 文本格式的全部指标"""
+        prefix = self.PREFIX
+        escape = self.escape
+        counters, latest, histograms = self.pipeline.metrics.snapshot()
+        stats = self.pipeline.stats.snapshot()
+        data_format = self.pipeline.data_format
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {prefix}_{name} {text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        header('sensor_value', 'gauge', '最近一次解析到的传感器数值')
+        for name, info in data_format.items():
+            value = latest.get(name)
+            if isinstance(value, str):
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = None
+            if value is not None:
+                lines.append(f'{prefix}_sensor_value{{name="{escape(name)}",key="{escape(info.get("key", ""))}",'
+                             f'unit="{escape(info.get("unit", ""))}"}} {value!r}')
+
+        header('sensor_rate_hz', 'gauge', '滚动统计窗口内的采样率')
+        for name, snapshot in stats.items():
+            lines.append(f'{prefix}_sensor_rate_hz{{name="{escape(name)}"}} {snapshot.rate!r}')
+
+        for counter, text in (('bytes', '收到的原始字节数'), ('frames', '分帧得到的帧数'),
+                              ('samples', '成功解析的采样数'), ('parse_errors', '无法解析的帧和数值数'),
+                              ('dropped_updates', '因界面处理不过来而丢弃的界面更新数'),
+                              ('rule_actions', '触发的自动规则动作数'),
+                              ('checked_frames', '做了校验和检查的帧数'), ('checksum_errors', '校验失败或缺少校验和的帧数'),
+                              ('sequenced_frames', '带有序号的帧数'),
+                              ('out_of_order', '乱序到达的帧数'), ('duplicate_frames', '序号重复的帧数'),
+                              ('sequence_resets', '序号大幅回退（设备重启）的次数')):
+            header(f'{counter}_total', 'counter', text)
+            lines.append(f'{prefix}_{counter}_total {counters[counter]}')
+        # 迟到的帧会从丢帧中扣回，数值可能减小，因此不是 counter
+        header('lost_frames', 'gauge', '按序号跳号推算的丢帧数（扣除迟到的帧）')
+        lines.append(f'{prefix}_lost_frames {counters["lost_frames"]}')
+
+        for histogram_name, text in (('process', '每次读取的解析处理耗时（秒）'),
+                                     ('gui_delivery', '采样从接收线程发出到界面处理的延迟（秒）')):
+            histogram = histograms[histogram_name]
+            metric = f'{prefix}_{histogram_name}_seconds'
+            header(f'{histogram_name}_seconds', 'histogram', text)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound!r}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum {histogram.sum!r}')
+            lines.append(f'{metric}_count {histogram.count}')
+
+        server = self.telemetry_server
+        if server is not None:
+            header('telemetry_clients', 'gauge', '遥测转发服务的客户端数量')
+            lines.append(f'{prefix}_telemetry_clients {len(server.clients)}')
+        return '\n'.join(lines) + '\n'
+
+
+class DeviceSimulator:
+    """基于伪终端(pty)的小车模拟器，用于在没有实物时测试和压测接收流程（仅支持 Linux/macOS）
+
+    按 data_format 以指定频率发送遥测数据，可模拟发送抖动、拆分/合并写入、损坏帧和突发数据，
+    并按串口波特率限制发送速度。收到 cmd_buttons 中的指令时回复 'ACK:指令' 并改变模拟状态。
+    文本帧可附加序号和校验和字段（见 FrameCheck），drop 模拟丢帧。
+    收到 UPDATE_COMMAND 时暂停遥测，作为 XMODEM/YMODEM 接收方接收文件，结果保存在 received_files；
+    收到 RATE_COMMANDS 中的指令时按倍数调整发送频率。
+
+    二进制模式的帧格式: 0xAA 0x55 长度 + 各数值字段的 float32(小端) + 状态字节 + XOR 校验。
+    """
+    # 指令 -> 模拟的状态码（对应 STATUS_MAP）
+    COMMAND_STATUS = {'CMD:AUTO': '1', 'CMD:MANUAL': '2', 'CMD:STOP': '0'}
+    BURST_SIZE = 20
+    UPDATE_COMMAND = 'CMD:UPDATE'
+    RATE_COMMANDS = {'CMD:SLOWER': 0.5, 'CMD:FASTER': 2.0}  # 发送频率的倍数，用于测试自适应速率
+    RECEIVE_IDLE = 10.0  # 接收文件时超过此时间没有数据则放弃
+
+    def __init__(self, data_format=None, cmd_buttons=None, rate=50.0, baudrate=115200, binary=False,
+                 jitter=0.0, split=0.0, merge=0.0, corrupt=0.0, burst=0.0, timestamp_key=None,
+                 data_separator=",", kv_separator=":", seed=13349, drop=0.0, checksum=None, checksum_key='CK',
+                 sequence_key=None, sequence_modulus=256):
+        self.data_format = data_format if data_format is not None else DEFAULT_DATA_FORMAT
+        self.commands = set((cmd_buttons if cmd_buttons is not None else DEFAULT_CMD_BUTTONS).values())
+        self.rate = rate
+        self.baudrate = baudrate
+        self.binary = binary
+        self.jitter = jitter            # 发送间隔的相对抖动（标准差 / 间隔）
+        self.split = split              # 一帧被拆成多次写入的概率
+        self.merge = merge              # 一帧与下一帧合并写入的概率
+        self.corrupt = corrupt          # 帧被损坏（改写/截断）的概率
+        self.burst = burst              # 一次突发发送 BURST_SIZE 帧的概率
+        self.timestamp_key = timestamp_key  # 设置后在每帧附加发送时刻(time.time())，用于测量延迟
+        self.drop = drop                # 帧被丢弃（序号照常递增）的概率
+        self.checksum = FrameCheck.ALGORITHMS[checksum] if checksum else None  # 文本帧末尾附加校验和字段
+        self.checksum_key = checksum_key
+        self.checksum_digits = 4 if checksum == 'CRC16' else 2
+        self.sequence_key = sequence_key  # 设置后在每帧附加序号
+        self.sequence_modulus = sequence_modulus
+        self.sequence = 0
+        self.data_separator = data_separator
+        self.kv_separator = kv_separator
+        self.rng = random.Random(seed)
+
+        self.state = {}
+        self.status = '0'
+        self.master_fd = None
+        self.slave_fd = None
+        self.port = None
+        self.thread = None
+        self.is_running = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.received_files = {}  # 文件名 -> 收到的内容（中断时为已收到的部分）
+        self.blocks_rejected = 0
+
+    def open(self):
+        """创建伪终端对，返回供串口程序打开的设备路径"""
+        if not hasattr(os, 'openpty'):
+            raise OSError("当前系统不支持伪终端，模拟器只能在 Linux/macOS 上运行")
+        import tty
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        return self.port
+
+    def start(self):
+        """打开伪终端（如尚未打开）并在后台线程中开始发送"""
+        if self.master_fd is None:
+            self.open()
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, name='DeviceSimulator', daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.is_running = False
+        if self.thread is not None:
+            self.thread.join(2)
+            self.thread = None
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self.master_fd = self.slave_fd = None
+
+    def make_frame(self):
+        """生成一帧遥测数据（文本模式含换行）"""
+        if self.binary:
+            values = []
+            for name, info in self.data_format.items():
+                if name == '当前状态' or not info.get('key'):
+                    continue
+                low, high = info.get('min', 0), info.get('max', 100)
+                value = self.state.get(name, (low + high) / 2) + self.rng.gauss(0, (high - low) * 0.01)
+                self.state[name] = min(max(value, low), high)
+                values.append(self.state[name])
+            body = struct.pack(f'<{len(values)}fB', *values, int(self.status))
+            checksum = 0
+            for byte in body:
+                checksum ^= byte
+            return b'\xAA\x55' + bytes((len(body),)) + body + bytes((checksum,))
+
+        # 状态字段使用模拟器的当前状态，而不是随机值
+        text = make_telemetry_frame(self.data_format, self.rng, self.state,
+                                    self.data_separator, self.kv_separator, fixed={'当前状态': self.status})
+        if self.timestamp_key:
+            text += f"{self.data_separator}{self.timestamp_key}{self.kv_separator}{time.time():.6f}"
+        if self.sequence_key:
+            text += f"{self.data_separator}{self.sequence_key}{self.kv_separator}{self.sequence}"
+            self.sequence = (self.sequence + 1) % self.sequence_modulus
+        data = text.encode('utf-8')
+        if self.checksum is not None:
+            data += (f"{self.data_separator}{self.checksum_key}{self.kv_separator}"
+                     f"{self.checksum(data):0{self.checksum_digits}X}").encode('utf-8')
+        return data + b'\n'
+
+    def corrupt_frame(self, frame):
+        """随机改写一个字节或截断帧"""
+        if self.rng.random() < 0.5:
+            position = self.rng.randrange(len(frame))
+            return frame[:position] + bytes((self.rng.randrange(256),)) + frame[position + 1:]
+        return frame[:self.rng.randrange(1, len(frame))]
+
+    def write(self, data):
+        """写入主端并按波特率限速（每字节 10 个比特：起始位 + 8 数据位 + 停止位）"""
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+        self.bytes_sent += len(data)
+        time.sleep(len(data) * 10 / self.baudrate)
+
+    def handle_commands(self, buffer):
+        """读取并应答串口助手发来的指令，返回未处理完的残留数据"""
+        try:
+            buffer += os.read(self.master_fd, 4096)
+        except (BlockingIOError, OSError):
+            return buffer
+        *lines, buffer = buffer.replace(b'\r', b'\n').split(b'\n')
+        # 串口助手发送指令时不带换行，整段数据也作为一条指令处理
+        if buffer.strip().decode('utf-8', 'replace') in self.commands | {self.UPDATE_COMMAND} | set(self.RATE_COMMANDS):
+            lines.append(buffer)
+            buffer = b''
+        for line in lines:
+            command = line.strip().decode('utf-8', 'replace')
+            if command == self.UPDATE_COMMAND:
+                self.receive_file()
+                continue
+            if command in self.RATE_COMMANDS:
+                self.rate *= self.RATE_COMMANDS[command]
+                self.write(f"ACK:{command}\n".encode('utf-8'))
+                continue
+            if command not in self.commands:
+                continue
+            self.status = self.COMMAND_STATUS.get(command, self.status)
+            if command == 'CMD:STOP':
+                self.state['行进速度'] = 0.0
+            self.write(f"ACK:{command}\n".encode('utf-8'))
+        return buffer
+
+    def receive_file(self):
+        """作为接收方按 FileTransfer 的协议接收文件（CRC 模式，块 0 为 YMODEM 文件头）
+
+        按顺序应答每个块；出错的块回复一次 NAK，之后到重发为止收到的块都忽略。
+        corrupt 的概率同样用于把收到的块当作校验错误，模拟线路干扰。
+        """
+        SOH, STX, EOT, ACK, NAK, CAN, CRC = (FileTransfer.SOH, FileTransfer.STX, FileTransfer.EOT, FileTransfer.ACK,
+                                             FileTransfer.NAK, FileTransfer.CAN, FileTransfer.CRC)
+        buffer = bytearray()
+        name, size, data = 'xmodem', None, bytearray()
+        expected = 0  # 0 表示等待文件头或第一个数据块
+        rejected = False
+        started = False
+        self.write(bytes((CRC,)))
+        last_data = time.perf_counter()
+        while self.is_running:
+            readable, _, _ = select.select([self.master_fd], [], [], 1.0)
+            if readable:
+                try:
+                    chunk = os.read(self.master_fd, 65536)
+                except OSError:
+                    break
+                # 伪终端没有传输时间，按波特率等到这些数据在线路上传完再处理和应答
+                last_data = max(last_data, time.perf_counter()) + len(chunk) * 10 / self.baudrate
+                time.sleep(max(0.0, last_data - time.perf_counter()))
+                buffer += chunk
+            elif time.perf_counter() - last_data > self.RECEIVE_IDLE:
+                break
+            elif not started:
+                self.write(bytes((CRC,)))
+                continue
+            while buffer:
+                head = buffer[0]
+                if head == CAN:
+                    self.received_files[name] = bytes(data)
+                    return
+                if head == EOT:
+                    del buffer[0]
+                    self.write(bytes((ACK,)))
+                    self.received_files[name] = bytes(data[:size] if size is not None else data.rstrip(b'\x1a'))
+                    if size is None:
+                        return
+                    name, size, data, expected = None, None, bytearray(), 0
+                    self.write(bytes((CRC,)))  # YMODEM: 请求下一个文件头
+                    continue
+                if head not in (SOH, STX):
+                    del buffer[0]
+                    continue
+                length = 3 + (1024 if head == STX else 128) + 2
+                if len(buffer) < length:
+                    break
+                number, inverse = buffer[1], buffer[2]
+                payload = bytes(buffer[3:length - 2])
+                crc = int.from_bytes(buffer[length - 2:length], 'big')
+                del buffer[:length]
+                started = True
+                valid = number ^ inverse == 0xFF and binascii.crc_hqx(payload, 0) == crc
+                if valid and self.corrupt and self.rng.random() < self.corrupt:
+                    valid = False
+                if not valid:
+                    self.blocks_rejected += 1
+                    if not rejected:
+                        rejected = True
+                        self.write(bytes((NAK,)))
+                    continue
+                if expected == 0 and number == 0:
+                    filename, _, info = payload.partition(b'\0')
+                    self.write(bytes((ACK,)))
+                    if not filename:
+                        return  # 空文件头：批量传输结束
+                    fields = info.rstrip(b'\0').split()
+                    name = filename.decode('utf-8', 'replace')
+                    size = int(fields[0]) if fields else None
+                    offset = int(fields[4]) if len(fields) > 4 else 0
+                    data = bytearray(self.received_files.get(name, b'')[:offset])
+                    expected = 1
+                    self.write(bytes((CRC,)))
+                elif number == (expected or 1) & 0xFF:
+                    data += payload
+                    expected = (expected or 1) + 1
+                    rejected = False
+                    self.write(bytes((ACK,)))
+                elif number == (expected - 1) & 0xFF and expected > 1:
+                    self.write(bytes((ACK,)))  # 重复的块（ACK 丢失后重发）
+        if name is not None:
+            self.received_files[name] = bytes(data)
+
+    def run(self):
+        os.set_blocking(self.master_fd, True)
+        command_buffer = b''
+        pending = b''
+        next_time = time.perf_counter()
+        while self.is_running:
+            interval = 1.0 / self.rate
+            readable, _, _ = select.select([self.master_fd], [], [], max(0.0, next_time - time.perf_counter()))
+            if readable:
+                command_buffer = self.handle_commands(command_buffer)
+                continue
+            if time.perf_counter() < next_time:
+                continue
+
+            count = self.BURST_SIZE if self.burst and self.rng.random() < self.burst else 1
+            for _ in range(count):
+                frame = self.make_frame()
+                if self.drop and self.rng.random() < self.drop:
+                    self.frames_dropped += 1
+                    continue
+                if self.corrupt and self.rng.random() < self.corrupt:
+                    frame = self.corrupt_frame(frame)
+                pending += frame
+                self.frames_sent += 1
+            if self.merge and self.rng.random() < self.merge:
+                pass  # 留到下一帧一起写入
+            elif self.split and len(pending) > 1 and self.rng.random() < self.split:
+                cut = self.rng.randrange(1, len(pending))
+                self.write(pending[:cut])
+                time.sleep(interval * self.rng.random() * 0.5)
+                self.write(pending[cut:])
+                pending = b''
+            else:
+                self.write(pending)
+                pending = b''
+
+            delay = interval * count
+            if self.jitter:
+                delay = max(0.0, delay * (1 + self.rng.gauss(0, self.jitter)))
+            next_time = max(next_time + delay, time.perf_counter() - interval)
+
+
+# 每个设备配置（profile）保存的设置项；其余为所有配置共用的全局选项
+PROFILE_KEYS = ('cmd_buttons', 'data_format', 'data_separator', 'kv_separator', 'rules',
+                'stats_window', 'history_hours', 'port_settings', 'frame_check', 'rate_control', 'frame_timeout')
+GLOBAL_KEYS = ('server_enabled', 'server_tcp_port', 'server_ws_port', 'server_commands', 'gauge_grid',
+               'metrics_enabled', 'metrics_port', 'console_compact', 'console_summary_rate')
+
+
+def user_config_dir():
+    """返回当前用户的配置目录"""
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(base, 'SolarRoverSerialAssistant')
+
+
+class SettingsStore(QObject):
+    """设置存储：多个设备配置缓存在内存中，修改后由后台线程合并写入
+
+    写入时先写临时文件并 fsync，再用 os.replace 原子替换，程序崩溃不会留下写了一半的设置文件。
+    短时间内的多次修改会合并为一次写入。
+    """
+    saved = pyqtSignal()
+    save_failed = pyqtSignal(str)
+    FILE_NAME = 'serial_settings.json'
+    DEFAULT_PROFILE = '默认'
+
+    def __init__(self, directory=None, delay=0.5, max_delay=2.0):
+        super().__init__()
+        self.directory = directory or user_config_dir()
+        self.path = os.path.join(self.directory, self.FILE_NAME)
+        self.delay = delay          # 最后一次修改后等待多久再写入
+        self.max_delay = max_delay  # 持续修改时最长的推迟时间
+        self.profiles = {self.DEFAULT_PROFILE: {}}
+        self.active_profile = self.DEFAULT_PROFILE
+        self.options = {}
+        self.write_count = 0
+
+        self._condition = threading.Condition()
+        self._dirty = False
+        self._writing = False
+        self._last_change = 0.0
+        self._closed = False
+        self._thread = None
+
+    def load(self, legacy_path=None):
+        """读取设置文件；用户目录中还没有设置时导入旧版本保存在当前目录的 legacy_path"""
+        path = self.path
+        if not os.path.exists(path):
+            if not legacy_path or not os.path.exists(legacy_path):
+                return
+            path = legacy_path
+
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+
+        with self._condition:
+            if 'profiles' in settings:
+                self.profiles = settings['profiles'] or {self.DEFAULT_PROFILE: {}}
+                self.active_profile = settings.get('active_profile', self.DEFAULT_PROFILE)
+                self.options = settings.get('options', {})
+            else:
+                # 旧版本的单一设置文件
+                self.profiles = {self.DEFAULT_PROFILE: {key: settings[key] for key in PROFILE_KEYS if key in settings}}
+                self.active_profile = self.DEFAULT_PROFILE
+                self.options = {key: settings[key] for key in GLOBAL_KEYS if key in settings}
+            if self.active_profile not in self.profiles:
+                self.active_profile = next(iter(self.profiles))
+
+        if path != self.path:
+            self.save()
+
+    def profile_names(self):
+        with self._condition:
+            return list(self.profiles)
+
+    def get_profile(self, name=None):
+        """返回配置的副本（直接从内存缓存读取）"""
+        with self._condition:
+            return copy.deepcopy(self.profiles.get(name or self.active_profile, {}))
+
+    def set_profile(self, name, profile):
+        """更新配置，内容有变化时安排后台保存"""
+        with self._condition:
+            if self.profiles.get(name) == profile:
+                return
+            self.profiles[name] = copy.deepcopy(profile)
+        self.save()
+
+    def delete_profile(self, name):
+        with self._condition:
+            if name not in self.profiles or len(self.profiles) <= 1:
+                return False
+            del self.profiles[name]
+            if self.active_profile == name:
+                self.active_profile = next(iter(self.profiles))
+        self.save()
+        return True
+
+    def set_active(self, name):
+        with self._condition:
+            if name not in self.profiles or name == self.active_profile:
+                return
+            self.active_profile = name
+        self.save()
+
+    def set_options(self, **options):
+        with self._condition:
+            if all(self.options.get(key) == value for key, value in options.items()):
+                return
+            self.options.update(options)
+        self.save()
+
+    def save(self):
+        """标记设置已修改，由后台线程稍后写入"""
+        with self._condition:
+            if self._closed:
+                return
+            self._dirty = True
+            self._last_change = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='SettingsStore', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout=5.0):
+        """立即写入尚未保存的修改并等待完成"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._last_change = 0.0
+            self._condition.notify_all()
+            while (self._dirty or self._writing) and self._thread is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        """写入未保存的修改并停止后台线程"""
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._dirty and not self._closed:
+                    self._condition.wait()
+                if not self._dirty:
+                    return
+
+                # 合并短时间内的连续修改
+                deadline = time.monotonic() + self.max_delay
+                while True:
+                    remaining = min(self._last_change + self.delay, deadline) - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        break
+                    self._condition.wait(remaining)
+
+                text = json.dumps({
+                    'version': 2,
+                    'active_profile': self.active_profile,
+                    'profiles': self.profiles,
+                    'options': self.options,
+                }, ensure_ascii=False, indent=2)
+                self._dirty = False
+                self._writing = True
+
+            try:
+                self._write_atomic(text)
+                self.write_count += 1
+                self.saved.emit()
+            except OSError as e:
+                self.save_failed.emit(str(e))
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write_atomic(self, text):
+        """写入临时文件后原子替换设置文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.serial_settings.', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+class FormatCache(dict):
+    """数值 -> 格式化文本的缓存。传感器数值重复度很高，查缓存比逐个格式化快得多"""
+    MAX_SIZE = 1 << 20
+
+    def __missing__(self, value):
+        if value != value:  # NaN 输出为空，且每个 NaN 都是不同的对象，不放入缓存
+            return ''
+        if len(self) >= self.MAX_SIZE:
+            self.clear()
+        text = self[value] = '{:.10g}'.format(value)
+        return text
+
+
+class HistoryExporter:
+    """把 SampleHistory.select 选出的片段按列分块写出为 CSV / NPZ / Parquet
+
+    CSV 和 Parquet 的原始数据另存为同名的 _raw.bin 与 _raw_index.csv；NPZ 中以 raw_* 数组保存。
+    NPZ 直接按 .npy 格式流式写入，不依赖 numpy；Parquet 需要安装 pyarrow。
+    """
+    FORMATS = {'CSV': '.csv', 'NPZ': '.npz', 'Parquet': '.parquet'}
+
+    def __init__(self, parts, raw_parts, path, fmt='CSV', progress=None, is_cancelled=None):
+        self.parts = parts
+        self.raw_parts = raw_parts
+        self.path = path
+        self.fmt = fmt
+        self.progress = progress or (lambda percent: None)
+        self.is_cancelled = is_cancelled or (lambda: False)
+
+        # 各数据块字段的并集，保持出现顺序
+        fields = {}
+        for chunk, _, _ in parts:
+            fields.update(dict.fromkeys(chunk.fields))
+        self.fields = list(fields)
+        self.rows = sum(last - first for _, first, last in parts)
+        self.written = []  # 已创建的文件，打开前登记，失败或取消时全部删除
+        self._done = 0
+        self._total = 1
+
+    @staticmethod
+    def available_formats():
+        formats = ['CSV', 'NPZ']
+        if importlib.util.find_spec('pyarrow') is not None:
+            formats.append('Parquet')
+        return formats
+
+    def run(self):
+        """执行导出，返回写出的文件列表；取消或失败时删除已创建的文件，取消时抛出 ExportCancelled"""
+        self.written = []
+        try:
+            if self.fmt == 'NPZ':
+                self._total = max(1, self.rows * (len(self.fields) + 1) + self._raw_size())
+                self.written.append(self.path)
+                self.write_npz(self.path)
+            else:
+                self._total = max(1, self.rows + self._raw_size())
+                self.written.append(self.path)
+                if self.fmt == 'Parquet':
+                    self.write_parquet(self.path)
+                else:
+                    self.write_csv(self.path)
+                if self.raw_parts:
+                    base = os.path.splitext(self.path)[0]
+                    self.write_raw_files(base + '_raw.bin', base + '_raw_index.csv')
+            self.progress(100)
+            return list(self.written)
+        except BaseException:
+            for path in self.written:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+    def _raw_size(self):
+        return sum(last - first for _, first, last in self.raw_parts)
+
+    def _advance(self, amount):
+        if self.is_cancelled():
+            raise ExportCancelled()
+        self._done += amount
+        self.progress(min(99, self._done * 100 // self._total))
+
+    @staticmethod
+    def _column(chunk, name, first, last):
+        """取出一列的片段（复制，避免占用接收线程正在追加的数组），缺失的列补 NaN"""
+        column = chunk.columns.get(name)
+        if column is None:
+            return array('d', [float('nan')]) * (last - first)
+        return column[first:last]
+
+    @staticmethod
+    def _little_endian(values):
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tobytes()
+
+    def write_csv(self, path):
+        formatted = FormatCache().__getitem__
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write(','.join(['time'] + self.fields) + '\n')
+            for chunk, first, last in self.parts:
+                # 按列批量格式化后再拼成行
+                columns = [map('{:.3f}'.format, chunk.times[first:last])]
+                columns += [map(formatted, self._column(chunk, name, first, last)) for name in self.fields]
+                f.write('\n'.join(map(','.join, zip(*columns))))
+                f.write('\n')
+                self._advance(last - first)
+
+    @staticmethod
+    def npy_header(descr, count):
+        """生成一维数组的 .npy 文件头（格式版本 1.0，按 64 字节对齐）"""
+        header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({count},), }}"
+        padding = 63 - (10 + len(header)) % 64
+        header += ' ' * padding + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin-1')
+
+    def write_npz(self, path):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            def write_member(name, descr, count, pieces):
+                with archive.open(name + '.npy', 'w', force_zip64=True) as member:
+                    member.write(self.npy_header(descr, count))
+                    for data, amount in pieces:
+                        member.write(data)
+                        self._advance(amount)
+
+            write_member('time', '<f8', self.rows,
+                         ((self._little_endian(chunk.times[first:last]), last - first)
+                          for chunk, first, last in self.parts))
+            for name in self.fields:
+                write_member(name, '<f8', self.rows,
+                             ((self._little_endian(self._column(chunk, name, first, last)), last - first)
+                              for chunk, first, last in self.parts))
+
+            if self.raw_parts:
+                raw_count = self._raw_size()
+                write_member('raw_time', '<f8', raw_count,
+                             ((self._little_endian(chunk.times[first:last]), 0)
+                              for chunk, first, last in self.raw_parts))
+                write_member('raw_length', f'<u{array("I").itemsize}', raw_count,
+                             ((self._little_endian(chunk.lengths[first:last]), 0)
+                              for chunk, first, last in self.raw_parts))
+                data_size = sum(self._raw_span(chunk, first, last)[1] for chunk, first, last in self.raw_parts)
+                write_member('raw_data', '|u1', data_size,
+                             ((self._raw_bytes(chunk, first, last), last - first)
+                              for chunk, first, last in self.raw_parts))
+
+    def write_parquet(self, path):
+        import pyarrow
+        import pyarrow.parquet
+
+        schema = pyarrow.schema([('time', pyarrow.float64())] + [(name, pyarrow.float64()) for name in self.fields])
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for chunk, first, last in self.parts:
+                count = last - first
+                columns = [chunk.times[first:last]] + [self._column(chunk, name, first, last) for name in self.fields]
+                arrays = [pyarrow.Array.from_buffers(pyarrow.float64(), count,
+                                                     [None, pyarrow.py_buffer(self._little_endian(column))])
+                          for column in columns]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+                self._advance(count)
+
+    @staticmethod
+    def _raw_span(chunk, first, last):
+        start = chunk.offsets[first]
+        return start, chunk.offsets[last - 1] + chunk.lengths[last - 1] - start
+
+    def _raw_bytes(self, chunk, first, last):
+        start, size = self._raw_span(chunk, first, last)
+        return bytes(chunk.data[start:start + size])
+
+    def write_raw_files(self, data_path, index_path):
+        """原始数据写成连续的二进制文件，另附 时间,偏移,长度 索引"""
+        offset = 0
+        self.written += [data_path, index_path]
+        with open(data_path, 'wb') as data_file, open(index_path, 'w', encoding='utf-8', newline='') as index_file:
+            index_file.write('time,offset,length\n')
+            for chunk, first, last in self.raw_parts:
+                start, size = self._raw_span(chunk, first, last)
+                data_file.write(self._raw_bytes(chunk, first, last))
+                offsets = [offset + chunk.offsets[i] - start for i in range(first, last)]
+                rows = zip(map('{:.3f}'.format, chunk.times[first:last]), map(str, offsets),
+                           map(str, chunk.lengths[first:last]))
+                index_file.write('\n'.join(map(','.join, rows)) + '\n')
+                offset += size
+                self._advance(last - first)
+        return [data_path, index_path]
+
+
+class HistoryExportThread(QThread):
+    """后台导出线程，导出过程中不阻塞界面"""
+    progress = pyqtSignal(int)
+    completed = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, history, path, fmt, start=None, end=None, include_raw=True):
+        super().__init__()
+        parts, raw_parts = history.select(start, end)
+        self.exporter = HistoryExporter(parts, raw_parts if include_raw else [], path, fmt,
+                                        progress=self.progress.emit, is_cancelled=self.isInterruptionRequested)
+
+    def run(self):
+        try:
+            self.completed.emit(self.exporter.run())
+        except ExportCancelled:
+            self.failed.emit('导出已取消')
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ExportDialog(QDialog):
+    """导出历史数据对话框：选择时间范围和格式"""
+    def __init__(self, parent=None, time_range=None):
+        super().__init__(parent)
+        self.setWindowTitle("导出历史数据")
+
+        layout = QFormLayout()
+        first, last = time_range
+        self.start_edit = QDateTimeEdit(QDateTime.fromMSecsSinceEpoch(int(first * 1000)))
+        self.start_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        self.end_edit = QDateTimeEdit(QDateTime.fromMSecsSinceEpoch(int(last * 1000) + 1000))
+        self.end_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        layout.addRow("开始时间:", self.start_edit)
+        layout.addRow("结束时间:", self.end_edit)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(HistoryExporter.available_formats())
+        layout.addRow("格式:", self.format_combo)
+
+        self.raw_check = QCheckBox("同时导出原始串口数据")
+        self.raw_check.setChecked(True)
+        layout.addRow(self.raw_check)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addRow(button_box)
+        self.setLayout(layout)
+
+    def get_options(self):
+        """返回 (开始时间, 结束时间, 格式, 是否包含原始数据)，时间为 Unix 秒"""
+        return (self.start_edit.dateTime().toMSecsSinceEpoch() / 1000,
+                self.end_edit.dateTime().toMSecsSinceEpoch() / 1000,
+                self.format_combo.currentText(), self.raw_check.isChecked())
+
+
+class FileTransferDialog(QDialog):
+    """发送文件对话框：选择文件、发送方式和限速，可从上次中断处继续"""
+    MODE_NAMES = {'raw': '原始数据流', 'xmodem': 'XMODEM-1K (CRC)', 'ymodem': 'YMODEM (CRC)'}
+
+    def __init__(self, parent=None, resume=None):
+        super().__init__(parent)
+        self.setWindowTitle("发送文件")
+        self.resume = resume  # 上次中断的 (路径, 方式, 已确认字节数)
+
+        layout = QFormLayout()
+        path_layout = QHBoxLayout()
+        self.path_edit = QLineEdit(resume[0] if resume else '')
+        browse_btn = QPushButton('浏览...')
+        browse_btn.clicked.connect(self.browse)
+        path_layout.addWidget(self.path_edit)
+        path_layout.addWidget(browse_btn)
+        layout.addRow("文件:", path_layout)
+
+        self.mode_combo = QComboBox()
+        for mode in FileTransfer.MODES:
+            self.mode_combo.addItem(self.MODE_NAMES[mode], mode)
+        if resume:
+            self.mode_combo.setCurrentIndex(FileTransfer.MODES.index(resume[1]))
+        layout.addRow("发送方式:", self.mode_combo)
+
+        self.rate_spin = QSpinBox()
+        self.rate_spin.setRange(0, 1000000)
+        self.rate_spin.setSingleStep(1000)
+        self.rate_spin.setSuffix(' 字节/秒')
+        self.rate_spin.setSpecialValueText('线路速率')
+        layout.addRow("限速:", self.rate_spin)
+
+        self.window_spin = QSpinBox()
+        self.window_spin.setRange(1, 32)
+        self.window_spin.setValue(4)
+        self.window_spin.setToolTip('连续发送而不等待应答的块数，1 为标准停等协议')
+        layout.addRow("窗口大小:", self.window_spin)
+
+        self.command_edit = QLineEdit()
+        self.command_edit.setPlaceholderText('可选，例如 CMD:UPDATE')
+        self.command_edit.setToolTip('开始前发送的指令，分块方式随后等待接收方发出 C')
+        layout.addRow("启动指令:", self.command_edit)
+
+        self.resume_check = QCheckBox(f"从断点继续（已确认 {resume[2]} 字节）" if resume else "从断点继续")
+        self.resume_check.setEnabled(bool(resume))
+        self.resume_check.setChecked(bool(resume))
+        layout.addRow(self.resume_check)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addRow(button_box)
+        self.setLayout(layout)
+
+    def browse(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择要发送的文件", self.path_edit.text(),
+                                              "固件/配置文件 (*.bin *.hex *.json *.cfg);;所有文件 (*)")
+        if path:
+            self.path_edit.setText(path)
+
+    def get_options(self):
+        """返回 (路径, 方式, 限速(字节/秒, 0 为线路速率), 窗口大小, 启动指令, 续传起点)"""
+        path = self.path_edit.text().strip()
+        mode = self.mode_combo.currentData()
+        offset = 0
+        if self.resume_check.isChecked() and self.resume and self.resume[:2] == (path, mode):
+            offset = self.resume[2]
+        return path, mode, self.rate_spin.value(), self.window_spin.value(), self.command_edit.text().strip(), offset
+
+
+def analyze_log_shard(path, start, end, data_format, data_separator, kv_separator, index_offsets, index_times,
+                      frame_check=None):
+    """在子进程中解析日志文件的 [start, end) 分片（分片边界位于换行符之后）
+
+    返回 (HistoryChunk, {传感器名称: (数量, 均值, 离差平方和, 最小值, 最大值)}, 校验计数, 序号列表)。
+    有原始数据索引时每帧的时间取收到该帧最后一个字节的那次读取的时间，否则为分片内的帧序号。
+    frame_check 与实时接收使用同一份设置，校验失败的帧同样丢弃。依赖前序帧的序号跟踪和派生通道
+    不在分片内计算：序号按出现顺序返回，派生通道的列保持 NaN，由 LogAnalyzer 按文件顺序统一处理。
+    """
+    parser = SensorParser(data_format, data_separator, kv_separator, frame_check)
+    sequences = []
+    if parser.frame_check is not None:
+        parser.frame_check.sequence = sequences.append
+    chunk = HistoryChunk(tuple(data_format))
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    nan = float('nan')
+    times = chunk.times
+    columns = list(chunk.columns.items())
+    offset = start
+    for frame in data.split(b'\n'):
+        frame_end = offset + len(frame)
+        offset = frame_end + 1
+        if not frame.strip():
+            continue
+        values = parser.parse_frame(frame)
+        if not values:
+            continue
+        if index_offsets:
+            times.append(index_times[max(0, bisect.bisect_right(index_offsets, frame_end) - 1)])
+        else:
+            times.append(len(times))
+        for name, column in columns:
+            value = values.get(name, nan)
+            if isinstance(value, str):
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = nan
+            column.append(value)
+
+    moments = {}
+    for name, column in columns:
+        value = column_moments(column)
+        if value is not None:
+            moments[name] = value
+    link_counts = parser.frame_check.take_counts() if parser.frame_check is not None else {}
+    return chunk, moments, link_counts, sequences
+
+
+def column_moments(column):
+    """返回一列中非 NaN 值的 (数量, 均值, 离差平方和, 最小值, 最大值)，没有数据时返回 None"""
+    present = [value for value in column if value == value]
+    if not present:
+        return None
+    mean = math.fsum(present) / len(present)
+    m2 = math.fsum((value - mean) ** 2 for value in present)
+    return len(present), mean, m2, min(present), max(present)
+
+
+def merge_moments(a, b):
+    """合并两组 (数量, 均值, 离差平方和, 最小值, 最大值)（Chan 并行方差算法）"""
+    if a is None:
+        return b
+    count = a[0] + b[0]
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / count
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / count
+    return count, mean, m2, min(a[3], b[3]), max(a[4], b[4])
+
+
+class LogAnalyzer:
+    """离线日志分析：在换行处把日志文件切成分片，用多个进程并行解析，再按文件顺序合并为列式数据和统计
+
+    解析规则与实时接收相同（SensorParser，包括帧校验设置）。序号跟踪和派生通道依赖前序帧，在合并时按文件顺序
+    单线程计算，结果与进程数和分片方式无关。日志可以是导出的 _raw.bin，同目录下的 _raw_index.csv
+    （或 .bin 换成 _index.csv）存在时用它给每帧标上接收时间；其他日志的时间列为帧序号。
+    """
+    SHARD_MIN = 1 << 20    # 分片最小 1MB，太小时进程间传输的开销占比过大
+    SHARD_MAX = 32 << 20   # 分片最大 32MB，保证进度更新和取消足够及时
+
+    def __init__(self, path, data_format, data_separator=",", kv_separator=":", workers=None,
+                 progress=None, is_cancelled=None, frame_check=None):
+        self.path = path
+        self.data_format = {name: dict(info) for name, info in data_format.items()}
+        self.data_separator = data_separator
+        self.kv_separator = kv_separator
+        self.frame_check = dict(frame_check) if frame_check else None
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress or (lambda percent: None)
+        self.is_cancelled = is_cancelled or (lambda: False)
+
+        self.parts = []      # 按文件顺序排列的 (HistoryChunk, 0, 行数)，可直接交给 HistoryExporter
+        self.moments = {}    # 传感器名称 -> 合并后的 (数量, 均值, 离差平方和, 最小值, 最大值)
+        self.link_counts = dict.fromkeys(FrameCheck.COUNTERS, 0)
+        self.rows = 0
+        self.has_time = False
+
+    def index_path(self):
+        """返回原始数据索引文件路径，不存在时返回 None"""
+        base = os.path.splitext(self.path)[0]
+        for candidate in (base + '_index.csv', base + '_raw_index.csv'):
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def load_index(self):
+        """读取 时间,偏移,长度 索引，返回 (偏移数组, 时间数组)"""
+        offsets = array('q')
+        times = array('d')
+        path = self.index_path()
+        if path is None:
+            return offsets, times
+        with open(path, 'r', encoding='utf-8') as f:
+            next(f, None)
+            for line in f:
+                parts = line.split(',')
+                if len(parts) >= 2:
+                    times.append(float(parts[0]))
+                    offsets.append(int(parts[1]))
+        return offsets, times
+
+    def shard_bounds(self, size):
+        """按目标大小切分文件，每个边界向后移动到下一个换行符之后"""
+        target = min(self.SHARD_MAX, max(self.SHARD_MIN, size // (self.workers * 4) + 1))
+        bounds = [0]
+        with open(self.path, 'rb') as f:
+            position = target
+            while position < size:
+                f.seek(position)
+                while True:
+                    block = f.read(64 * 1024)
+                    if not block:
+                        position = size
+                        break
+                    newline = block.find(b'\n')
+                    if newline >= 0:
+                        position += newline + 1
+                        break
+                    position += len(block)
+                if position >= size:
+                    break
+                bounds.append(position)
+                position += target
+        bounds.append(size)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def run(self):
+        """执行分析，取消时抛出 ExportCancelled"""
+        size = os.path.getsize(self.path)
+        shards = self.shard_bounds(size)
+        index_offsets, index_times = self.load_index()
+        self.has_time = bool(index_offsets)
+
+        results = [None] * len(shards)
+        done = 0
+        # 使用 spawn 启动子进程，避免在多线程的 GUI 进程中 fork
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(self.workers, len(shards)),
+                                                    mp_context=context) as executor:
+            futures = {}
+            for i, (start, end) in enumerate(shards):
+                # 只传递与分片有关的索引行
+                first = max(0, bisect.bisect_right(index_offsets, start) - 1)
+                last = bisect.bisect_right(index_offsets, end)
+                future = executor.submit(analyze_log_shard, self.path, start, end, self.data_format,
+                                         self.data_separator, self.kv_separator,
+                                         index_offsets[first:last], index_times[first:last], self.frame_check)
+                futures[future] = i
+            for future in concurrent.futures.as_completed(futures):
+                if self.is_cancelled():
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise ExportCancelled()
+                i = futures[future]
+                results[i] = future.result()
+                start, end = shards[i]
+                done += end - start
+                self.progress(min(99, done * 100 // max(1, size)))
+
+        self.parts = []
+        self.moments = {}
+        self.link_counts = dict.fromkeys(FrameCheck.COUNTERS, 0)
+        self.rows = 0
+        frame_check = FrameCheck.from_settings(self.frame_check, self.data_separator, self.kv_separator)
+        derived = DerivedChannels(self.data_format)
+        for chunk, moments, link_counts, sequences in results:
+            for name, value in link_counts.items():
+                self.link_counts[name] += value
+            for value in sequences:
+                frame_check.sequence(value)
+            count = len(chunk.times)
+            if not count:
+                continue
+            if derived.channels:
+                moments = dict(moments)
+                moments.update(self.apply_derived(derived, chunk))
+            if not self.has_time:
+                # 分片内的帧序号换算为全局帧序号
+                rows = self.rows
+                chunk.times = array('d', [t + rows for t in chunk.times])
+            self.parts.append((chunk, 0, count))
+            self.rows += count
+            for name, value in moments.items():
+                self.moments[name] = merge_moments(self.moments.get(name), value)
+        if frame_check is not None:
+            for name, value in frame_check.take_counts().items():
+                self.link_counts[name] += value
+        self.progress(100)
+
+    @staticmethod
+    def apply_derived(derived, chunk):
+        """按行计算分片中的派生通道并写入对应的列，返回派生通道的统计"""
+        inputs = [(name, chunk.columns[name]) for name in chunk.fields if name in derived.inputs]
+        outputs = [(channel.name, chunk.columns[channel.name]) for channel in derived.channels]
+        for row in range(len(chunk.times)):
+            values = {name: column[row] for name, column in inputs if column[row] == column[row]}
+            derived.apply(values)
+            for name, column in outputs:
+                if name in values:
+                    column[row] = values[name]
+        moments = {}
+        for name, column in outputs:
+            value = column_moments(column)
+            if value is not None:
+                moments[name] = value
+        return moments
+
+    def statistics(self):
+        """返回 {传感器名称: StatsSnapshot}，采样率按时间列计算（没有时间时为 0）"""
+        span = 0.0
+        if self.has_time and self.parts:
+            span = self.parts[-1][0].times[-1] - self.parts[0][0].times[0]
+        result = {}
+        for name, (count, mean, m2, low, high) in self.moments.items():
+            stddev = (m2 / (count - 1)) ** 0.5 if count > 1 else 0.0
+            rate = count / span if span > 0 else 0.0
+            result[name] = StatsSnapshot(count, low, high, mean, stddev, rate)
+        return result
+
+    def summary(self):
+        """返回统计结果的文本，每个通道一行"""
+        lines = [f"共解析 {self.rows} 帧"]
+        counts = self.link_counts
+        if counts['checked_frames']:
+            lines.append(f"校验错误 {counts['checksum_errors']} / {counts['checked_frames']} 帧")
+        if counts['sequenced_frames']:
+            lines.append(f"丢帧 {counts['lost_frames']}  乱序 {counts['out_of_order']}  "
+                         f"重复 {counts['duplicate_frames']}  序号重置 {counts['sequence_resets']}")
+        for name, stats in self.statistics().items():
+            lines.append(f"{name}: 数量 {stats.count}  最小 {stats.min:.3f}  最大 {stats.max:.3f}  "
+                         f"均值 {stats.mean:.3f}  σ {stats.stddev:.3f}  {stats.rate:.2f}Hz")
+        return lines
+
+    def export(self, path, fmt):
+        """把合并后的列式数据写出为 HistoryExporter 支持的格式"""
+        return HistoryExporter(self.parts, [], path, fmt, is_cancelled=self.is_cancelled).run()
+
+
+class LogAnalysisThread(QThread):
+    """后台执行离线日志分析并导出结果"""
+    progress = pyqtSignal(int)
+    completed = pyqtSignal(list, list)  # 写出的文件, 统计文本
+    failed = pyqtSignal(str)
+
+    def __init__(self, log_path, output_path, fmt, data_format, data_separator, kv_separator, frame_check=None):
+        super().__init__()
+        self.analyzer = LogAnalyzer(log_path, data_format, data_separator, kv_separator,
+                                    progress=self.progress.emit, is_cancelled=self.isInterruptionRequested,
+                                    frame_check=frame_check)
+        self.output_path = output_path
+        self.fmt = fmt
+
+    def run(self):
+        try:
+            self.analyzer.run()
+            written = self.analyzer.export(self.output_path, self.fmt) if self.output_path else []
+            self.completed.emit(written, self.analyzer.summary())
+        except ExportCancelled:
+            self.failed.emit('分析已取消')
+        except Exception as e:
+            self.failed.emit(str(e))
 
 
 class SettingsDialog(QDialog):
     """设置对话框"""
-    def __init__(self, parent=None, cmd_buttons=None, data_format=None):
+    def __init__(self, parent=None, cmd_buttons=None, data_format=None, rules=None):
         super().__init__(parent)
         self.parent = parent
         self.cmd_buttons = cmd_buttons.copy() if cmd_buttons else {}
         self.data_format = data_format.copy() if data_format else {}
+        self.rules = list(rules) if rules else []
         
         self.setWindowTitle("设置")
         self.resize(600, 400)
@@ -121,13 +3424,19 @@ class SettingsDialog(QDialog):
         self.tabs = QTabWidget()
         self.cmd_tab = QWidget()
         self.format_tab = QWidget()
+        self.rules_tab = QWidget()
+        self.rate_tab = QWidget()
         
         self.tabs.addTab(self.cmd_tab, "快捷指令")
         self.tabs.addTab(self.format_tab, "数据解析")
+        self.tabs.addTab(self.rules_tab, "自动规则")
+        self.tabs.addTab(self.rate_tab, "自适应速率")
         
         # 初始化标签页内容
         self.init_cmd_tab()
         self.init_format_tab()
+        self.init_rules_tab()
+        self.init_rate_tab()
         
         # 布局
         layout = QVBoxLayout()
@@ -180,10 +3489,12 @@ class SettingsDialog(QDialog):
         # 说明标签
         layout.addWidget(QLabel("设置数据解析格式，定义如何从接收数据中提取传感器值"))
         layout.addWidget(QLabel("示例: T:25.5,H:60.2,L:1200 - 使用 'T', 'H', 'L' 作为键名"))
+        layout.addWidget(QLabel("填写表达式的行是派生通道（不需要键名），例如 SOL * CUR、"
+                                "interp(BAT, 3.0, 0, 3.7, 50, 4.2, 100)、avg(SPD, 20)"))
         
         # 解析格式表格
-        self.format_table = QTableWidget(0, 3)
-        self.format_table.setHorizontalHeaderLabels(["传感器名称", "键名", "单位"])
+        self.format_table = QTableWidget(0, 6)
+        self.format_table.setHorizontalHeaderLabels(["传感器名称", "键名", "单位", "最小值", "最大值", "表达式"])
         self.format_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         
         # 添加现有的格式
@@ -193,6 +3504,9 @@ class SettingsDialog(QDialog):
             self.format_table.setItem(row, 0, QTableWidgetItem(name))
             self.format_table.setItem(row, 1, QTableWidgetItem(info.get('key', '')))
             self.format_table.setItem(row, 2, QTableWidgetItem(info.get('unit', '')))
+            self.format_table.setItem(row, 3, QTableWidgetItem(f"{info['min']:g}" if 'min' in info else ''))
+            self.format_table.setItem(row, 4, QTableWidgetItem(f"{info['max']:g}" if 'max' in info else ''))
+            self.format_table.setItem(row, 5, QTableWidgetItem(info.get('expr', '')))
         
         layout.addWidget(self.format_table)
         
@@ -207,8 +3521,58 @@ class SettingsDialog(QDialog):
         self.kv_separator_edit = QLineEdit()
         self.kv_separator_edit.setText(self.parent.kv_separator if hasattr(self.parent, 'kv_separator') else ":")
         separator_layout.addWidget(self.kv_separator_edit)
+
+        separator_layout.addWidget(QLabel("无换行帧超时(秒):"))
+        self.frame_timeout_spin = QDoubleSpinBox()
+        self.frame_timeout_spin.setRange(0.0, 10.0)
+        self.frame_timeout_spin.setSingleStep(0.1)
+        self.frame_timeout_spin.setSpecialValueText('只按换行')
+        self.frame_timeout_spin.setToolTip('超过此时间没有新数据时，把不以换行结尾的数据作为一帧（不触发自动规则），应为帧间隔的数倍')
+        self.frame_timeout_spin.setValue(float(getattr(self.parent, 'frame_timeout', 0.5)))
+        separator_layout.addWidget(self.frame_timeout_spin)
+
+        separator_layout.addWidget(QLabel("统计窗口(秒):"))
+        self.stats_window_spin = QSpinBox()
+        self.stats_window_spin.setRange(1, 3600)
+        self.stats_window_spin.setValue(int(getattr(self.parent, 'stats_window', 10)))
+        separator_layout.addWidget(self.stats_window_spin)
+
+        separator_layout.addWidget(QLabel("历史保留(小时):"))
+        self.history_hours_spin = QSpinBox()
+        self.history_hours_spin.setRange(1, 168)
+        self.history_hours_spin.setValue(int(getattr(self.parent, 'history_hours', 1)))
+        separator_layout.addWidget(self.history_hours_spin)
         layout.addLayout(separator_layout)
         
+        # 帧校验：校验和字段放在帧末尾，序号字段用于统计丢帧和乱序
+        frame_check = getattr(self.parent, 'frame_check', None) or {}
+        check_layout = QHBoxLayout()
+        check_layout.addWidget(QLabel("校验和:"))
+        self.checksum_combo = QComboBox()
+        self.checksum_combo.addItem('无', '')
+        for name in FrameCheck.ALGORITHMS:
+            self.checksum_combo.addItem(name, name)
+        self.checksum_combo.setCurrentIndex(max(0, self.checksum_combo.findData(frame_check.get('checksum', ''))))
+        check_layout.addWidget(self.checksum_combo)
+        
+        check_layout.addWidget(QLabel("校验和键名:"))
+        self.checksum_key_edit = QLineEdit(frame_check.get('checksum_key', 'CK'))
+        self.checksum_key_edit.setToolTip('帧末尾的校验和字段，十六进制，例如 T:25.1,H:60,CK:5A')
+        check_layout.addWidget(self.checksum_key_edit)
+        
+        check_layout.addWidget(QLabel("序号键名:"))
+        self.sequence_key_edit = QLineEdit(frame_check.get('sequence_key', ''))
+        self.sequence_key_edit.setPlaceholderText('不检查')
+        check_layout.addWidget(self.sequence_key_edit)
+        
+        check_layout.addWidget(QLabel("序号模数:"))
+        self.sequence_modulus_spin = QSpinBox()
+        self.sequence_modulus_spin.setRange(2, 2 ** 31 - 1)
+        self.sequence_modulus_spin.setValue(int(frame_check.get('sequence_modulus', 256)))
+        self.sequence_modulus_spin.setToolTip('序号回绕的范围，例如 uint8 计数器为 256')
+        check_layout.addWidget(self.sequence_modulus_spin)
+        layout.addLayout(check_layout)
+        
         # 控制按钮
         btn_layout = QHBoxLayout()
         add_btn = QPushButton("添加")
@@ -223,6 +3587,84 @@ class SettingsDialog(QDialog):
         layout.addLayout(btn_layout)
         self.format_tab.setLayout(layout)
     
+    def init_rules_tab(self):
+        """初始化自动规则标签页"""
+        layout = QVBoxLayout()
+        
+        # 说明标签
+        layout.addWidget(QLabel("传感器数值满足条件时自动发送指令或报警，规则在接收线程中逐帧判断"))
+        layout.addWidget(QLabel("格式: 名称 比较符 阈值 [hyst 迟滞量] [for 时长] -> send 指令 / alarm [提示]"))
+        layout.addWidget(QLabel("示例: 土壤湿度 < 20 for 10s -> send CMD:AUTO    电池电量 < 3.3 hyst 0.1 -> alarm"))
+        
+        # 规则表格
+        self.rules_table = QTableWidget(0, 1)
+        self.rules_table.setHorizontalHeaderLabels(["规则"])
+        self.rules_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        
+        # 添加现有的规则
+        for rule in self.rules:
+            row = self.rules_table.rowCount()
+            self.rules_table.insertRow(row)
+            self.rules_table.setItem(row, 0, QTableWidgetItem(rule))
+        
+        layout.addWidget(self.rules_table)
+        
+        # 控制按钮
+        btn_layout = QHBoxLayout()
+        add_btn = QPushButton("添加")
+        add_btn.clicked.connect(self.add_rule_row)
+        del_btn = QPushButton("删除")
+        del_btn.clicked.connect(self.del_rule_row)
+        
+        btn_layout.addWidget(add_btn)
+        btn_layout.addWidget(del_btn)
+        btn_layout.addStretch()
+        
+        layout.addLayout(btn_layout)
+        self.rules_tab.setLayout(layout)
+    
+    def init_rate_tab(self):
+        """初始化自适应速率标签页"""
+        settings = dict(RateController.DEFAULTS, **(getattr(self.parent, 'rate_control', None) or {}))
+        layout = QFormLayout()
+        layout.addRow(QLabel("界面处理不过来时只显示最新数值，并通过快捷指令让小车降低发送速率，恢复后再升速"))
+        
+        self.rate_enabled_check = QCheckBox("启用")
+        self.rate_enabled_check.setChecked(settings['enabled'])
+        layout.addRow(self.rate_enabled_check)
+        
+        self.rate_down_combo = QComboBox()
+        self.rate_up_combo = QComboBox()
+        for combo, key in ((self.rate_down_combo, 'down_button'), (self.rate_up_combo, 'up_button')):
+            combo.addItem('（不发送）', '')
+            for name in self.cmd_buttons:
+                combo.addItem(name, name)
+            combo.setCurrentIndex(max(0, combo.findData(settings[key])))
+        layout.addRow("降速指令:", self.rate_down_combo)
+        layout.addRow("升速指令:", self.rate_up_combo)
+        
+        self.rate_spins = {}
+        for key, label, low, high, suffix in (('backlog_high', '积压上限:', 1, SerialThread.MAX_BACKLOG, ' 批'),
+                                              ('backlog_low', '积压下限:', 0, SerialThread.MAX_BACKLOG, ' 批'),
+                                              ('frame_high_ms', '帧时间上限:', 1, 10000, ' 毫秒'),
+                                              ('frame_low_ms', '帧时间下限:', 0, 10000, ' 毫秒'),
+                                              ('max_level', '最多降速次数:', 1, 20, '')):
+            spin = QSpinBox()
+            spin.setRange(low, high)
+            spin.setSuffix(suffix)
+            spin.setValue(int(settings[key]))
+            layout.addRow(label, spin)
+            self.rate_spins[key] = spin
+        for key, label in (('hold', '持续时间:'), ('cooldown', '指令间隔:')):
+            spin = QDoubleSpinBox()
+            spin.setRange(0.1, 60.0)
+            spin.setSingleStep(0.5)
+            spin.setSuffix(' 秒')
+            spin.setValue(float(settings[key]))
+            layout.addRow(label, spin)
+            self.rate_spins[key] = spin
+        self.rate_tab.setLayout(layout)
+    
     def add_cmd_row(self):
         """添加快捷指令行"""
         row = self.cmd_table.rowCount()
@@ -243,6 +3685,9 @@ class SettingsDialog(QDialog):
         self.format_table.setItem(row, 0, QTableWidgetItem(f"传感器{row+1}"))
         self.format_table.setItem(row, 1, QTableWidgetItem(f"KEY{row+1}"))
         self.format_table.setItem(row, 2, QTableWidgetItem(""))
+        self.format_table.setItem(row, 3, QTableWidgetItem("0"))
+        self.format_table.setItem(row, 4, QTableWidgetItem("100"))
+        self.format_table.setItem(row, 5, QTableWidgetItem(""))
     
     def del_format_row(self):
         """删除数据格式行"""
@@ -250,6 +3695,18 @@ class SettingsDialog(QDialog):
         if current_row >= 0:
             self.format_table.removeRow(current_row)
     
+    def add_rule_row(self):
+        """添加自动规则行"""
+        row = self.rules_table.rowCount()
+        self.rules_table.insertRow(row)
+        self.rules_table.setItem(row, 0, QTableWidgetItem("土壤湿度 < 20 for 10s -> send CMD:AUTO"))
+    
+    def del_rule_row(self):
+        """删除自动规则行"""
+        current_row = self.rules_table.currentRow()
+        if current_row >= 0:
+            self.rules_table.removeRow(current_row)
+    
     def get_cmd_buttons(self):
         """获取快捷指令按钮设置"""
         cmd_buttons = {}
@@ -267,60 +3724,351 @@ class SettingsDialog(QDialog):
             name = self.format_table.item(row, 0).text().strip()
             key = self.format_table.item(row, 1).text().strip()
             unit = self.format_table.item(row, 2).text().strip()
-            if name and key:
-                data_format[name] = {'key': key, 'unit': unit}
+            expr_item = self.format_table.item(row, 5)
+            expr = expr_item.text().strip() if expr_item else ''
+            if name and (key or expr):
+                # 有表达式的是派生通道，不从接收数据中按键名解析
+                info = {'expr': expr, 'unit': unit} if expr else {'key': key, 'unit': unit}
+                # 量程留空或无法解析时使用仪表盘默认量程
+                for column, bound in ((3, 'min'), (4, 'max')):
+                    item = self.format_table.item(row, column)
+                    try:
+                        info[bound] = float(item.text()) if item else None
+                    except ValueError:
+                        info[bound] = None
+                    if info[bound] is None:
+                        del info[bound]
+                data_format[name] = info
         return data_format
     
+    def get_rules(self):
+        """获取自动规则设置"""
+        rules = []
+        for row in range(self.rules_table.rowCount()):
+            item = self.rules_table.item(row, 0)
+            text = item.text().strip() if item else ''
+            if text:
+                rules.append(text)
+        return rules
+    
     def get_separators(self):
         """获取分隔符设置"""
         return self.separator_edit.text(), self.kv_separator_edit.text()
+    
+    def get_frame_check(self):
+        """获取帧校验设置"""
+        return {
+            'checksum': self.checksum_combo.currentData(),
+            'checksum_key': self.checksum_key_edit.text().strip() or 'CK',
+            'sequence_key': self.sequence_key_edit.text().strip(),
+            'sequence_modulus': self.sequence_modulus_spin.value(),
+        }
+    
+    def get_rate_control(self):
+        """获取自适应速率设置"""
+        settings = {key: spin.value() for key, spin in self.rate_spins.items()}
+        settings.update(enabled=self.rate_enabled_check.isChecked(),
+                        down_button=self.rate_down_combo.currentData(),
+                        up_button=self.rate_up_combo.currentData())
+        return settings
+    
+    def get_frame_timeout(self):
+        """获取无换行帧的超时（秒），0 表示只按换行分帧"""
+        return self.frame_timeout_spin.value()
+    
+    def get_stats_window(self):
+        """获取滚动统计窗口长度（秒）"""
+        return self.stats_window_spin.value()
+    
+    def get_history_hours(self):
+        """获取采样历史保留时长（小时）"""
+        return self.history_hours_spin.value()
+
+
+class ConsoleCompactor:
+    """接收区紧凑显示：把连续相同或键相同的帧合并为一行，附重复次数和最后收到的时间
+
+    含两个以上键值对的帧按键的集合分组，其余的行只和完全相同的行合并。每个统计周期结束时
+    检查帧率，超过 summary_rate 后改为每周期输出一行摘要，降到阈值的 80% 以下再恢复逐行合并。
+    feed()/tick() 返回要显示的 (是否替换最后一行, 文本) 列表，同一分组在一次调用中只输出最终状态。
+    """
+    MAX_LINE = 4096  # 超过此长度仍没有换行时按一行处理
+    HYSTERESIS = 0.8
+
+    def __init__(self, data_separator=",", kv_separator=":", summary_rate=50, interval=1.0):
+        self.data_separator = data_separator
+        self.kv_separator = kv_separator
+        self.summary_rate = summary_rate  # 帧/秒，0 表示不切换到摘要
+        self.interval = interval
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.partial = ''
+        self.signature = None  # 当前分组的签名，None 表示下一帧开始新的一行
+        self.count = 0
+        self.last_line = ''
+        self.last_time = 0.0
+        self.summarizing = False
+        self.interval_start = None
+        self.interval_frames = 0
+        self.interval_signatures = set()
+
+    def reset(self):
+        """丢弃残留数据并结束当前分组（清空接收区或切换显示方式时调用）"""
+        self.decoder.reset()
+        self.partial = ''
+        self.signature = None
+        self.summarizing = False
+        self.interval_start = None
+        self.interval_frames = 0
+        self.interval_signatures.clear()
+
+    def line_signature(self, line):
+        kv = self.kv_separator
+        keys = tuple(item.split(kv, 1)[0].strip() for item in line.split(self.data_separator) if kv in item)
+        return keys if len(keys) > 1 else line
+
+    @staticmethod
+    def format_time(timestamp):
+        return time.strftime('%H:%M:%S', time.localtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}"
+
+    def format_group(self):
+        if self.count == 1:
+            return f"接收: {self.last_line}"
+        return f"接收: {self.last_line}    ×{self.count}  最后 {self.format_time(self.last_time)}"
+
+    def feed(self, data, now):
+        """处理一次读到的数据，now 为接收时刻(time.time())"""
+        text = self.partial + self.decoder.decode(bytes(data))
+        *lines, self.partial = text.split('\n')
+        if len(self.partial) > self.MAX_LINE:
+            lines.append(self.partial)
+            self.partial = ''
+        output = []
+        for line in lines:
+            line = line.rstrip('\r')
+            if not line:
+                continue
+            signature = self.line_signature(line)
+            self.interval_frames += 1
+            self.interval_signatures.add(signature)
+            self.last_line = line
+            self.last_time = now
+            if self.summarizing:
+                continue
+            if signature == self.signature:
+                self.count += 1
+                if output:
+                    output[-1] = (output[-1][0], self.format_group())
+                    continue
+                output.append((True, self.format_group()))
+            else:
+                self.signature = signature
+                self.count = 1
+                output.append((False, self.format_group()))
+        output.extend(self.tick(now))
+        return output
+
+    def tick(self, now):
+        """统计周期结束时检查帧率，摘要模式下输出本周期的摘要行"""
+        if self.interval_start is None:
+            self.interval_start = now
+            return []
+        elapsed = now - self.interval_start
+        if elapsed < self.interval:
+            return []
+        frames = self.interval_frames
+        rate = frames / elapsed
+        output = []
+        if not self.summarizing and self.summary_rate and rate > self.summary_rate:
+            self.summarizing = True
+        if self.summarizing and frames:
+            output.append((False, f"[{self.format_time(now)}] {elapsed:.1f} 秒内收到 {frames} 帧 ({rate:.0f} 帧/秒, "
+                                  f"{len(self.interval_signatures)} 种格式)  最新: {self.last_line}"))
+        if self.summarizing and (not self.summary_rate or rate < self.summary_rate * self.HYSTERESIS):
+            self.summarizing = False
+        self.signature = None if output else self.signature
+        self.interval_start = now
+        self.interval_frames = 0
+        self.interval_signatures.clear()
+        return output
+
+
+class RateController:
+    """根据接收积压和界面帧时间自动降低/恢复小车的发送速率（带迟滞）
+
+    积压（接收线程已发出、界面尚未处理的采样批次和接收区显示）或帧时间（界面事件循环的延迟）超过上限时
+    立即进入过载，接收线程改为只发送最新值；持续 hold 秒后发送降速指令，仍过载时每隔 cooldown 秒
+    再降一级，最多 max_level 级。两者都低于下限并持续 hold 秒后退出过载，之后每隔 cooldown 秒
+    发送一次升速指令，直到抵消全部降速。
+    """
+    DEFAULTS = {
+        'enabled': False,
+        'down_button': '',      # 降速指令对应的快捷指令名称
+        'up_button': '',        # 升速指令对应的快捷指令名称
+        'backlog_high': 20,     # 批
+        'backlog_low': 2,
+        'frame_high_ms': 200,
+        'frame_low_ms': 50,
+        'hold': 1.0,            # 秒
+        'cooldown': 3.0,        # 秒
+        'max_level': 3,
+    }
+
+    def __init__(self, settings=None):
+        # 只取已知的设置项，配置文件中多余的键不会成为属性
+        settings = settings or {}
+        self.settings = {name: settings.get(name, default) for name, default in self.DEFAULTS.items()}
+        for name, value in self.settings.items():
+            setattr(self, name, value)
+        self.level = 0  # 已发送的降速次数减去升速次数
+        self.overloaded = False
+        self.high_since = None
+        self.low_since = None
+        self.last_command = -math.inf
+
+    def update(self, backlog, frame_ms, now):
+        """每个检查周期调用一次，返回需要发送的 'down'、'up' 或 None"""
+        if backlog >= self.backlog_high or frame_ms >= self.frame_high_ms:
+            self.low_since = None
+            if self.high_since is None:
+                self.high_since = now
+            self.overloaded = True
+            if (now - self.high_since >= self.hold and now - self.last_command >= self.cooldown
+                    and self.level < self.max_level):
+                self.level += 1
+                self.last_command = now
+                return 'down'
+        elif backlog <= self.backlog_low and frame_ms <= self.frame_low_ms:
+            self.high_since = None
+            if self.low_since is None:
+                self.low_since = now
+            if now - self.low_since >= self.hold:
+                self.overloaded = False
+                if self.level > 0 and now - self.last_command >= self.cooldown:
+                    self.level -= 1
+                    self.last_command = now
+                    return 'up'
+        else:
+            # 处于上下限之间：保持当前状态，重新计时
+            self.high_since = self.low_since = None
+        return None
 
 
 class SerialAssistant(QMainWindow):
     """串口助手主窗口"""
+    RATE_CHECK_INTERVAL = 100  # 毫秒
     
-    def __init__(self):
+    def __init__(self, settings_store=None):
         super().__init__()
         self.serial_port = None
         self.serial_thread = None
         
         # 默认配置
-        self.cmd_buttons = {
-            '前进': 'CMD:FWD',
-            '后退': 'CMD:BWD',
-            '左转': 'CMD:LEFT',
-            '右转': 'CMD:RIGHT',
-            '停止': 'CMD:STOP',
-            '自动模式': 'CMD:AUTO',
-            '手动模式': 'CMD:MANUAL',
-        }
-        
-        self.data_format = {
-            '温度': {'key': 'T', 'unit': '℃', 'min': 0, 'max': 50},
-            '湿度': {'key': 'H', 'unit': '%', 'min': 0, 'max': 100},
-            '光照': {'key': 'L', 'unit': 'lux', 'min': 0, 'max': 2000},
-            '土壤湿度': {'key': 'SM', 'unit': '%', 'min': 0, 'max': 100},
-            '电池电量': {'key': 'BAT', 'unit': 'V', 'min': 3.0, 'max': 4.2},
-            '太阳能电压': {'key': 'SOL', 'unit': 'V', 'min': 0, 'max': 6},
-            '行进速度': {'key': 'SPD', 'unit': 'cm/s', 'min': 0, 'max': 50},
-            '当前状态': {'key': 'ST', 'unit': ''}, # '当前状态' 作为特殊文本处理
-        }
+        self.cmd_buttons = dict(DEFAULT_CMD_BUTTONS)
+        self.data_format = {name: dict(info) for name, info in DEFAULT_DATA_FORMAT.items()}
         
         self.data_separator = ","  # 数据项分隔符
         self.kv_separator = ":"    # 键值分隔符
+        self.frame_timeout = 0.5   # 不以换行结尾的数据等待多久后作为一帧（秒），0 表示只按换行分帧
+        
+        # 自动规则，例如 '土壤湿度 < 20 for 10s -> send CMD:AUTO'
+        self.rules = []
+        
+        # 帧校验（校验和、序号），为空时不检查；链路质量按本次连接以来和最近一个统计窗口显示
+        self.frame_check = {}
+        self.link_baseline = None
+        self.link_history = deque()
         
-        # 加载设置
+        # 自适应速率：按接收积压和界面帧时间切换只显示最新值，并发送降速/升速指令
+        self.rate_control = {}
+        self.rate_controller = RateController()
+        self.last_heartbeat = time.monotonic()
+        
+        # 滚动统计窗口长度（秒）
+        self.stats_window = 10
+        
+        # 采样历史保留时长（小时），用于导出
+        self.history_hours = 1
+        self.export_thread = None
+        self.analysis_thread = None
+        
+        # 后台发送文件，中断后记录 (路径, 方式, 已确认字节数) 以便续传
+        self.transfer_thread = None
+        self.transfer_progress = None
+        self.transfer_resume = None
+        
+        # 本地遥测转发服务（仅监听本机）
+        self.server_enabled = False
+        self.server_tcp_port = 9750
+        self.server_ws_port = 9751
+        self.server_commands = False  # 是否允许转发客户端向串口发送指令
+        self.telemetry_server = None
+        
+        # 本机 Prometheus 指标接口
+        self.metrics_enabled = False
+        self.metrics_port = 9752
+        self.metrics_server = None
+        
+        # 接收区紧凑显示：合并重复帧，帧率高于阈值时只显示每秒摘要
+        self.console_compact = False
+        self.console_summary_rate = 50
+        self.console = ConsoleCompactor()
+        self.console_block_count = 0  # 上次输出后接收区的行数，用于判断最后一行是否仍是当前分组
+        
+        # 通道较多时用单个控件绘制全部仪表盘
+        self.gauge_grid = False
+        self.gauge_grid_widget = None
+        
+        # 传感器名称 -> 放入布局的控件；快捷指令名称 -> 按钮（重新配置时复用）
+        self.sensor_cells = {}
+        self.cmd_button_widgets = {}
+        
+        # 内置设备模拟器（伪终端，仅 Linux/macOS）
+        self.simulator = None
+        
+        # 串口参数（端口、波特率等），随设备配置保存
+        self.port_settings = {}
+        
+        # 接收线程中使用的解析/规则流水线
+        self.pipeline = TelemetryPipeline()
+        
+        # 加载设置（保存在用户配置目录，支持多个设备配置）
+        self.settings_store = settings_store or SettingsStore()
+        self.save_requested = False  # 手动保存后等待后台写入完成再提示结果
         self.load_settings()
         
         # 初始化UI
         self.init_ui()
         self.refresh_ports()
+        self.apply_port_settings()
+        self.update_pipeline()
+        self.settings_store.saved.connect(self.handle_settings_saved)
+        self.settings_store.save_failed.connect(self.handle_settings_save_failed)
+        if self.server_enabled:
+            self.start_telemetry_server()
+        if self.metrics_enabled:
+            self.start_metrics_server()
         
         # 定时刷新串口列表
         self.port_timer = QTimer(self)
         self.port_timer.timeout.connect(self.refresh_ports)
         self.port_timer.start(5000)  # 每5秒刷新一次串口列表
         
+        # 定时刷新仪表盘下方的滚动统计
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_sensor_stats)
+        self.stats_timer.timeout.connect(self.refresh_link_quality)
+        self.stats_timer.start(500)
+        
+        # 定时检查接收积压和事件循环延迟（帧时间）
+        self.rate_timer = QTimer(self)
+        self.rate_timer.timeout.connect(self.check_backlog)
+        self.rate_timer.start(self.RATE_CHECK_INTERVAL)
+        
+        # 紧凑显示在没有新数据时也按周期输出摘要
+        self.console_timer = QTimer(self)
+        self.console_timer.timeout.connect(self.flush_console)
+        self.console_timer.start(1000)
+        
     def init_ui(self):
         """初始化UI界面"""
         self.setWindowTitle('太阳能植物监护小车串口助手')
@@ -329,6 +4077,10 @@ class SerialAssistant(QMainWindow):
         # 创建菜单栏
         self.create_menu_bar()
         
+        # 状态栏显示启用帧校验时的链路质量
+        self.link_label = QLabel()
+        self.statusBar().addPermanentWidget(self.link_label)
+        
         # 主部件和布局
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -339,6 +4091,14 @@ class SerialAssistant(QMainWindow):
         port_control_layout = QHBoxLayout()
         port_control_group.setLayout(port_control_layout)
         
+        # 设备配置选择
+        port_control_layout.addWidget(QLabel('配置:'))
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(self.settings_store.profile_names())
+        self.profile_combo.setCurrentText(self.settings_store.active_profile)
+        self.profile_combo.currentTextChanged.connect(self.switch_profile)
+        port_control_layout.addWidget(self.profile_combo)
+        
         # 串口选择
         port_control_layout.addWidget(QLabel('串口:'))
         self.port_combo = QComboBox()
@@ -379,6 +4139,10 @@ class SerialAssistant(QMainWindow):
         self.refresh_btn.clicked.connect(self.refresh_ports)
         port_control_layout.addWidget(self.refresh_btn)
         
+        # 串口参数修改后自动保存（串口列表会定时刷新，只在连接时保存所选串口）
+        for combo in (self.baud_combo, self.data_bits_combo, self.stop_bits_combo, self.parity_combo):
+            combo.currentTextChanged.connect(lambda text: self.store_settings())
+        
         main_layout.addWidget(port_control_group)
         
         # 中间部分为左右分栏
@@ -407,6 +4171,23 @@ class SerialAssistant(QMainWindow):
         self.auto_scroll.setChecked(True)
         receive_control_layout.addWidget(self.auto_scroll)
         
+        self.compact_display = QCheckBox('紧凑显示')
+        self.compact_display.setToolTip('连续相同或字段相同的帧合并为一行，显示重复次数和最后接收时间')
+        self.compact_display.setChecked(self.console_compact)
+        self.compact_display.toggled.connect(self.toggle_compact_display)
+        receive_control_layout.addWidget(self.compact_display)
+        
+        self.summary_rate_spin = QSpinBox()
+        self.summary_rate_spin.setRange(0, 100000)
+        self.summary_rate_spin.setSingleStep(10)
+        self.summary_rate_spin.setPrefix('超过 ')
+        self.summary_rate_spin.setSuffix(' 帧/秒显示摘要')
+        self.summary_rate_spin.setSpecialValueText('不显示摘要')
+        self.summary_rate_spin.setValue(self.console_summary_rate)
+        self.summary_rate_spin.setEnabled(self.console_compact)
+        self.summary_rate_spin.valueChanged.connect(self.set_console_summary_rate)
+        receive_control_layout.addWidget(self.summary_rate_spin)
+        
         self.clear_receive_btn = QPushButton('清空接收')
         self.clear_receive_btn.clicked.connect(self.clear_receive)
         receive_control_layout.addWidget(self.clear_receive_btn)
@@ -504,6 +4285,28 @@ class SerialAssistant(QMainWindow):
         load_settings_action.triggered.connect(self.load_settings_from_file)
         file_menu.addAction(load_settings_action)
         
+        export_action = QAction('导出历史数据', self)
+        export_action.triggered.connect(self.export_history)
+        file_menu.addAction(export_action)
+        
+        analyze_action = QAction('分析日志文件', self)
+        analyze_action.triggered.connect(self.analyze_log)
+        file_menu.addAction(analyze_action)
+        
+        send_file_action = QAction('发送文件...', self)
+        send_file_action.triggered.connect(self.send_file)
+        file_menu.addAction(send_file_action)
+        
+        file_menu.addSeparator()
+        
+        new_profile_action = QAction('新建设备配置', self)
+        new_profile_action.triggered.connect(self.new_profile)
+        file_menu.addAction(new_profile_action)
+        
+        delete_profile_action = QAction('删除当前配置', self)
+        delete_profile_action.triggered.connect(self.delete_profile)
+        file_menu.addAction(delete_profile_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction('退出', self)
@@ -517,6 +4320,36 @@ class SerialAssistant(QMainWindow):
         cmd_settings_action.triggered.connect(self.open_settings_dialog)
         settings_menu.addAction(cmd_settings_action)
         
+        self.server_action = QAction('遥测转发服务', self)
+        self.server_action.setCheckable(True)
+        self.server_action.setChecked(self.server_enabled)
+        self.server_action.toggled.connect(self.toggle_telemetry_server)
+        settings_menu.addAction(self.server_action)
+        
+        self.server_commands_action = QAction('允许转发客户端发送指令', self)
+        self.server_commands_action.setCheckable(True)
+        self.server_commands_action.setChecked(self.server_commands)
+        self.server_commands_action.toggled.connect(self.toggle_server_commands)
+        settings_menu.addAction(self.server_commands_action)
+        
+        self.metrics_action = QAction('指标接口 (Prometheus)', self)
+        self.metrics_action.setCheckable(True)
+        self.metrics_action.setChecked(self.metrics_enabled)
+        self.metrics_action.toggled.connect(self.toggle_metrics_server)
+        settings_menu.addAction(self.metrics_action)
+        
+        self.simulator_action = QAction('设备模拟器', self)
+        self.simulator_action.setCheckable(True)
+        self.simulator_action.setEnabled(hasattr(os, 'openpty'))
+        self.simulator_action.toggled.connect(self.toggle_simulator)
+        settings_menu.addAction(self.simulator_action)
+        
+        self.gauge_grid_action = QAction('单控件仪表盘（适合多通道）', self)
+        self.gauge_grid_action.setCheckable(True)
+        self.gauge_grid_action.setChecked(self.gauge_grid)
+        self.gauge_grid_action.toggled.connect(self.toggle_gauge_grid)
+        settings_menu.addAction(self.gauge_grid_action)
+        
         # 帮助菜单
         help_menu = menubar.addMenu('帮助')
         
@@ -525,79 +4358,103 @@ class SerialAssistant(QMainWindow):
         help_menu.addAction(about_action)
     
     def update_sensor_fields(self):
-        """更新传感器字段为仪表盘"""
-        self.sensor_fields = {}
-
+        """按 data_format 增量更新仪表盘：复用未变化的控件并保留当前值，只增删改有变化的通道"""
         # 获取或创建传感器组的网格布局
         layout = self.sensor_group.layout()
-        if layout is not None:
-            # 如果布局已存在，清空其所有小部件
+        if layout is None:
+            layout = QGridLayout()
+            self.sensor_group.setLayout(layout)
+
+        # 切换绘制方式时才整体重建
+        if self.gauge_grid != (self.gauge_grid_widget is not None):
             while layout.count():
                 item = layout.takeAt(0)
                 widget = item.widget()
                 if widget:
                     widget.deleteLater()
-        else:
-            layout = QGridLayout()
-            self.sensor_group.setLayout(layout)
+            self.sensor_cells = {}
+            self.sensor_fields = {}
+            self.gauge_grid_widget = None
 
-        # 添加新的传感器小部件（仪表盘或文本）到网格布局
-        row, col = 0, 0
-        for name, info in self.data_format.items():
-            if name == '当前状态':
-                # 为状态创建特殊的文本显示
-                status_widget = QWidget()
-                status_layout = QVBoxLayout(status_widget)
-                status_layout.setContentsMargins(10, 10, 10, 10)
-                status_layout.setAlignment(Qt.AlignCenter)
-
-                title_label = QLabel(name)
-                title_label.setAlignment(Qt.AlignCenter)
-                title_label.setFont(QFont("Microsoft YaHei", 12, QFont.Bold))
-
-                value_label = QLineEdit("待机")
-                value_label.setReadOnly(True)
-                value_label.setAlignment(Qt.AlignCenter)
-                value_label.setFont(QFont("Microsoft YaHei", 16, QFont.Bold))
-                value_label.setStyleSheet("background-color: transparent; border: none;")
-
-                status_layout.addWidget(title_label)
-                status_layout.addWidget(value_label)
-
-                self.sensor_fields[name] = value_label
-                layout.addWidget(status_widget, row, col)
+        if self.gauge_grid:
+            # 所有仪表盘由一个控件绘制，只重绘数值变化的格子
+            if self.gauge_grid_widget is None:
+                self.gauge_grid_widget = GaugeGridWidget()
+                layout.addWidget(self.gauge_grid_widget, 0, 0, 1, 4)
+            self.gauge_grid_widget.set_channels(self.data_format)
+            self.sensor_fields = dict(self.gauge_grid_widget.channels)
+            return
+
+        # 移除已删除的传感器
+        for name, cell in self.sensor_cells.items():
+            if name not in self.data_format:
+                layout.removeWidget(cell)
+                cell.deleteLater()
+
+        # 新增的传感器创建控件，已有的就地修改单位和量程
+        cells = {}
+        fields = {}
+        for index, (name, info) in enumerate(self.data_format.items()):
+            cell = self.sensor_cells.get(name)
+            if cell is None:
+                cell, field = self.create_sensor_widget(name, info)
             else:
-                # 为其他传感器创建仪表盘
-                unit = info.get('unit', '')
-                min_val = info.get('min', 0)
-                max_val = info.get('max', 100)
-                
-                gauge = GaugeWidget(name, unit, min_val, max_val)
-                self.sensor_fields[name] = gauge
-                layout.addWidget(gauge, row, col)
+                field = self.sensor_fields[name]
+                if name != '当前状态':
+                    field.configure(info.get('unit', ''), info.get('min', 0), info.get('max', 100))
+            row, col = divmod(index, 4)  # 每行最多4个小部件
+            place_grid_widget(layout, cell, row, col)
+            cells[name] = cell
+            fields[name] = field
+        self.sensor_cells = cells
+        self.sensor_fields = fields
+
+    def create_sensor_widget(self, name, info):
+        """创建一个传感器的显示控件，返回 (放入布局的控件, 接收数值的控件)"""
+        if name == '当前状态':
+            # 为状态创建特殊的文本显示
+            status_widget = QWidget()
+            status_layout = QVBoxLayout(status_widget)
+            status_layout.setContentsMargins(10, 10, 10, 10)
+            status_layout.setAlignment(Qt.AlignCenter)
+
+            title_label = QLabel(name)
+            title_label.setAlignment(Qt.AlignCenter)
+            title_label.setFont(QFont("Microsoft YaHei", 12, QFont.Bold))
 
-            col += 1
-            if col > 3:  # 每行最多4个小部件
-                col = 0
-                row += 1
+            value_label = QLineEdit("待机")
+            value_label.setReadOnly(True)
+            value_label.setAlignment(Qt.AlignCenter)
+            value_label.setFont(QFont("Microsoft YaHei", 16, QFont.Bold))
+            value_label.setStyleSheet("background-color: transparent; border: none;")
+
+            status_layout.addWidget(title_label)
+            status_layout.addWidget(value_label)
+            return status_widget, value_label
+
+        # 为其他传感器创建仪表盘
+        gauge = GaugeWidget(name, info.get('unit', ''), info.get('min', 0), info.get('max', 100))
+        return gauge, gauge
     
     def update_cmd_buttons(self):
-        """更新快捷指令按钮"""
-        # 清除旧的按钮
-        while self.quick_cmd_layout.count():
-            item = self.quick_cmd_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
-        # 添加新的按钮到网格布局
-        buttons = list(self.cmd_buttons.items())
+        """按 cmd_buttons 增量更新快捷指令按钮，名称未变的按钮直接复用"""
+        # 移除已删除的按钮
+        for name, btn in self.cmd_button_widgets.items():
+            if name not in self.cmd_buttons:
+                self.quick_cmd_layout.removeWidget(btn)
+                btn.deleteLater()
+        
+        # 按顺序放置按钮，点击时按名称查找当前指令，修改指令内容无需重建按钮
+        buttons = {}
         cols = 4  # 每行4个按钮
-        for i, (name, cmd) in enumerate(buttons):
-            btn = QPushButton(name)
-            btn.clicked.connect(lambda checked, c=cmd: self.send_quick_command(c))
-            row = i // cols
-            col = i % cols
-            self.quick_cmd_layout.addWidget(btn, row, col)
+        for i, name in enumerate(self.cmd_buttons):
+            btn = self.cmd_button_widgets.get(name)
+            if btn is None:
+                btn = QPushButton(name)
+                btn.clicked.connect(lambda checked, n=name: self.send_quick_command(self.cmd_buttons[n]))
+            place_grid_widget(self.quick_cmd_layout, btn, i // cols, i % cols)
+            buttons[name] = btn
+        self.cmd_button_widgets = buttons
     
     def refresh_ports(self):
         """刷新可用的串口列表"""
@@ -605,6 +4462,8 @@ class SerialAssistant(QMainWindow):
         
         self.port_combo.clear()
         ports = [port.device for port in serial.tools.list_ports.comports()]
+        if self.simulator is not None:
+            ports.append(self.simulator.port)
         self.port_combo.addItems(ports)
         
         # 尝试保持之前选择的串口
@@ -650,16 +4509,25 @@ class SerialAssistant(QMainWindow):
             if self.serial_port.is_open:
                 self.connect_btn.setText('关闭串口')
                 self.receive_text.append(f'已连接到 {port_name}')
+                self.store_settings()
                 
                 # 启动接收线程
-                self.serial_thread = SerialThread(self.serial_port)
+                self.serial_thread = SerialThread(self.serial_port, self.pipeline, self.telemetry_server,
+                                                  idle_flush=self.frame_timeout)
                 self.serial_thread.received.connect(self.handle_received_data)
+                self.serial_thread.samples_ready.connect(self.handle_samples)
+                self.serial_thread.rule_fired.connect(self.handle_rule_action)
                 self.serial_thread.start()
+                self.link_baseline = self.pipeline.metrics.snapshot()[0]
+                self.link_history.clear()
         except Exception as e:
             self.receive_text.append(f'连接失败: {str(e)}')
     
     def disconnect_port(self):
         """断开串口连接"""
+        if self.transfer_thread is not None:
+            self.transfer_thread.requestInterruption()
+            self.transfer_thread.wait()
         if self.serial_thread:
             self.serial_thread.stop()
             self.serial_thread = None
@@ -671,72 +4539,180 @@ class SerialAssistant(QMainWindow):
     
     def handle_received_data(self, data):
         """处理接收到的数据"""
-        if self.hex_display.isChecked():
+        thread = self.sender()
+        if isinstance(thread, SerialThread):
+            thread.console_delivered()
+        if self.console_compact and not self.hex_display.isChecked():
+            self.show_console_lines(self.console.feed(data, time.time()))
+        elif self.hex_display.isChecked():
             # 十六进制显示
             hex_str = ' '.join([f"{byte:02X}" for byte in data])
             self.receive_text.append(f"接收: {hex_str}")
         else:
             # 尝试解码为UTF-8文本
             try:
-                text = data.decode('utf-8')
+                text = str(data, 'utf-8')
                 self.receive_text.append(f"接收: {text}")
             except UnicodeDecodeError:
                 # 解码失败时显示十六进制
                 hex_str = ' '.join([f"{byte:02X}" for byte in data])
                 self.receive_text.append(f"接收(HEX): {hex_str}")
         
-        # 解析传感器数据
-        self.parse_sensor_data(data)
-        
         # 自动滚动
         if self.auto_scroll.isChecked():
             self.receive_text.verticalScrollBar().setValue(
                 self.receive_text.verticalScrollBar().maximum()
             )
     
-    def parse_sensor_data(self, data):
-        """解析传感器数据并更新UI"""
+    def show_console_lines(self, lines):
+        """显示紧凑模式的输出：替换仍在末尾的当前分组行，或追加新行"""
+        if not lines:
+            return
+        document = self.receive_text.document()
+        for replace, text in lines:
+            if replace and document.blockCount() == self.console_block_count:
+                cursor = QTextCursor(document.lastBlock())
+                cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+                cursor.insertText(text)
+            else:
+                self.receive_text.append(text)
+            self.console_block_count = document.blockCount()
+        if self.auto_scroll.isChecked():
+            self.receive_text.verticalScrollBar().setValue(
+                self.receive_text.verticalScrollBar().maximum()
+            )
+    
+    def flush_console(self):
+        if self.console_compact:
+            self.show_console_lines(self.console.tick(time.time()))
+    
+    def toggle_compact_display(self, checked):
+        self.console_compact = checked
+        self.console.reset()
+        self.console_block_count = 0
+        self.summary_rate_spin.setEnabled(checked)
+        self.settings_store.set_options(console_compact=checked)
+    
+    def set_console_summary_rate(self, value):
+        self.console_summary_rate = self.console.summary_rate = value
+        self.settings_store.set_options(console_summary_rate=value)
+    
+    def handle_samples(self, samples):
+        """用接收线程解析出的采样更新UI"""
+        thread = self.sender()
+        if isinstance(thread, SerialThread):
+            thread.samples_delivered()
+        for values in samples:
+            for name, value in values.items():
+                widget = self.sensor_fields.get(name)
+                if widget is None:
+                    continue
+                if name == '当前状态':
+                    widget.setText(STATUS_MAP.get(value, value))
+                else:
+                    widget.setValue(value)
+    
+    def check_backlog(self):
+        """按接收积压和事件循环延迟切换只显示最新值，并在需要时发送降速/升速指令"""
+        now = time.monotonic()
+        frame_ms = max(0.0, (now - self.last_heartbeat) * 1000 - self.RATE_CHECK_INTERVAL)
+        self.last_heartbeat = now
+        thread = self.serial_thread
+        controller = self.rate_controller
+        if thread is None:
+            return
+        if not controller.enabled:
+            thread.latest_only = False
+            return
+        action = controller.update(thread.backlog, frame_ms, now)
+        if thread.latest_only != controller.overloaded:
+            thread.latest_only = controller.overloaded
+            self.receive_text.append('界面处理不过来，暂时只显示最新数值' if controller.overloaded
+                                     else '界面已跟上，恢复逐条显示')
+        if action is not None:
+            name = controller.down_button if action == 'down' else controller.up_button
+            command = self.cmd_buttons.get(name)
+            self.receive_text.append(f"自动{'降速' if action == 'down' else '升速'}"
+                                     f"（当前已降 {controller.level} 级）: {name or '未设置指令'}")
+            if command:
+                self.send_command(command)
+    
+    def handle_rule_action(self, action, argument, rule_text):
+        """执行自动规则触发的动作"""
+        if action == 'send':
+            self.receive_text.append(f"规则触发: {rule_text}")
+            self.send_command(argument)
+        elif action == 'alarm':
+            self.receive_text.append(f"报警: {argument or rule_text}")
+            QApplication.beep()
+    
+    def update_pipeline(self):
+        """按当前设置重新编译解析器、派生通道和自动规则"""
         try:
-            # 尝试解码为UTF-8文本
-            text = data.decode('utf-8').strip()
-            
-            # 数据格式判断与解析
-            items = text.split(self.data_separator)
-            data_map = {}
-            
-            for item in items:
-                if self.kv_separator in item:
-                    key, value = item.split(self.kv_separator, 1)
-                    data_map[key.strip()] = value.strip()
-            
-            # 更新传感器字段
-            for name, info in self.data_format.items():
-                key = info.get('key', '')
-                
-                if key in data_map:
-                    value_str = data_map[key]
-                    
-                    if name == '当前状态':
-                        status_map = {
-                            '0': '待机',
-                            '1': '自动监控',
-                            '2': '手动控制',
-                            '3': '充电中',
-                            '4': '报警'
-                        }
-                        display_text = status_map.get(value_str, value_str)
-                        if name in self.sensor_fields:
-                            self.sensor_fields[name].setText(display_text)
-                    else:
-                        # 更新仪表盘
-                        try:
-                            value_float = float(value_str)
-                            if name in self.sensor_fields:
-                                self.sensor_fields[name].setValue(value_float)
-                        except ValueError:
-                            print(f"无法将 '{value_str}' 转换为数值用于仪表盘 '{name}'")
-        except Exception as e:
-            print(f"解析数据错误: {e}")
+            errors = self.pipeline.configure(self.data_format, self.data_separator, self.kv_separator, self.rules,
+                                             self.cmd_buttons, self.stats_window, self.history_hours, self.frame_check)
+        except ValueError as e:
+            self.frame_check = {}
+            errors = [str(e)] + self.pipeline.configure(self.data_format, self.data_separator, self.kv_separator,
+                                                        self.rules, self.cmd_buttons, self.stats_window,
+                                                        self.history_hours)
+        for error in errors:
+            self.receive_text.append(f"设置无效: {error}")
+        self.console.data_separator = self.data_separator
+        self.console.kv_separator = self.kv_separator
+        if self.serial_thread is not None:
+            self.serial_thread.idle_flush = self.frame_timeout
+        # 保留已发送的降速次数，修改设置后仍能正确恢复
+        level = self.rate_controller.level
+        self.rate_controller = RateController(self.rate_control)
+        self.rate_controller.level = min(level, self.rate_controller.max_level)
+    
+    def refresh_sensor_stats(self):
+        """把接收线程维护的滚动统计显示在各仪表盘下方"""
+        snapshot = self.pipeline.stats.snapshot()
+        for name, widget in self.sensor_fields.items():
+            if name == '当前状态':
+                continue
+            stats = snapshot.get(name)
+            if stats is None:
+                widget.setStats('')
+            else:
+                widget.setStats(f"最小 {stats.min:.1f}  最大 {stats.max:.1f}\n"
+                                f"均值 {stats.mean:.1f}  σ {stats.stddev:.2f}  {stats.rate:.1f}Hz")
+    
+    @staticmethod
+    def link_rates(counts):
+        """返回 (校验错误率, 丢帧率)，没有相应数据时为 None"""
+        checked = counts['checked_frames']
+        expected = counts['sequenced_frames'] + counts['lost_frames']
+        return (counts['checksum_errors'] / checked if checked else None,
+                counts['lost_frames'] / expected if expected else None)
+    
+    def refresh_link_quality(self):
+        """在状态栏显示本次连接以来和最近一个统计窗口内的校验错误率、丢帧率和乱序数"""
+        if not self.frame_check or self.link_baseline is None:
+            self.link_label.clear()
+            return
+        if self.serial_port is None or not self.serial_port.is_open:
+            return  # 断开后保留上次连接的统计
+        counters = self.pipeline.metrics.snapshot()[0]
+        now = time.monotonic()
+        history = self.link_history
+        history.append((now, counters))
+        while now - history[0][0] > self.stats_window:
+            history.popleft()
+        total = {name: counters[name] - self.link_baseline[name] for name in FrameCheck.COUNTERS}
+        recent = {name: counters[name] - history[0][1][name] for name in FrameCheck.COUNTERS}
+        
+        def percent(rate):
+            return '-' if rate is None else f'{rate:.2%}'
+        
+        errors, loss = self.link_rates(total)
+        recent_errors, recent_loss = self.link_rates(recent)
+        self.link_label.setText(
+            f'链路 {self.serial_port.baudrate} 波特: 校验错误 {percent(errors)}  丢帧 {percent(loss)}  '
+            f'乱序 {total["out_of_order"]}  重复 {total["duplicate_frames"]}  重启 {total["sequence_resets"]}  |  '
+            f'近 {self.stats_window:g} 秒: 校验错误 {percent(recent_errors)}  丢帧 {percent(recent_loss)}')
     
     def send_data(self):
         """发送数据"""
@@ -744,6 +4720,10 @@ class SerialAssistant(QMainWindow):
             self.receive_text.append('串口未打开，无法发送数据')
             return
             
+        if self.transfer_thread is not None:
+            self.receive_text.append('正在发送文件，请等待完成或取消后再发送')
+            return
+            
         text = self.send_text.toPlainText().strip()
         if not text:
             return
@@ -779,6 +4759,135 @@ class SerialAssistant(QMainWindow):
         except Exception as e:
             self.receive_text.append(f'发送失败: {str(e)}')
     
+    def send_command(self, command):
+        """直接发送一条文本指令（不改动发送区内容），供自动规则等调用"""
+        if not self.serial_port or not self.serial_port.is_open:
+            self.receive_text.append(f'串口未打开，无法发送指令: {command}')
+            return
+        if self.transfer_thread is not None:
+            self.receive_text.append(f'正在发送文件，已忽略指令: {command}')
+            return
+        
+        try:
+            self.serial_port.write(command.encode('utf-8'))
+            self.receive_text.append(f"发送: {command}")
+        except Exception as e:
+            self.receive_text.append(f'发送失败: {str(e)}')
+    
+    def toggle_telemetry_server(self, checked):
+        """菜单切换遥测转发服务"""
+        if checked:
+            self.start_telemetry_server()
+        else:
+            self.stop_telemetry_server()
+        self.server_enabled = self.telemetry_server is not None
+        self.settings_store.set_options(server_enabled=self.server_enabled)
+    
+    def toggle_server_commands(self, checked):
+        """菜单切换是否接受转发客户端发来的指令（默认关闭）"""
+        self.server_commands = checked
+        if self.telemetry_server is not None:
+            self.telemetry_server.accept_commands = checked
+        self.settings_store.set_options(server_commands=self.server_commands)
+    
+    def toggle_gauge_grid(self, checked):
+        """菜单切换仪表盘绘制方式"""
+        self.gauge_grid = checked
+        self.update_sensor_fields()
+        self.settings_store.set_options(gauge_grid=self.gauge_grid)
+    
+    def start_telemetry_server(self):
+        """启动本地遥测转发服务"""
+        if self.telemetry_server is not None:
+            return
+        server = TelemetryServer('127.0.0.1', self.server_tcp_port, self.server_ws_port,
+                                 accept_commands=self.server_commands)
+        try:
+            server.start()
+        except OSError as e:
+            self.receive_text.append(f'遥测转发服务启动失败: {str(e)}')
+            self.server_action.setChecked(False)
+            return
+        server.command_received.connect(self.handle_remote_command)
+        self.telemetry_server = server
+        if self.serial_thread:
+            self.serial_thread.server = server
+        if self.metrics_server is not None:
+            self.metrics_server.telemetry_server = server
+        self.receive_text.append(f'遥测转发服务已启动: TCP 127.0.0.1:{server.tcp_port}, '
+                                 f'WebSocket ws://127.0.0.1:{server.ws_port}')
+    
+    def stop_telemetry_server(self):
+        """停止本地遥测转发服务"""
+        if self.telemetry_server is None:
+            return
+        if self.serial_thread:
+            self.serial_thread.server = None
+        if self.metrics_server is not None:
+            self.metrics_server.telemetry_server = None
+        self.telemetry_server.stop()
+        self.telemetry_server = None
+        self.receive_text.append('遥测转发服务已停止')
+    
+    def toggle_metrics_server(self, checked):
+        """菜单切换指标接口"""
+        if checked:
+            self.start_metrics_server()
+        else:
+            self.stop_metrics_server()
+        self.metrics_enabled = self.metrics_server is not None
+        self.settings_store.set_options(metrics_enabled=self.metrics_enabled)
+    
+    def start_metrics_server(self):
+        """启动本机 Prometheus 指标接口"""
+        if self.metrics_server is not None:
+            return
+        server = MetricsServer(self.pipeline, '127.0.0.1', self.metrics_port, self.telemetry_server)
+        try:
+            server.start()
+        except OSError as e:
+            self.receive_text.append(f'指标接口启动失败: {str(e)}')
+            self.metrics_action.setChecked(False)
+            return
+        self.metrics_server = server
+        self.receive_text.append(f'指标接口已启动: http://127.0.0.1:{server.port}/metrics')
+    
+    def stop_metrics_server(self):
+        """停止指标接口"""
+        if self.metrics_server is None:
+            return
+        self.metrics_server.stop()
+        self.metrics_server = None
+        self.receive_text.append('指标接口已停止')
+    
+    def toggle_simulator(self, checked):
+        """菜单切换内置设备模拟器，启动后其伪终端出现在串口列表中"""
+        if checked and self.simulator is None:
+            simulator = DeviceSimulator(self.data_format, self.cmd_buttons,
+                                        data_separator=self.data_separator, kv_separator=self.kv_separator)
+            try:
+                port = simulator.start()
+            except OSError as e:
+                self.receive_text.append(f'设备模拟器启动失败: {str(e)}')
+                self.simulator_action.setChecked(False)
+                return
+            self.simulator = simulator
+            self.refresh_ports()
+            self.port_combo.setCurrentText(port)
+            self.receive_text.append(f'设备模拟器已启动: {port}')
+        elif not checked and self.simulator is not None:
+            if self.serial_port and self.serial_port.is_open and self.serial_port.port == self.simulator.port:
+                self.disconnect_port()
+            self.simulator.stop()
+            self.simulator = None
+            self.refresh_ports()
+            self.receive_text.append('设备模拟器已停止')
+    
+    def handle_remote_command(self, command):
+        """执行遥测客户端发来的指令"""
+        self.receive_text.append(f"远程指令: {command}")
+        self.send_command(command)
+    
     def send_quick_command(self, command):
         """发送快捷指令"""
         self.send_text.setText(command)
@@ -795,6 +4904,8 @@ class SerialAssistant(QMainWindow):
     def clear_receive(self):
         """清空接收区"""
         self.receive_text.clear()
+        self.console.reset()
+        self.console_block_count = 0
     
     def clear_send(self):
         """清空发送区"""
@@ -802,7 +4913,7 @@ class SerialAssistant(QMainWindow):
     
     def open_settings_dialog(self):
         """打开设置对话框"""
-        dialog = SettingsDialog(self, self.cmd_buttons, self.data_format)
+        dialog = SettingsDialog(self, self.cmd_buttons, self.data_format, self.rules)
         if dialog.exec_() == QDialog.Accepted:
             # 更新快捷指令
             self.cmd_buttons = dialog.get_cmd_buttons()
@@ -827,71 +4938,356 @@ class SerialAssistant(QMainWindow):
                 self.data_format = new_data_format
                 self.data_separator, self.kv_separator = dialog.get_separators()
 
+            self.rules = dialog.get_rules()
+            self.frame_check = dialog.get_frame_check()
+            self.rate_control = dialog.get_rate_control()
+            self.frame_timeout = dialog.get_frame_timeout()
+            self.stats_window = dialog.get_stats_window()
+            self.history_hours = dialog.get_history_hours()
+
             self.update_sensor_fields()
+            self.update_pipeline()
             
             # 保存设置到文件
             self.save_settings()
     
-    def save_settings(self):
-        """保存设置到文件"""
-        try:
-            settings = {
-                'cmd_buttons': self.cmd_buttons,
-                'data_format': self.data_format,
-                'data_separator': self.data_separator,
-                'kv_separator': self.kv_separator
+    def current_settings(self):
+        """收集当前设备配置的全部设置"""
+        if hasattr(self, 'baud_combo'):
+            self.port_settings = {
+                'port': self.port_combo.currentText(),
+                'baudrate': self.baud_combo.currentText(),
+                'data_bits': self.data_bits_combo.currentText(),
+                'stop_bits': self.stop_bits_combo.currentText(),
+                'parity': self.parity_combo.currentText(),
             }
-            
-            with open('serial_settings.json', 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
-                
+        return {
+            'cmd_buttons': self.cmd_buttons,
+            'data_format': self.data_format,
+            'data_separator': self.data_separator,
+            'kv_separator': self.kv_separator,
+            'rules': self.rules,
+            'stats_window': self.stats_window,
+            'history_hours': self.history_hours,
+            'port_settings': self.port_settings,
+            'frame_check': self.frame_check,
+            'rate_control': self.rate_control,
+            'frame_timeout': self.frame_timeout
+        }
+    
+    def apply_settings(self, settings):
+        """把设置字典应用到当前状态（不刷新界面）"""
+        if 'cmd_buttons' in settings:
+            self.cmd_buttons = settings['cmd_buttons']
+        if 'data_format' in settings:
+            self.data_format = settings['data_format']
+        if 'data_separator' in settings:
+            self.data_separator = settings['data_separator']
+        if 'kv_separator' in settings:
+            self.kv_separator = settings['kv_separator']
+        if 'rules' in settings:
+            self.rules = settings['rules']
+        if 'stats_window' in settings:
+            self.stats_window = settings['stats_window']
+        if 'history_hours' in settings:
+            self.history_hours = settings['history_hours']
+        if 'port_settings' in settings:
+            self.port_settings = settings['port_settings']
+        if 'frame_check' in settings:
+            self.frame_check = settings['frame_check']
+        if 'rate_control' in settings:
+            self.rate_control = settings['rate_control']
+        if 'frame_timeout' in settings:
+            self.frame_timeout = settings['frame_timeout']
+    
+    def apply_port_settings(self):
+        """把配置中的串口参数显示到串口设置区"""
+        combos = {
+            'port': self.port_combo,
+            'baudrate': self.baud_combo,
+            'data_bits': self.data_bits_combo,
+            'stop_bits': self.stop_bits_combo,
+            'parity': self.parity_combo,
+        }
+        port_settings = dict(self.port_settings)
+        for key, combo in combos.items():
+            value = port_settings.get(key)
+            if value and combo.findText(value) >= 0:
+                # 应用过程中不触发自动保存，避免保存只应用了一半的参数
+                combo.blockSignals(True)
+                combo.setCurrentText(value)
+                combo.blockSignals(False)
+    
+    def store_settings(self):
+        """把当前设置写入设置缓存，由后台线程合并保存"""
+        self.settings_store.set_profile(self.settings_store.active_profile, self.current_settings())
+        self.settings_store.set_options(server_enabled=self.server_enabled,
+                                        server_tcp_port=self.server_tcp_port,
+                                        server_ws_port=self.server_ws_port,
+                                        server_commands=self.server_commands,
+                                        gauge_grid=self.gauge_grid,
+                                        metrics_enabled=self.metrics_enabled,
+                                        metrics_port=self.metrics_port,
+                                        console_compact=self.console_compact,
+                                        console_summary_rate=self.console_summary_rate)
+    
+    def save_settings(self):
+        """保存设置"""
+        self.store_settings()
+        self.save_requested = True
+        self.settings_store.save()  # 设置没有变化时也写入一次，才能报告结果
+    
+    def handle_settings_saved(self):
+        """后台写入设置完成"""
+        if self.save_requested:
+            self.save_requested = False
             self.receive_text.append('设置已保存')
-        except Exception as e:
-            self.receive_text.append(f'保存设置失败: {str(e)}')
+    
+    def handle_settings_save_failed(self, error):
+        """后台保存设置失败"""
+        self.save_requested = False
+        self.receive_text.append(f'保存设置失败: {error}')
     
     def load_settings(self):
         """加载设置"""
         try:
-            if os.path.exists('serial_settings.json'):
-                with open('serial_settings.json', 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                
-                if 'cmd_buttons' in settings:
-                    self.cmd_buttons = settings['cmd_buttons']
-                if 'data_format' in settings:
-                    self.data_format = settings['data_format']
-                if 'data_separator' in settings:
-                    self.data_separator = settings['data_separator']
-                if 'kv_separator' in settings:
-                    self.kv_separator = settings['kv_separator']
+            self.settings_store.load(legacy_path='serial_settings.json')
         except Exception as e:
             print(f"加载设置失败: {e}")
+        
+        self.apply_settings(self.settings_store.get_profile())
+        options = self.settings_store.options
+        if 'server_enabled' in options:
+            self.server_enabled = options['server_enabled']
+        if 'server_tcp_port' in options:
+            self.server_tcp_port = options['server_tcp_port']
+        if 'server_ws_port' in options:
+            self.server_ws_port = options['server_ws_port']
+        if 'server_commands' in options:
+            self.server_commands = options['server_commands']
+        if 'gauge_grid' in options:
+            self.gauge_grid = options['gauge_grid']
+        if 'metrics_enabled' in options:
+            self.metrics_enabled = options['metrics_enabled']
+        if 'metrics_port' in options:
+            self.metrics_port = options['metrics_port']
+        if 'console_compact' in options:
+            self.console_compact = options['console_compact']
+        if 'console_summary_rate' in options:
+            self.console_summary_rate = options['console_summary_rate']
+        self.console.summary_rate = self.console_summary_rate
     
     def load_settings_from_file(self):
-        """从文件加载设置"""
+        """从文件加载设置到当前设备配置"""
         file_path, _ = QFileDialog.getOpenFileName(self, "加载设置", "", "JSON文件 (*.json)")
         if file_path:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     settings = json.load(f)
                 
-                if 'cmd_buttons' in settings:
-                    self.cmd_buttons = settings['cmd_buttons']
-                if 'data_format' in settings:
-                    self.data_format = settings['data_format']
-                if 'data_separator' in settings:
-                    self.data_separator = settings['data_separator']
-                if 'kv_separator' in settings:
-                    self.kv_separator = settings['kv_separator']
+                # 兼容多配置格式的设置文件，取其中的当前配置
+                if 'profiles' in settings:
+                    settings = settings['profiles'].get(settings.get('active_profile'), {})
+                self.apply_settings(settings)
                 
                 # 更新UI
                 self.update_cmd_buttons()
                 self.update_sensor_fields()
+                self.update_pipeline()
+                self.apply_port_settings()
+                self.store_settings()
                 
                 self.receive_text.append(f'已从 {file_path} 加载设置')
             except Exception as e:
                 self.receive_text.append(f'加载设置失败: {str(e)}')
     
+    def export_history(self):
+        """在后台线程中导出采样历史和原始数据"""
+        if self.export_thread is not None:
+            self.receive_text.append('已有导出任务正在进行')
+            return
+        time_range = self.pipeline.history.time_range()
+        if time_range is None:
+            QMessageBox.information(self, '导出历史数据', '还没有记录到传感器数据')
+            return
+        
+        dialog = ExportDialog(self, time_range)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        start, end, fmt, include_raw = dialog.get_options()
+        extension = HistoryExporter.FORMATS[fmt]
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出历史数据", f"sensor_history{extension}",
+                                                   f"{fmt}文件 (*{extension})")
+        if not file_path:
+            return
+        
+        self.export_thread = HistoryExportThread(self.pipeline.history, file_path, fmt, start, end, include_raw)
+        progress = QProgressDialog('正在导出历史数据...', '取消', 0, 100, self)
+        progress.setWindowTitle('导出历史数据')
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(self.export_thread.requestInterruption)
+        self.export_thread.progress.connect(progress.setValue)
+        self.export_thread.completed.connect(self.handle_export_completed)
+        self.export_thread.failed.connect(self.handle_export_failed)
+        self.export_thread.finished.connect(progress.close)
+        self.export_thread.start()
+        self.receive_text.append(f'开始导出 {self.export_thread.exporter.rows} 行数据到 {file_path}')
+    
+    def handle_export_completed(self, paths):
+        self.export_thread = None
+        self.receive_text.append('导出完成: ' + ', '.join(paths))
+    
+    def handle_export_failed(self, error):
+        self.export_thread = None
+        self.receive_text.append(f'导出失败: {error}')
+    
+    def analyze_log(self):
+        """用当前数据格式在后台多进程解析日志文件，结果导出为列式文件并显示统计"""
+        if self.analysis_thread is not None:
+            self.receive_text.append('已有分析任务正在进行')
+            return
+        log_path, _ = QFileDialog.getOpenFileName(self, "选择日志文件", "", "日志文件 (*.bin *.log *.txt);;所有文件 (*)")
+        if not log_path:
+            return
+        filters = [f"{fmt}文件 (*{HistoryExporter.FORMATS[fmt]})" for fmt in HistoryExporter.available_formats()]
+        base = os.path.splitext(log_path)[0]
+        output_path, selected = QFileDialog.getSaveFileName(self, "保存分析结果", base + "_parsed.csv", ';;'.join(filters))
+        if not output_path:
+            return
+        fmt = selected.split('文件')[0] if selected else 'CSV'
+        
+        self.analysis_thread = LogAnalysisThread(log_path, output_path, fmt, self.data_format,
+                                                 self.data_separator, self.kv_separator, self.frame_check)
+        progress = QProgressDialog('正在分析日志文件...', '取消', 0, 100, self)
+        progress.setWindowTitle('分析日志文件')
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(self.analysis_thread.requestInterruption)
+        self.analysis_thread.progress.connect(progress.setValue)
+        self.analysis_thread.completed.connect(self.handle_analysis_completed)
+        self.analysis_thread.failed.connect(self.handle_analysis_failed)
+        self.analysis_thread.finished.connect(progress.close)
+        self.analysis_thread.start()
+        self.receive_text.append(f'开始分析 {log_path}')
+    
+    def handle_analysis_completed(self, paths, summary):
+        self.analysis_thread = None
+        for line in summary:
+            self.receive_text.append(line)
+        self.receive_text.append('分析结果已保存: ' + ', '.join(paths))
+    
+    def handle_analysis_failed(self, error):
+        self.analysis_thread = None
+        self.receive_text.append(f'分析失败: {error}')
+    
+    def send_file(self):
+        """在后台线程中通过串口发送文件，显示进度和吞吐量"""
+        if not self.serial_port or not self.serial_port.is_open:
+            self.receive_text.append('串口未打开，无法发送文件')
+            return
+        if self.transfer_thread is not None:
+            self.receive_text.append('已有文件正在发送')
+            return
+        dialog = FileTransferDialog(self, self.transfer_resume)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        path, mode, rate, window, command, offset = dialog.get_options()
+        try:
+            self.transfer_thread = FileTransferThread(self.serial_port, path, mode, baudrate=self.serial_port.baudrate,
+                                                      rate=rate or None, window=window, command=command or None,
+                                                      offset=offset)
+        except OSError as e:
+            self.receive_text.append(f'无法读取文件: {e}')
+            return
+        transfer = self.transfer_thread.transfer
+        if mode != 'raw' and self.serial_thread is not None:
+            self.serial_thread.rx_tap = transfer.feed  # 接收方的应答交给发送线程，不显示也不解析
+        
+        self.transfer_progress = QProgressDialog('正在等待接收方...', '取消', 0, 1000, self)
+        self.transfer_progress.setWindowTitle(f'发送文件: {os.path.basename(path)}')
+        self.transfer_progress.setWindowModality(Qt.NonModal)
+        self.transfer_progress.setMinimumDuration(0)
+        self.transfer_progress.canceled.connect(self.transfer_thread.requestInterruption)
+        self.transfer_thread.progress.connect(self.handle_transfer_progress)
+        self.transfer_thread.completed.connect(self.handle_transfer_completed)
+        self.transfer_thread.failed.connect(self.handle_transfer_failed)
+        self.transfer_thread.finished.connect(self.transfer_progress.close)
+        self.transfer_thread.start()
+        start = f'，从第 {transfer.offset} 字节继续' if transfer.offset else ''
+        self.receive_text.append(f'开始发送 {path} ({transfer.size} 字节, {FileTransferDialog.MODE_NAMES[mode]}){start}')
+    
+    def handle_transfer_progress(self, sent, total, rate):
+        if self.transfer_progress is None:
+            return
+        self.transfer_progress.setValue(int(sent * 1000 / total) if total else 1000)
+        self.transfer_progress.setLabelText(f'{sent / 1024:.1f} / {total / 1024:.1f} KB    {rate / 1024:.1f} KB/秒')
+    
+    def finish_transfer(self):
+        if self.serial_thread is not None:
+            self.serial_thread.rx_tap = None
+        transfer = self.transfer_thread.transfer
+        self.transfer_thread = None
+        self.transfer_progress = None
+        return transfer
+    
+    def handle_transfer_completed(self, size, elapsed):
+        transfer = self.finish_transfer()
+        self.transfer_resume = None
+        retransmits = f', 重发 {transfer.retransmits} 次' if transfer.retransmits else ''
+        self.receive_text.append(f'文件发送完成: {size} 字节, 用时 {elapsed:.1f} 秒 '
+                                 f'({transfer.throughput / 1024:.1f} KB/秒{retransmits})')
+    
+    def handle_transfer_failed(self, error, confirmed):
+        transfer = self.finish_transfer()
+        if confirmed > 0 and transfer.mode != 'xmodem':
+            self.transfer_resume = (transfer.path, transfer.mode, confirmed)
+        self.receive_text.append(f'文件发送失败: {error}（接收方已确认 {confirmed}/{transfer.size} 字节）')
+    
+    def switch_profile(self, name):
+        """切换到另一个设备配置（从内存缓存读取，不重新读文件）"""
+        if not name or name == self.settings_store.active_profile:
+            return
+        self.store_settings()
+        self.settings_store.set_active(name)
+        self.apply_settings(self.settings_store.get_profile(name))
+        
+        self.update_cmd_buttons()
+        self.update_sensor_fields()
+        self.update_pipeline()
+        self.apply_port_settings()
+        self.receive_text.append(f'已切换到设备配置: {name}')
+    
+    def new_profile(self):
+        """以当前设置为模板新建设备配置"""
+        name, ok = QInputDialog.getText(self, '新建设备配置', '配置名称:')
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name in self.settings_store.profile_names():
+            QMessageBox.warning(self, '新建设备配置', f"配置 '{name}' 已存在")
+            return
+        self.store_settings()
+        self.settings_store.set_profile(name, self.current_settings())
+        self.profile_combo.addItem(name)
+        self.profile_combo.setCurrentText(name)
+    
+    def delete_profile(self):
+        """删除当前设备配置（至少保留一个）"""
+        name = self.settings_store.active_profile
+        if len(self.settings_store.profile_names()) <= 1:
+            QMessageBox.information(self, '删除当前配置', '至少需要保留一个设备配置')
+            return
+        reply = QMessageBox.question(self, '删除当前配置', f"确定删除设备配置 '{name}' 吗？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        # 先切换到其他配置，再从缓存中删除
+        other = next(profile for profile in self.settings_store.profile_names() if profile != name)
+        self.profile_combo.setCurrentText(other)
+        self.settings_store.delete_profile(name)
+        self.profile_combo.removeItem(self.profile_combo.findText(name))
+    
     def show_about(self):
         """显示关于对话框"""
         QMessageBox.about(self, "关于",
@@ -904,14 +5300,154 @@ class SerialAssistant(QMainWindow):
         """关闭窗口时的处理"""
         # 断开串口连接
         self.disconnect_port()
+        if self.telemetry_server is not None:
+            self.telemetry_server.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.simulator is not None:
+            self.simulator.stop()
+        if self.export_thread is not None:
+            self.export_thread.requestInterruption()
+            self.export_thread.wait()
+        if self.analysis_thread is not None:
+            self.analysis_thread.requestInterruption()
+            self.analysis_thread.wait()
+        # 保存串口参数等设置并等待后台写入完成
+        self.store_settings()
+        self.settings_store.close()
         # 停止定时器
         self.port_timer.stop()
         self.send_timer.stop()
+        self.stats_timer.stop()
+        self.console_timer.stop()
+        self.rate_timer.stop()
         event.accept()
 
 
+def make_telemetry_frame(data_format, rng, state=None, data_separator=",", kv_separator=":", fixed=None):
+    """按 data_format 生成一帧随机遥测文本（不含换行），用于基准测试和设备模拟器
+
+    传入 state 字典时各数值按随机游走缓慢变化，更接近真实传感器；否则每帧独立随机。
+    fixed 中给出的字段直接使用给定的值。
+    """
+    items = []
+    for name, info in data_format.items():
+        if not info.get('key'):
+            continue  # 派生通道由接收端计算
+        if fixed and name in fixed:
+            value = fixed[name]
+        elif name == '当前状态':
+            value = rng.choice(list(STATUS_MAP))
+        else:
+            low, high = info.get('min', 0), info.get('max', 100)
+            if state is None:
+                number = rng.uniform(low, high)
+            else:
+                number = state.get(name, (low + high) / 2) + rng.gauss(0, (high - low) * 0.01)
+                number = min(max(number, low), high)
+                state[name] = number
+            value = f"{number:.2f}"
+        items.append(f"{info.get('key', '')}{kv_separator}{value}")
+    return data_separator.join(items)
+
+
+def parse_cli_args(argv):
+    """解析命令行参数，未识别的参数交给Qt"""
+    parser = argparse.ArgumentParser(description='太阳能植物监护小车串口助手')
+
+    analysis = parser.add_argument_group('离线日志分析')
+    analysis.add_argument('--analyze', metavar='LOG', help='多进程解析日志文件并输出统计（不启动界面）')
+    analysis.add_argument('--output', help='分析结果保存路径，格式由扩展名决定（.csv/.npz/.parquet）')
+    analysis.add_argument('--workers', type=int, default=None, help='解析进程数，默认为CPU核数')
+    analysis.add_argument('--profile', default=None, help='使用的设备配置名称，默认为当前配置')
+
+    simulator = parser.add_argument_group('设备模拟器')
+    simulator.add_argument('--simulate', action='store_true', help='在伪终端上运行设备模拟器（不启动界面）')
+    simulator.add_argument('--sim-rate', type=float, default=50.0, help='每秒发送的帧数')
+    simulator.add_argument('--sim-baud', type=int, default=115200, help='模拟的波特率，用于限制发送速度')
+    simulator.add_argument('--sim-binary', action='store_true', help='发送二进制帧而不是文本')
+    simulator.add_argument('--sim-jitter', type=float, default=0.0, help='发送间隔的相对抖动')
+    simulator.add_argument('--sim-split', type=float, default=0.0, help='帧被拆分写入的概率')
+    simulator.add_argument('--sim-merge', type=float, default=0.0, help='帧与下一帧合并写入的概率')
+    simulator.add_argument('--sim-corrupt', type=float, default=0.0, help='帧被损坏的概率')
+    simulator.add_argument('--sim-burst', type=float, default=0.0, help='突发发送一组帧的概率')
+    simulator.add_argument('--sim-drop', type=float, default=0.0, help='帧被丢弃（序号照常递增）的概率')
+    simulator.add_argument('--sim-checksum', choices=sorted(FrameCheck.ALGORITHMS), help='在文本帧末尾附加校验和字段 CK')
+    simulator.add_argument('--sim-seq', metavar='KEY', help='在每帧附加以 KEY 为键名的序号（0-255 回绕）')
+    simulator.add_argument('--sim-seed', type=int, default=13349, help='随机种子，相同种子产生相同的数据')
+    return parser.parse_known_args(argv[1:])
+
+
+def run_simulator(args):
+    """命令行运行设备模拟器，直到 Ctrl+C"""
+    simulator = DeviceSimulator(rate=args.sim_rate, baudrate=args.sim_baud, binary=args.sim_binary,
+                                jitter=args.sim_jitter, split=args.sim_split, merge=args.sim_merge,
+                                corrupt=args.sim_corrupt, burst=args.sim_burst, seed=args.sim_seed, drop=args.sim_drop,
+                                checksum=args.sim_checksum, sequence_key=args.sim_seq)
+    try:
+        port = simulator.start()
+    except OSError as e:
+        print(e)
+        return 1
+    print(f"设备模拟器已启动，请在串口助手中打开 {port}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(1)
+            print(f"已发送 {simulator.frames_sent} 帧, {simulator.bytes_sent} 字节", end='\r')
+    except KeyboardInterrupt:
+        print()
+    finally:
+        simulator.stop()
+    return 0
+
+
+def run_log_analysis(args):
+    """命令行分析日志文件，解析规则取自保存的设备配置"""
+    store = SettingsStore()
+    try:
+        store.load(legacy_path='serial_settings.json')
+    except Exception as e:
+        print(f"加载设置失败: {e}")
+    profile = store.get_profile(args.profile)
+    fmt = None
+    if args.output:
+        extension = os.path.splitext(args.output)[1].lower()
+        fmt = next((name for name, ext in HistoryExporter.FORMATS.items() if ext == extension), None)
+        if fmt is None or fmt not in HistoryExporter.available_formats():
+            print(f"不支持的输出格式: {extension}")
+            return 1
+
+    analyzer = LogAnalyzer(args.analyze, profile.get('data_format', DEFAULT_DATA_FORMAT),
+                           profile.get('data_separator', ','), profile.get('kv_separator', ':'), args.workers,
+                           progress=lambda percent: print(f"{percent}%", end='\r'),
+                           frame_check=profile.get('frame_check'))
+    begin = time.perf_counter()
+    try:
+        analyzer.run()
+    except OSError as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - begin
+    print()
+    size = os.path.getsize(args.analyze)
+    print(f"{analyzer.workers} 个进程解析 {size / 1e6:.1f} MB 用时 {elapsed:.2f} 秒 ({size / 1e6 / elapsed:.1f} MB/秒)")
+    for line in analyzer.summary():
+        print(line)
+    if fmt:
+        print('已保存: ' + ', '.join(analyzer.export(args.output, fmt)))
+    return 0
+
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # 打包为单文件 exe 后，spawn 出的分析子进程需要在这里接管执行
+    multiprocessing.freeze_support()
+    args, qt_args = parse_cli_args(sys.argv)
+    if args.analyze:
+        sys.exit(run_log_analysis(args))
+    if args.simulate:
+        sys.exit(run_simulator(args))
+
+    app = QApplication(sys.argv[:1] + qt_args)
     # 设置应用全局字体
     font = QFont("Microsoft YaHei", 9)
     app.setFont(font)
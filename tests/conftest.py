@@ -0,0 +1,31 @@
+"""测试公共设置：在无显示环境下运行 Qt，并从仓库根目录导入 serial_assistant 和 benchmarks"""
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', help='同时运行标记为 slow 的长时间测试')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: 运行时间较长的测试，需要 --runslow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip = pytest.mark.skip(reason='需要 --runslow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,66 @@
+import gc
+
+from serial_assistant import BufferPool, ReceiveBuffer, SensorParser
+
+
+def test_lease_tracks_views_until_collected():
+    pool = BufferPool(slab_size=64)
+    slab = pool.acquire()
+    view = pool.lease(slab, memoryview(slab)[:8])
+    other = pool.lease(slab, memoryview(slab)[8:16])
+    assert pool.in_use(slab)
+    del view
+    gc.collect()
+    assert pool.in_use(slab)
+    del other
+    gc.collect()
+    assert not pool.in_use(slab)
+
+
+def test_acquire_skips_leased_slabs_and_reuses_free_ones():
+    pool = BufferPool(slab_size=64)
+    leased, idle = pool.acquire(), pool.acquire()
+    view = pool.lease(leased, memoryview(leased)[:4])
+    pool.release(leased)
+    pool.release(idle)
+    assert pool.acquire() is idle       # 仍被引用的 slab 不会再分配出去
+    assert pool.acquire() is not leased
+    assert pool.allocated == 3
+    view.release()
+    del view
+    gc.collect()
+    assert pool.acquire() is leased
+    assert pool.acquire(size=1000) not in (leased, idle)  # 空闲的 slab 太小时新分配
+    assert pool.allocated == 4
+
+
+def test_release_beyond_free_limit_forgets_leases():
+    pool = BufferPool(slab_size=16, max_free=1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    view = pool.lease(second, memoryview(second)[:4])
+    pool.release(second)
+    assert list(pool.free) == [first]
+    assert id(second) not in pool.leases
+    assert view.tobytes() == bytes(4)
+
+
+def test_receive_buffer_keeps_handed_off_data_intact():
+    pool = BufferPool(slab_size=32)
+    buffer = ReceiveBuffer(pool)
+    parser = SensorParser({'温度': {'key': 'T'}})
+    held = buffer.write(b'T:1\nT:2')
+    assert buffer.take_frames(parser) == ['T:1']
+    assert buffer.pending == 3
+    for i in range(20):
+        buffer.write(f'{i}\nT:'.encode())
+        buffer.take_frames(parser)
+    assert held.tobytes() == b'T:1\nT:2'  # 写满后换用新的 slab，不覆盖下游仍持有的数据
+    assert pool.allocated > 1
+    del held
+    gc.collect()
+    allocated = pool.allocated
+    for i in range(50):
+        buffer.write(f'{i}\nT:'.encode())
+        buffer.take_frames(parser)
+    assert pool.allocated == allocated  # 没有引用后 slab 循环复用
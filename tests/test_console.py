@@ -0,0 +1,46 @@
+from serial_assistant import ConsoleCompactor
+
+
+def test_merges_repeated_and_same_key_lines():
+    compactor = ConsoleCompactor(summary_rate=0)
+    assert compactor.feed(b'T:25.1,H:60\n', 0.0) == [(False, '接收: T:25.1,H:60')]
+    output = compactor.feed(b'T:25.2,H:61\nT:25.3,H:62\n', 0.5)
+    assert len(output) == 1  # 同一分组在一次调用中只输出最终状态
+    replace, text = output[0]
+    assert replace and text.startswith('接收: T:25.3,H:62    ×3  最后 ')
+    output = compactor.feed(b'OK\nOK\n', 0.6)
+    assert output == [(False, compactor.format_group())]  # 新的一行在同一次调用中已合并为 ×2
+    assert compactor.count == 2
+    assert compactor.feed(b'T:1\n', 0.7) == [(False, '接收: T:1')]  # 单个键值对只和相同的行合并
+
+
+def test_buffers_partial_lines_and_split_utf8():
+    compactor = ConsoleCompactor(summary_rate=0)
+    data = '状态:正常\n'.encode('utf-8')
+    assert compactor.feed(data[:4], 0.0) == []
+    assert compactor.feed(data[4:], 0.1) == [(False, '接收: 状态:正常')]
+    assert compactor.feed(b'x' * (ConsoleCompactor.MAX_LINE + 1), 0.2) == \
+        [(False, '接收: ' + 'x' * (ConsoleCompactor.MAX_LINE + 1))]
+
+
+def test_switches_to_summary_above_rate_with_hysteresis():
+    compactor = ConsoleCompactor(summary_rate=10, interval=1.0)
+    compactor.feed(b'', 0.0)
+    compactor.feed(b'A:1,B:2\n' * 20, 0.5)
+    output = compactor.tick(1.0)
+    assert compactor.summarizing
+    assert len(output) == 1 and '收到 20 帧' in output[0][1] and output[0][1].endswith('最新: A:1,B:2')
+    assert compactor.feed(b'A:1,B:2\n' * 9, 1.5) == []  # 摘要模式下不逐行输出
+    assert compactor.tick(2.0)[0][1].count('收到 9 帧') == 1
+    assert compactor.summarizing   # 9 帧/秒仍高于 8 帧/秒
+    compactor.feed(b'A:1,B:2\n' * 7, 2.5)
+    compactor.tick(3.0)
+    assert not compactor.summarizing
+    assert compactor.feed(b'A:1,B:2\n', 3.1) == [(False, '接收: A:1,B:2')]
+
+
+def test_reset_drops_partial_line_and_group():
+    compactor = ConsoleCompactor(summary_rate=0)
+    compactor.feed(b'OK\nhalf', 0.0)
+    compactor.reset()
+    assert compactor.feed(b'OK\n', 0.1) == [(False, '接收: OK')]
@@ -0,0 +1,63 @@
+import pytest
+
+from serial_assistant import DerivedChannels
+
+FORMAT = {
+    '电压': {'key': 'V'},
+    '电流': {'key': 'I'},
+    '功率': {'expr': 'V * I'},
+    '功率均值': {'expr': 'avg(功率, 3)'},
+    '电量': {'expr': 'interp(V, 3.0, 0, 4.2, 100)'},
+}
+
+
+def apply(channels, values):
+    values = dict(values)
+    channels.apply(values)
+    return values
+
+
+def test_evaluates_in_dependency_order():
+    channels = DerivedChannels(FORMAT)
+    assert channels.errors == []
+    assert [channel.name for channel in channels.channels].index('功率') < \
+        [channel.name for channel in channels.channels].index('功率均值')
+    values = apply(channels, {'电压': 3.6, '电流': 2.0})
+    assert values['功率'] == pytest.approx(7.2)
+    assert values['功率均值'] == pytest.approx(7.2)
+    assert values['电量'] == pytest.approx(50.0)
+
+
+def test_only_recomputes_when_inputs_change():
+    channels = DerivedChannels({'a': {'key': 'A'}, 'b': {'key': 'B'}, 'double': {'expr': 'A * 2'}})
+    assert apply(channels, {'a': 1.0})['double'] == 2.0
+    assert 'double' not in apply(channels, {'b': 5.0})
+
+
+def test_avg_waits_for_all_inputs_and_its_own_source():
+    channels = DerivedChannels({'x': {'key': 'X'}, 'y': {'key': 'Y'}, 'm': {'expr': 'avg(x, 2) + y'}})
+    assert 'm' not in apply(channels, {'x': 100.0})   # y 尚未收到，100 不计入平均
+    assert 'm' not in apply(channels, {'y': 0.0})     # 平均值还没有数据
+    assert apply(channels, {'x': 2.0})['m'] == 2.0
+    assert apply(channels, {'y': 1.0})['m'] == 3.0    # 只有 y 更新，平均值不变
+    assert apply(channels, {'x': 4.0})['m'] == 4.0    # (2 + 4) / 2 + 1
+
+
+def test_runtime_errors_skip_output():
+    channels = DerivedChannels({'a': {'key': 'A'}, 'b': {'key': 'B'}, 'ratio': {'expr': 'a / b'}})
+    assert 'ratio' not in apply(channels, {'a': 1.0, 'b': 0.0})
+    assert apply(channels, {'b': 4.0})['ratio'] == 0.25
+
+
+@pytest.mark.parametrize('expression', ['__import__("os")', 'a.real', 'bad + a', 'c', 'a + "x"', 'avg(a, 0)',
+                                        'interp(a, 2, 0, 1, 1)', 'interp(a, "q", 1, 2, 3)', 'interp(a, 0, "y", 1, 1)',
+                                        'interp(a, True, 0, 2, 1)', '2 + 3'])
+def test_rejects_unsafe_or_invalid_expressions(expression):
+    channels = DerivedChannels({'a': {'key': 'A'}, 'bad': {'expr': expression}})
+    assert any("'bad'" in error for error in channels.errors)
+
+
+def test_reports_cycles():
+    channels = DerivedChannels({'a': {'key': 'A'}, 'p': {'expr': 'q + a'}, 'q': {'expr': 'p + a'}})
+    assert len(channels.errors) == 2
+    assert channels.channels == []
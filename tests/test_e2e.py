@@ -0,0 +1,56 @@
+"""端到端回归：在 offscreen Qt 平台上运行真实的主窗口，经伪终端接收模拟器数据，并与 tests/e2e_baseline.json 比较
+
+默认只按基线的前两级频率各运行几秒；逐级提高频率和测量内存增长的完整测试标记为 slow，用 --runslow 运行。
+E2E_BASELINE 可指定其他基线文件，E2E_TOLERANCE 可调整允许的退化比例。
+"""
+import json
+import os
+
+import pytest
+
+from benchmarks.e2e import BASELINE, RATES, EndToEndRun, compare_e2e_baseline, create_window, measure_e2e
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'openpty'), reason="需要伪终端")
+
+FAST_RATES = RATES[:2]
+DURATION = 3.0
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    with open(os.environ.get('E2E_BASELINE', BASELINE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def tolerance():
+    return float(os.environ.get('E2E_TOLERANCE', 0.25))
+
+
+@pytest.fixture
+def window(qapp, tmp_path):
+    window = create_window(str(tmp_path))
+    yield window
+    window.close()
+
+
+def test_end_to_end_matches_baseline(qapp, window, baseline, tolerance):
+    run = EndToEndRun(qapp, window)
+    results = {}
+    for rate in FAST_RATES:
+        result = run.run(rate, DURATION)
+        assert not result['backlog'], (rate, result)
+        assert result['dropped_updates'] == 0
+        assert result['parsed_fps'] == pytest.approx(result['sent_fps'], rel=0.1)
+        results[str(rate)] = result
+    # 与完整测试相同的顺序运行，只比较这几级频率；最大持续帧率和内存增长由 slow 测试检查
+    regressions = compare_e2e_baseline({'rates': results, 'max_sustained_fps': 0},
+                                       {'rates': {rate: baseline['rates'][rate] for rate in results}}, tolerance)
+    assert not regressions, regressions
+
+
+@pytest.mark.slow
+def test_rate_ramp_and_memory_growth(qapp, window, baseline, tolerance):
+    results = measure_e2e(qapp, window, RATES, duration=5.0, soak=30.0)
+    regressions = compare_e2e_baseline(results, baseline, tolerance)
+    assert not regressions, regressions
@@ -0,0 +1,61 @@
+import pytest
+
+from serial_assistant import FrameCheck, SensorParser, checksum_crc8, checksum_crc16, checksum_xor
+
+
+def test_checksum_functions():
+    assert checksum_xor(b'T:25.1') == 0x54 ^ 0x3A ^ 0x32 ^ 0x35 ^ 0x2E ^ 0x31
+    assert checksum_crc8(b'123456789') == 0xF4   # CRC-8 (多项式 0x07) 的标准校验值
+    assert checksum_crc16(b'123456789') == 0x31C3  # CRC-16/XMODEM 的标准校验值
+
+
+@pytest.mark.parametrize('algorithm', sorted(FrameCheck.ALGORITHMS))
+def test_verify_strips_valid_checksum_and_drops_bad_frames(algorithm):
+    check = FrameCheck(algorithm)
+    body = 'T:25.1,H:60'
+    value = FrameCheck.ALGORITHMS[algorithm](body.encode('utf-8'))
+    assert check.verify(f'{body},CK:{value:X}') == body
+    assert check.verify(f'{body},CK:{value ^ 1:X}') is None
+    assert check.verify(body) is None
+    assert check.verify(f'{body},CK:zz') is None
+    counts = check.take_counts()
+    assert counts['checked_frames'] == 4 and counts['checksum_errors'] == 3
+    assert check.take_counts()['checked_frames'] == 0
+
+
+def sequence(check, numbers):
+    for number in numbers:
+        check.sequence(str(number))
+    return check.take_counts()
+
+
+def test_lost_frames_are_credited_back_when_late():
+    check = FrameCheck(sequence_key='SEQ')
+    counts = sequence(check, [1, 2, 5, 3, 6])
+    assert counts['lost_frames'] == 1          # 跳过 3、4，3 迟到后扣回
+    assert counts['out_of_order'] == 1
+    assert sequence(check, [4])['lost_frames'] == -1  # 之前已取走的计数在下次抵消
+    assert sequence(check, [4])['duplicate_frames'] == 1
+
+
+def test_wraparound_duplicates_and_resets():
+    check = FrameCheck(sequence_key='SEQ', sequence_modulus=256)
+    counts = sequence(check, [254, 255, 0, 1, 1, 100, 30])
+    assert counts['lost_frames'] == 98        # 1 -> 100
+    assert counts['duplicate_frames'] == 1
+    assert counts['sequence_resets'] == 1     # 100 -> 30 超出乱序窗口，视为设备重启
+    assert counts['sequenced_frames'] == 7
+    assert check.last_sequence == 30
+
+
+def test_parser_applies_frame_check():
+    settings = {'checksum': 'CRC8', 'sequence_key': 'SEQ'}
+    parser = SensorParser({'温度': {'key': 'T'}}, frame_check=settings)
+    body = 'T:25.5,SEQ:7'
+    assert parser.parse_frame(f'{body},CK:{checksum_crc8(body.encode()):02X}') == {'温度': 25.5}
+    assert parser.parse_frame(f'{body},CK:00') == {}
+    counts = parser.frame_check.take_counts()
+    assert counts['checksum_errors'] == 1 and counts['sequenced_frames'] == 1
+    assert FrameCheck.from_settings({'checksum': '', 'sequence_key': ''}) is None
+    with pytest.raises(ValueError):
+        FrameCheck('MD5')
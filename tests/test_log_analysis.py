@@ -0,0 +1,71 @@
+import math
+import random
+
+import pytest
+
+from serial_assistant import DEFAULT_DATA_FORMAT, DerivedChannels, LogAnalyzer, SensorParser, make_telemetry_frame
+
+DATA_FORMAT = dict(DEFAULT_DATA_FORMAT)
+DATA_FORMAT['温度均值'] = {'expr': 'avg(温度, 50)'}
+FRAME_CHECK = {'sequence_key': 'SEQ'}
+
+
+@pytest.fixture(scope='module')
+def log_path(tmp_path_factory):
+    """带序号的遥测日志，含丢帧、乱序和重复"""
+    rng = random.Random(13349)
+    state = {}
+    frames = []
+    for number in range(6000):
+        if rng.random() < 0.02:
+            continue
+        frames.append(f"{make_telemetry_frame(DATA_FORMAT, rng, state)},SEQ:{number % 256}")
+    for i in range(0, len(frames) - 1, 97):
+        frames[i], frames[i + 1] = frames[i + 1], frames[i]
+    for i in range(50, len(frames), 211):
+        frames.insert(i, frames[i])
+    path = tmp_path_factory.mktemp('analyze') / 'telemetry.log'
+    path.write_text('\n'.join(frames) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def live_columns(path):
+    """按实时接收的方式逐帧解析，作为参考结果"""
+    parser = SensorParser(DATA_FORMAT, frame_check=FRAME_CHECK)
+    derived = DerivedChannels(DATA_FORMAT)
+    rows = []
+    with open(path, 'rb') as f:
+        for frame in f.read().split(b'\n'):
+            values = parser.parse_frame(frame) if frame.strip() else {}
+            if values:
+                derived.apply(values)
+                rows.append(values)
+    return rows, parser.frame_check.take_counts()
+
+
+def analyze(path, workers, shard_size):
+    analyzer = LogAnalyzer(path, DATA_FORMAT, workers=workers, frame_check=FRAME_CHECK)
+    analyzer.SHARD_MIN = analyzer.SHARD_MAX = shard_size
+    analyzer.run()
+    columns = {name: [value for chunk, start, end in analyzer.parts for value in chunk.columns[name][start:end]]
+               for name in ('温度', '温度均值')}
+    return analyzer, columns
+
+
+def same(a, b):
+    return len(a) == len(b) and all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in zip(a, b))
+
+
+def test_sharding_matches_live_parsing(log_path):
+    rows, counts = live_columns(log_path)
+    single, single_columns = analyze(log_path, 1, 1 << 30)
+    sharded, sharded_columns = analyze(log_path, 3, 4096)
+    assert len(sharded.parts) > 10
+    assert counts['lost_frames'] > 0 and counts['out_of_order'] > 0 and counts['duplicate_frames'] > 0
+    for analyzer, columns in ((single, single_columns), (sharded, sharded_columns)):
+        assert analyzer.rows == len(rows)
+        assert analyzer.link_counts == counts
+        assert same(columns['温度均值'], [row.get('温度均值', math.nan) for row in rows])
+    assert same(single_columns['温度'], sharded_columns['温度'])
+    for name, moments in single.moments.items():
+        assert sharded.moments[name] == pytest.approx(moments)
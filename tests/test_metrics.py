@@ -0,0 +1,72 @@
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from serial_assistant import DEFAULT_CMD_BUTTONS, MetricsServer, TelemetryPipeline
+
+DATA_FORMAT = {'温度': {'key': 'T', 'unit': '℃'}, '标签"测试"': {'key': 'Q'}, '当前状态': {'key': 'ST'}}
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = TelemetryPipeline()
+    pipeline.configure(DATA_FORMAT, ",", ":", [], DEFAULT_CMD_BUTTONS,
+                       frame_check={'sequence_key': 'SEQ'})
+    pipeline.process(b'T:25.5,Q:1,ST:2,SEQ:1\nbad\nT:26.0,SEQ:4\n', now=0.0)
+    pipeline.process(b'T:26.5,SEQ:3\n', now=0.1)
+    return pipeline
+
+
+def samples(text):
+    """解析 Prometheus 文本格式中的采样行，返回 {指标(含标签): 数值}"""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = float(value)
+    return result
+
+
+def test_render_prometheus_text(pipeline):
+    class Server:
+        clients = {object(), object()}
+
+    text = MetricsServer(pipeline, telemetry_server=Server()).render()
+    values = samples(text)
+    prefix = MetricsServer.PREFIX
+    assert values[f'{prefix}_sensor_value{{name="温度",key="T",unit="℃"}}'] == 26.5
+    assert values[f'{prefix}_sensor_value{{name="标签\\"测试\\"",key="Q",unit=""}}'] == 1.0
+    assert values[f'{prefix}_sensor_value{{name="当前状态",key="ST",unit=""}}'] == 2.0
+    assert values[f'{prefix}_samples_total'] == 3
+    assert values[f'{prefix}_parse_errors_total'] == 1
+    assert values[f'{prefix}_lost_frames'] == 1  # 跳过 2、3，3 迟到后扣回
+    assert values[f'{prefix}_out_of_order_total'] == 1
+    assert values[f'{prefix}_telemetry_clients'] == 2
+    assert f'# TYPE {prefix}_lost_frames gauge' in text
+    assert f'# TYPE {prefix}_frames_total counter' in text
+
+    buckets = [(line, value) for line, value in values.items() if line.startswith(f'{prefix}_process_seconds_bucket')]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)  # 累计分桶
+    assert buckets[-1][0].endswith('le="+Inf"}') and counts[-1] == values[f'{prefix}_process_seconds_count'] == 2
+    # 每个指标都有 HELP 和 TYPE
+    declared = set(re.findall(r'^# TYPE (\S+) ', text, re.M))
+    for name in values:
+        base = re.sub(r'(_bucket|_sum|_count)$', '', name.split('{')[0])
+        assert base in declared or name.split('{')[0] in declared
+
+
+def test_http_endpoint(pipeline):
+    server = MetricsServer(pipeline, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'] == MetricsServer.CONTENT_TYPE
+            assert f'{MetricsServer.PREFIX}_samples_total 3' in response.read().decode('utf-8')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'http://127.0.0.1:{server.port}/', timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.stop()
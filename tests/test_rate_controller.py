@@ -0,0 +1,49 @@
+from serial_assistant import RateController
+
+SETTINGS = {'enabled': True, 'backlog_high': 20, 'backlog_low': 2, 'frame_high_ms': 200, 'frame_low_ms': 50,
+            'hold': 1.0, 'cooldown': 3.0, 'max_level': 2}
+
+
+def run(controller, samples):
+    """按 (时间, 积压, 帧时间) 依次更新，返回有指令的 (时间, 指令) 列表"""
+    commands = [(now, controller.update(backlog, frame_ms, now)) for now, backlog, frame_ms in samples]
+    return [(now, command) for now, command in commands if command]
+
+
+def test_steps_down_after_hold_and_cooldown_up_to_max_level():
+    controller = RateController(SETTINGS)
+    assert run(controller, [(0.0, 25, 10)]) == []
+    assert controller.overloaded  # 超过上限立即进入过载
+    fired = run(controller, [(t * 0.5, 25, 10) for t in range(1, 20)])
+    assert fired == [(1.0, 'down'), (4.0, 'down')]
+    assert controller.level == 2
+
+
+def test_frame_time_alone_triggers_overload():
+    controller = RateController(SETTINGS)
+    assert run(controller, [(0.0, 0, 250), (1.0, 0, 250)]) == [(1.0, 'down')]
+
+
+def test_recovers_after_low_hold_with_cooldown():
+    controller = RateController(SETTINGS)
+    run(controller, [(0.0, 25, 10), (1.0, 25, 10), (4.0, 25, 10)])
+    fired = run(controller, [(5.0, 0, 10), (5.5, 0, 10)])
+    assert fired == [] and controller.overloaded
+    fired = run(controller, [(t * 0.5, 0, 10) for t in range(12, 30)])
+    assert not controller.overloaded
+    assert fired == [(7.0, 'up'), (10.0, 'up')]
+    assert controller.level == 0
+
+
+def test_between_thresholds_restarts_timers():
+    controller = RateController(SETTINGS)
+    fired = run(controller, [(0.0, 25, 10), (0.5, 10, 10), (1.0, 25, 10), (1.5, 25, 10), (2.0, 25, 10)])
+    assert fired == [(2.0, 'down')]
+    fired = run(controller, [(3.0, 0, 10), (3.5, 10, 10), (4.0, 0, 10), (4.5, 0, 10)])
+    assert fired == [] and controller.overloaded
+
+
+def test_ignores_unknown_settings():
+    controller = RateController(dict(SETTINGS, update=None, level=5))
+    assert set(controller.settings) == set(RateController.DEFAULTS)
+    assert callable(controller.update) and controller.level == 0
@@ -0,0 +1,47 @@
+from serial_assistant import DEFAULT_CMD_BUTTONS, DEFAULT_DATA_FORMAT, RuleEngine
+
+
+def run(engine, samples):
+    """按 (时间, 采样) 依次求值，返回 (时间, 规则文本) 列表"""
+    return [(now, rule.text) for now, values in samples for rule in engine.evaluate(values, now)]
+
+
+def test_fires_once_until_released_past_hysteresis():
+    engine = RuleEngine(['温度 > 30 hyst 2 -> alarm 过热'], DEFAULT_DATA_FORMAT)
+    fired = run(engine, [(0, {'温度': 31}), (1, {'温度': 32}),
+                         (2, {'温度': 29}),   # 仍在迟滞区内，不解除
+                         (3, {'温度': 31}),
+                         (4, {'温度': 27.5}),  # 低于 30-2，解除
+                         (5, {'温度': 31})])
+    assert [now for now, _ in fired] == [0, 5]
+
+
+def test_hold_requires_condition_for_duration():
+    engine = RuleEngine(['SM < 20 for 10s -> send 自动模式'], DEFAULT_DATA_FORMAT, DEFAULT_CMD_BUTTONS)
+    fired = run(engine, [(0, {'土壤湿度': 15}), (5, {'土壤湿度': 25}),   # 中途恢复，重新计时
+                         (6, {'土壤湿度': 15}), (15, {'土壤湿度': 15}),
+                         (16, {'土壤湿度': 14}), (30, {'土壤湿度': 14})])
+    assert [now for now, _ in fired] == [16]
+    rule = engine.by_field['土壤湿度'].rules[0]
+    assert rule.action == 'send' and rule.argument == DEFAULT_CMD_BUTTONS['自动模式']
+
+
+def test_timer_fires_on_later_sample_without_crossing():
+    engine = RuleEngine(['温度 >= 40 for 2s -> alarm'], DEFAULT_DATA_FORMAT)
+    # 数值停在阈值之上不再跨越任何阈值点，只靠计时器到期触发
+    fired = run(engine, [(0, {'温度': 45}), (1, {'温度': 45}), (2.5, {'温度': 45}), (3, {'温度': 45})])
+    assert [now for now, _ in fired] == [2.5]
+
+
+def test_state_survives_reconfiguration():
+    rules = ['温度 > 30 for 5s -> alarm']
+    engine = RuleEngine(rules, DEFAULT_DATA_FORMAT)
+    run(engine, [(0, {'温度': 35})])
+    engine = RuleEngine(rules + ['湿度 > 90 -> alarm'], DEFAULT_DATA_FORMAT, previous=engine)
+    assert [now for now, _ in run(engine, [(5, {'温度': 35})])] == [5]
+
+
+def test_invalid_rules_are_reported():
+    engine = RuleEngine(['气压 > 1 -> alarm', '当前状态 == 1 -> alarm', 'T > 1 -> send'], DEFAULT_DATA_FORMAT)
+    assert len(engine.errors) == 3
+    assert not engine.by_field
@@ -0,0 +1,39 @@
+import statistics
+
+import pytest
+
+from serial_assistant import RollingStats
+
+
+def test_matches_recomputed_window_after_eviction():
+    stats = RollingStats(window=5.0)
+    values = [3.0, 9.0, 1.0, 7.0, 7.0, 2.0, 8.0, 4.0, 6.0, 5.0, 0.5, 9.5]
+    for i, value in enumerate(values):
+        stats.add(value, float(i))
+        window = values[max(0, i - 5):i + 1]  # 时间早于 i-5 的采样已移出
+        snapshot = stats.snapshot(float(i))
+        assert snapshot.count == len(window)
+        assert snapshot.min == min(window)
+        assert snapshot.max == max(window)
+        assert snapshot.mean == pytest.approx(statistics.fmean(window))
+        if len(window) > 1:
+            assert snapshot.stddev == pytest.approx(statistics.stdev(window))
+
+
+def test_snapshot_expires_without_new_samples():
+    stats = RollingStats(window=2.0)
+    stats.add(10.0, 0.0)
+    stats.add(1.0, 1.0)
+    assert stats.snapshot(2.5).count == 1
+    assert stats.snapshot(2.5).max == 1.0
+    assert stats.snapshot(3.5) is None
+    stats.add(4.0, 4.0)
+    snapshot = stats.snapshot(4.0)
+    assert (snapshot.count, snapshot.mean, snapshot.stddev) == (1, 4.0, 0.0)
+
+
+def test_rate_after_warmup():
+    stats = RollingStats(window=10.0)
+    for i in range(200):
+        stats.add(1.0, i * 0.1)
+    assert stats.snapshot(19.9).rate == pytest.approx(10.0, rel=0.02)
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+
+import pytest
+from PyQt5.QtCore import Qt
+
+from serial_assistant import TelemetryServer
+
+
+@pytest.fixture
+def server(qapp):
+    servers = []
+
+    def start(**options):
+        server = TelemetryServer(tcp_port=0, ws_port=0, **options)
+        server.commands = []
+        server.command_received.connect(server.commands.append, Qt.DirectConnection)
+        server.start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+async def websocket(server, origin=None):
+    """完成 WebSocket 握手，返回 (状态行, reader, writer)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.ws_port)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    request = (f'GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+               f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n')
+    if origin:
+        request += f'Origin: {origin}\r\n'
+    writer.write((request + '\r\n').encode('ascii'))
+    response = await reader.readuntil(b'\r\n\r\n')
+    return response.split(b'\r\n', 1)[0].decode('ascii'), reader, writer
+
+
+async def read_frame(reader):
+    first, length = await reader.readexactly(2)
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    return first & 0x0F, await reader.readexactly(length)
+
+
+def masked_text_frame(text):
+    payload = text.encode('utf-8')
+    mask = os.urandom(4)
+    return bytes((0x81, 0x80 | len(payload))) + mask + bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+
+
+def test_fans_out_raw_bytes_and_samples(server):
+    server = server()
+
+    async def main():
+        tcp_reader, tcp_writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        status, ws_reader, ws_writer = await websocket(server)
+        assert status == 'HTTP/1.1 101 Switching Protocols'
+        await wait_until(lambda: len(server.clients) == 2)
+        server.publish_raw(memoryview(b'T:25.5\n'))
+        server.publish_samples([{'温度': 25.5, '湿度': float('nan')}])
+        assert await tcp_reader.readexactly(7) == b'T:25.5\n'
+        assert await read_frame(ws_reader) == (0x2, b'T:25.5\n')
+        opcode, payload = await read_frame(ws_reader)
+        assert opcode == 0x1
+        assert json.loads(payload)['samples'] == [{'温度': 25.5, '湿度': None}]  # NaN 按 null 发出
+        tcp_writer.close()
+        ws_writer.close()
+    asyncio.run(main())
+
+
+def test_rejects_cross_site_origins(server):
+    server = server()
+
+    async def main():
+        status, _, writer = await websocket(server, origin='https://evil.example')
+        assert status == 'HTTP/1.1 403 Forbidden'
+        writer.close()
+        status, _, writer = await websocket(server, origin='http://localhost:8080')
+        assert status == 'HTTP/1.1 101 Switching Protocols'
+        writer.close()
+    asyncio.run(main())
+    assert not TelemetryServer.is_local_origin('null')
+
+
+@pytest.mark.parametrize('accept_commands', [False, True])
+def test_commands_are_opt_in(server, accept_commands):
+    server = server(accept_commands=accept_commands)
+
+    async def main():
+        _, tcp_writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        _, _, ws_writer = await websocket(server)
+        await wait_until(lambda: len(server.clients) == 2)
+        tcp_writer.write(b'CMD:STOP\n')
+        ws_writer.write(masked_text_frame('CMD:AUTO'))
+        await tcp_writer.drain()
+        await ws_writer.drain()
+        if accept_commands:
+            await wait_until(lambda: len(server.commands) == 2)
+        else:
+            await asyncio.sleep(0.2)
+        tcp_writer.close()
+        ws_writer.close()
+    asyncio.run(main())
+    assert sorted(server.commands) == (['CMD:AUTO', 'CMD:STOP'] if accept_commands else [])
+
+
+def test_slow_client_is_dropped_without_stalling_others(server):
+    server = server(max_buffer=64 * 1024)
+    chunk = os.urandom(32 * 1024)
+
+    async def main():
+        _, slow_writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        slow_writer.transport.pause_reading()  # 从不读取
+        fast_reader, fast_writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        await wait_until(lambda: len(server.clients) == 2)
+        received = 0
+        sent = 0
+        while not server.slow_disconnects:
+            assert sent < 4096, "慢速客户端没有被断开"
+            server.publish_raw(chunk)
+            sent += 1
+            received += len(await fast_reader.readexactly(len(chunk)))
+        assert received == sent * len(chunk)
+        assert len(server.clients) == 1
+        server.publish_raw(b'after')
+        assert await fast_reader.readexactly(5) == b'after'
+        slow_writer.close()
+        fast_writer.close()
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import binascii
+import os
+
+import pytest
+
+from serial_assistant import FileTransfer, TransferError
+
+
+@pytest.fixture
+def payload_file(tmp_path):
+    path = tmp_path / 'firmware.bin'
+    path.write_bytes(os.urandom(5000))
+    return str(path)
+
+
+def test_make_block_layout_and_crc(payload_file):
+    transfer = FileTransfer(lambda data: None, payload_file, 'xmodem')
+    block = transfer.make_block(257, b'abc', FileTransfer.PAD)
+    assert len(block) == 3 + 1024 + 2
+    assert block[:3] == bytes((FileTransfer.STX, 1, 0xFE))  # 块号按 256 回绕，后跟反码
+    payload = block[3:-2]
+    assert payload == b'abc' + bytes((FileTransfer.PAD,)) * 1021
+    assert int.from_bytes(block[-2:], 'big') == binascii.crc_hqx(payload, 0)
+
+
+def test_ymodem_header_uses_short_block(payload_file):
+    transfer = FileTransfer(lambda data: None, payload_file, 'ymodem')
+    header = transfer.make_header(2048)
+    assert header[0] == FileTransfer.SOH and header[1:3] == b'\x00\xff'
+    name, _, fields = header[3:-2].rstrip(b'\0').partition(b'\0')
+    assert name == b'firmware.bin'
+    size, _, _, _, offset = fields.split()
+    assert int(size) == 5000 and int(offset) == 2048
+
+
+class FakeReceiver:
+    """按顺序应答数据块的接收方：指定的块第一次收到时当作校验错误，回复 NAK 后紧跟一个迟到的 ACK"""
+    def __init__(self, bad_block):
+        self.transfer = None
+        self.bad_block = bad_block
+        self.expected = 1
+        self.rejected = False
+        self.data = bytearray()
+
+    def write(self, packet):
+        number, payload = packet[1], packet[3:-2]
+        if number != self.expected & 0xFF:
+            return  # 出错块之后、重发之前的块直接忽略
+        if number == self.bad_block and not self.rejected:
+            self.rejected = True
+            self.transfer.feed(bytes((FileTransfer.NAK, FileTransfer.ACK)))
+            return
+        self.data += payload
+        self.expected += 1
+        self.transfer.feed(bytes((FileTransfer.ACK,)))
+
+
+def test_go_back_n_ignores_stray_ack_after_nak(payload_file):
+    receiver = FakeReceiver(bad_block=2)
+    transfer = FileTransfer(receiver.write, payload_file, 'xmodem', rate=1e7, window=4, timeout=0.5)
+    receiver.transfer = transfer
+    transfer.QUIET = 0.01
+    with open(payload_file, 'rb') as f:
+        content = f.read()
+    transfer.send_blocks(memoryview(content))
+    assert transfer.confirmed == len(content)
+    assert bytes(receiver.data[:len(content)]) == content
+    assert transfer.retransmits >= 1  # 从块 2 起整窗重发，迟到的 ACK 不能让发送方跳过块 2
+
+
+def test_cancel_from_receiver(payload_file):
+    transfer = FileTransfer(lambda packet: transfer.feed(bytes((FileTransfer.CAN,))), payload_file, 'xmodem',
+                            rate=1e7, timeout=0.5)
+    with pytest.raises(TransferError):
+        transfer.send_blocks(memoryview(b'x' * 5000))